@@ -0,0 +1,277 @@
+"""
+Adaptive Monte Carlo: play games until the estimates are precise enough.
+
+The games are played in blocks of blocksize games, each block with its own seed and its own
+copy of the players (as simulategames does with a seed). After each block the running
+estimates of the win rate, roundswin and bluffslost of every player are updated, and the
+simulation stops when:
+    width        the confidence interval of every win rate is narrower than +-width, or
+    alpha        the best player wins significantly more than every other player (paired
+                 z-test at level alpha, games are multinomial trials), or
+    maxgames     the maximum number of games is reached.
+The blocks are checked in order, so the result only depends on the seed and the block size,
+not on the number of workers.
+
+The rules are checked after every block, so the levels are corrected for the repeated looks
+(Bonferroni): with looks checks at most, each interval has confidence 1 - (1-confidence)/looks
+and the significance test is at level alpha/looks. The intervals then hold at the stopping
+time with at least the stated confidence, and the significance stop has an error rate of at
+most alpha.
+"""
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+from game import RandomSource, Deck, defaultplayers, blockplayers, playgames
+
+
+class RunningStats:
+    """
+    Running mean and variance of a vector of values, updated with blocks of samples.
+    """
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def add(self, samples):
+        """
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            (samples, size) array.
+
+        """
+        samples = np.asarray(samples, dtype=float)
+        count = len(samples)
+        if count == 0:
+            return
+        mean = samples.mean(axis=0)
+        m2 = ((samples - mean)**2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.full(len(self.mean), np.inf)
+
+    def halfwidth(self, z):
+        #half width of the normal confidence interval of the mean
+        return z * np.sqrt(self.variance() / max(self.count, 1))
+
+
+def wilson(wins, games, z):
+    """
+    Wilson score interval of the win rates.
+
+    Returns
+    -------
+    low, high : numpy.ndarray
+
+    """
+    wins = np.asarray(wins, dtype=float)
+    rate = wins / games
+    center = (rate + z**2 / (2*games)) / (1 + z**2 / games)
+    half = z * np.sqrt(rate * (1 - rate) / games + z**2 / (4*games**2)) / (1 + z**2 / games)
+    return center - half, center + half
+
+
+class BlockCounters:
+    """
+    Store of playgames that keeps the won, roundswin and bluffslost of each player in each game.
+    """
+
+    def __init__(self, players, games):
+        self.order = {player.name: j for j, player in enumerate(players)}
+        self.won = np.zeros((games, len(players)), dtype=np.int8)
+        self.roundswin = np.zeros((games, len(players)), dtype=np.int32)
+        self.bluffslost = np.zeros((games, len(players)), dtype=np.int32)
+        self.games = 0
+
+    def append(self, players, rounds):
+        for player in players:
+            j = self.order[player.name]
+            self.won[self.games, j] = player.won
+            self.roundswin[self.games, j] = player.roundswin
+            self.bluffslost[self.games, j] = player.bluffslost
+        self.games += 1
+
+
+def playblock(task):
+    """
+    Play a block of games, with the players and the game loop of simulateblock.
+
+    Parameters
+    ----------
+    task : tuple
+        (games, seed, players, numberofdecks, resetemotions, quantized).
+
+    Returns
+    -------
+    won, roundswin, bluffslost : numpy.ndarray
+        (games, players) arrays, players in the order of the players given.
+
+    """
+    games, seed, players, numberofdecks, resetemotions, quantized = task
+    rng = RandomSource(seed, quantized)
+    players = blockplayers(players, rng)
+    counters = BlockCounters(players, games)
+    playgames(players, Deck(numberofdecks), games, rng, resetemotions=resetemotions, store=counters)
+    return counters.won, counters.roundswin, counters.bluffslost
+
+
+def looks(mingames, maxgames, blocksize):
+    """
+    Number of times the stopping rules are checked: after each block with at least mingames games.
+    """
+    blocks = int(np.ceil(maxgames / blocksize))
+    first = min(int(np.ceil(mingames / blocksize)), blocks)
+    return max(blocks - max(first, 1) + 1, 1)
+
+
+class AdaptiveResult:
+
+    def __init__(self, names, confidence, looks=1):
+        """
+        Parameters
+        ----------
+        names : list
+            Names of the players.
+        confidence : float
+            Confidence of the intervals over all the looks.
+        looks : int
+            Number of times the stopping rules may be checked, the confidence is split between them.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.names = names
+        self.confidence = confidence
+        self.looks = looks
+        self.z = NormalDist().inv_cdf(1 - (1 - confidence) / (2 * looks))
+        self.wins = np.zeros(len(names), dtype=np.int64)
+        self.roundswin = RunningStats(len(names))
+        self.bluffslost = RunningStats(len(names))
+        self.stopped = None
+
+    @property
+    def games(self):
+        return self.roundswin.count
+
+    def add(self, won, roundswin, bluffslost):
+        self.wins += won.sum(axis=0)
+        self.roundswin.add(roundswin)
+        self.bluffslost.add(bluffslost)
+
+    def winrate(self):
+        return self.wins / max(self.games, 1)
+
+    def interval(self):
+        """
+        Wilson confidence interval (low, high) of the win rate of each player.
+        """
+        return wilson(self.wins, max(self.games, 1), self.z)
+
+    def halfwidth(self):
+        low, high = self.interval()
+        return (high - low) / 2
+
+    def pvalue(self):
+        """
+        Largest p-value of the one-sided tests "the best player wins more than player j".
+        """
+        rate = self.winrate()
+        best = np.argmax(rate)
+        others = np.arange(len(rate)) != best
+        difference = rate[best] - rate[others]
+        #variance of the difference of two multinomial proportions
+        variance = (rate[best] + rate[others] - difference**2) / max(self.games, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(variance > 0, difference / np.sqrt(variance), 0)
+        return max(1 - NormalDist().cdf(value) for value in z)
+
+    def summary(self):
+        low, high = self.interval()
+        lines = ['%i games, stopped by %s, %.0f%% confidence intervals (corrected for %i looks)' % (self.games, self.stopped, 100*self.confidence, self.looks)]
+        lines.append('%-10s %-22s %-18s %-18s' % ('Player', 'Win rate', 'Rounds won', 'Bluffs lost'))
+        roundshalf = self.roundswin.halfwidth(self.z)
+        bluffshalf = self.bluffslost.halfwidth(self.z)
+        for i, name in enumerate(self.names):
+            lines.append('%-10s %.3f [%.3f, %.3f]   %6.2f +- %-6.2f   %6.2f +- %-6.2f' % (
+                name, self.winrate()[i], low[i], high[i],
+                self.roundswin.mean[i], roundshalf[i], self.bluffslost.mean[i], bluffshalf[i]))
+        return '\n'.join(lines)
+
+
+def simulateadaptive(players=None, numberofdecks=2, width=0.01, alpha=None, confidence=0.95, mingames=200, maxgames=20000,
+                     blocksize=100, seed=None, workers=1, resetemotions=False, quantized=False):
+    """
+    Play games until the confidence intervals are narrow enough or the best player is significant.
+
+    Parameters
+    ----------
+    players : list
+        Players of the games. Default is defaultplayers(). Each block plays with a copy.
+    width : float
+        Stop when the half width of the interval of every win rate is below width. None to disable.
+    alpha : float
+        Stop when the best player wins more than every other player with p-value below
+        alpha/looks. None to disable.
+    confidence : float
+        Level of the confidence intervals, split over the looks (see looks).
+    mingames : int
+        Games played before the stopping rules are checked.
+    maxgames : int
+        Maximum number of games.
+    blocksize : int
+        Games of each block. The rules are checked after each block.
+    seed : int
+        Seed of the simulation.
+    workers : int
+        Number of processes, None uses all cores. The blocks are played ahead and the ones
+        after the stop are discarded.
+
+    Returns
+    -------
+    AdaptiveResult
+
+    """
+    if width is None and alpha is None:
+        raise ValueError('width or alpha must be given')
+    names = [player.name for player in players] if players else [player.name for player in defaultplayers()]
+    result = AdaptiveResult(names, confidence, looks(mingames, maxgames, blocksize))
+    seeds = np.random.SeedSequence(seed)
+    executor = None
+    if workers != 1:
+        from concurrent.futures import ProcessPoolExecutor
+        ahead = workers if workers else os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers=ahead)
+    else:
+        ahead = 1
+    try:
+        while result.stopped is None:
+            amount = min(ahead, int(np.ceil((maxgames - result.games) / blocksize)))
+            tasks = [(min(blocksize, maxgames - result.games - i*blocksize), blockseed, players, numberofdecks, resetemotions, quantized)
+                     for i, blockseed in enumerate(seeds.spawn(amount))]
+            blocks = executor.map(playblock, tasks) if executor else map(playblock, tasks)
+            for block in blocks:
+                result.add(*block)
+                if result.games >= mingames:
+                    if width is not None and np.all(result.halfwidth() <= width):
+                        result.stopped = 'width'
+                    elif alpha is not None and result.pvalue() < alpha / result.looks:
+                        result.stopped = 'significance'
+                if result.stopped is None and result.games >= maxgames:
+                    result.stopped = 'maxgames'
+                if result.stopped:
+                    break
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return result
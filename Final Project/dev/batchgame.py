@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+Lockstep batch engine for the bluff card game.
+
+BatchGame plays many independent games at the same time. The rules are the
+same as Game.playround, but the state of every game lives in NumPy arrays
+(hands as games x players x 13 card counts, arousal and valence as
+games x players) and each turn is advanced for all active games together.
+
+Differences from the scalar Game:
+    - every game starts with a fresh random seating and the initial emotions
+      of the players (like simulategames with resetemotions=True);
+    - the visible cards of a player are kept in a bounded memory of the last
+      MEMORYSPAN cards, the largest window a Personality.memory of 1 can see.
+"""
+import numpy as np
+
+from game import CARDS, MEMORYSPAN, EVENTS, defaultplayers, Deck, quantize
+
+BLUFFCARDS = 4 #default maxcards of Player.chooseamountbluff
+
+
+class BatchResult:
+
+    def __init__(self, names, personalities, winner, rounds, stats, arousal, valence, logs=None):
+        """
+        All arrays are indexed by game and by player (the index of the player in
+        the list given to BatchGame), not by seat.
+
+        Parameters
+        ----------
+        names : list
+            Players names.
+        personalities : numpy.ndarray
+            (players x 3) haste, memory and selfcontrol of each player.
+        winner : numpy.ndarray
+            (games) index of the winner, -1 if the game reached maxrounds.
+        rounds : numpy.ndarray
+            (games) number of rounds of each game.
+        stats : dict
+            roundswin, doubts, rightdoubts, bluffs and bluffslost, each (games x players).
+        arousal, valence : numpy.ndarray
+            (games x players) emotions at the end of each game.
+        logs : dict
+            log_arousal, log_valence (games x rounds x players), log_cardsamount
+            (games x rounds+1 x players) and their lengths per game. None if
+            the emotions were not logged.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.names = names
+        self.personalities = personalities
+        self.winner = winner
+        self.rounds = rounds
+        self.arousal = arousal
+        self.valence = valence
+        self.roundswin = stats['roundswin']
+        self.doubts = stats['doubts']
+        self.rightdoubts = stats['rightdoubts']
+        self.bluffs = stats['bluffs']
+        self.bluffslost = stats['bluffslost']
+        self.logs = logs
+
+    def __len__(self):
+        return len(self.winner)
+
+    def wins(self):
+        """
+        Number of games won by each player.
+        """
+        return np.bincount(self.winner[self.winner >= 0], minlength=len(self.names))
+
+    def winners(self):
+        """
+        Names of the winners, in the same format of simulategames.
+        """
+        return [self.names[i] for i in self.winner if i >= 0]
+
+    def winnerstats(self):
+        """
+        [haste, memory, selfcontrol, arousal, valence] of the winner of each game,
+        in the same format of simulategames.
+        """
+        games = np.flatnonzero(self.winner >= 0)
+        winner = self.winner[games]
+        stats = np.column_stack((self.personalities[winner], self.arousal[games, winner], self.valence[games, winner]))
+        return stats.tolist()
+
+
+class BatchGame:
+
+    def __init__(self, players, deck, games, seed=None, logemotions=False, quantized=False, events=None):
+        """
+        Parameters
+        ----------
+        players : list
+            List of Player. Only their personality and initial emotion are used.
+        deck : Deck
+            Object Deck with all cards.
+        games : int
+            Number of games played together.
+        seed : int or numpy.random.SeedSequence
+            Seed of the random generator.
+        logemotions : bool
+            Keep the log of arousal, valence and amount of cards of every round.
+            It needs games x rounds x players floats, keep it off for large batches.
+        quantized : bool
+            Round the probabilities to the 10 buckets of the old Random.get.
+        events : EventSet
+            Events of the game. Default is EVENTS.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.players = players
+        self.deck = deck
+        self.games = games
+        self.rng = np.random.default_rng(seed)
+        self.logemotions = logemotions
+        self.quantized = quantized
+        self.maxcards = deck.numberofdecks * 4
+        self.moves = 0
+
+        self.events = EVENTS if events is None else events
+
+    def _draw(self, counts):
+        """
+        Draw one card of each row of counts (n x 13), with probability proportional to the counts.
+        """
+        cumulative = counts.cumsum(1)
+        u = self.rng.random(len(counts)) * cumulative[:, -1]
+        return (cumulative > u[:, None]).argmax(1)
+
+    def _get(self, value):
+        """
+        RandomSource.bernoulli for arrays.
+        """
+        if self.quantized:
+            value = quantize(value)
+        return self.rng.random(np.shape(value)) < value
+
+    def _react(self, g, s, event):
+        """
+        Update the emotions of the players seated at s of the games g accordingly to the event.
+        """
+        if event.log and self.logemotions:
+            self._log(self.log_valence, self.nlog, g, s, self.valence[g, s])
+            self._log(self.log_arousal, self.nlog, g, s, self.arousal[g, s])
+        update = ~self.frozen[g, s]
+        self.valence[g, s] = np.where(update, np.clip(self.valence[g, s] + event.valence, -1, 1), self.valence[g, s])
+        self.arousal[g, s] = np.where(update, np.clip(self.arousal[g, s] + event.arousal * (1 - self.selfcontrol[g, s]), -1, 1), self.arousal[g, s])
+
+    def _log(self, log, length, g, s, values):
+        log[g, length[g], s] = values
+
+    def _growlogs(self, needed):
+        if needed < self.log_arousal.shape[1]:
+            return
+        size = max(needed + 1, 2 * self.log_arousal.shape[1])
+        for name in ['log_arousal', 'log_valence', 'log_cardsamount']:
+            log = getattr(self, name)
+            grown = np.zeros((log.shape[0], size, log.shape[2]), dtype=log.dtype)
+            grown[:, :log.shape[1]] = log
+            setattr(self, name, grown)
+
+    def _logcards(self, g):
+        if self.logemotions:
+            self._growlogs(self.ncards[g].max())
+            self.log_cardsamount[g, self.ncards[g]] = self.hand[g].sum(2)
+            self.ncards[g] += 1
+
+    def _windowcounts(self, memory, window):
+        """
+        Counts per card of the last window cards of each memory row (n x MEMORYSPAN).
+        """
+        n = len(memory)
+        inside = np.arange(MEMORYSPAN) < window[:, None]
+        #empty slots (-1) are counted in the column 0 and dropped
+        index = np.arange(n)[:, None] * (CARDS + 1) + memory + 1
+        return np.bincount(index[inside], minlength=n * (CARDS + 1)).reshape(n, CARDS + 1)[:, 1:]
+
+    def _add2handvisible(self, g, s, cards):
+        """
+        Add to the visible memory of the players s the cards (n x 13) that are not there yet.
+        (Player.add2handvisible with addall=False)
+        """
+        visible = self._windowcounts(self.memory[g, s], np.full(len(g), MEMORYSPAN))
+        toadd = np.maximum(cards - visible, 0)
+        while True:
+            rows = np.flatnonzero(toadd.sum(1) > 0)
+            if len(rows) == 0:
+                break
+            card = (toadd[rows] > 0).argmax(1)
+            gr, sr = g[rows][:, None], s[rows][:, None]
+            self.memory[gr, sr, np.arange(1, MEMORYSPAN)] = self.memory[gr, sr, np.arange(MEMORYSPAN - 1)]
+            self.memory[g[rows], s[rows], 0] = card
+            toadd[rows, card] -= 1
+
+    def _removefromhandvisible(self, g, s, card, amount):
+        """
+        Remove from the visible memory of the players s the oldest amount copies of card.
+        """
+        amount = amount.copy()
+        while True:
+            rows = np.flatnonzero(amount > 0)
+            if len(rows) == 0:
+                break
+            memory = self.memory[g[rows], s[rows]]
+            match = memory == card[rows][:, None]
+            found = match.any(1)
+            amount[rows] = np.where(found, amount[rows] - 1, 0)
+            rows, memory, match = rows[found], memory[found], match[found]
+            oldest = MEMORYSPAN - 1 - match[:, ::-1].argmax(1)
+            index = np.arange(MEMORYSPAN) + (np.arange(MEMORYSPAN) >= oldest[:, None])
+            extended = np.concatenate((memory, np.full((len(rows), 1), -1, dtype=memory.dtype)), 1)
+            self.memory[g[rows], s[rows]] = np.take_along_axis(extended, index, 1)
+
+    def _start(self):
+        G = self.games
+        P = len(self.players)
+        rng = self.rng
+
+        #Random seating for each game, seating[g, s] is the player sitting at s
+        self.seating = rng.random((G, P)).argsort(1)
+        personality = np.array([[p.personality.haste, p.personality.memory, p.personality.selfcontrol] for p in self.players])
+        self.personalities = personality
+        seated = personality[self.seating]
+        self.haste = seated[:, :, 0]
+        self.window = np.round(MEMORYSPAN * seated[:, :, 1]).astype(int)
+        self.selfcontrol = seated[:, :, 2]
+        self.frozen = np.array([p.emotion.frozen for p in self.players])[self.seating]
+        self.arousal = np.array([p.emotion.arousal for p in self.players], dtype=float)[self.seating]
+        self.valence = np.array([p.emotion.valence for p in self.players], dtype=float)[self.seating]
+
+        #Give cards: shuffle each deck and deal one card at a time
+        cards = np.asarray(self.deck.cards) - 1
+        shuffled = cards[rng.random((G, len(cards))).argsort(1)]
+        seat = np.arange(len(cards)) % P
+        index = (np.arange(G)[:, None] * P + seat) * CARDS + shuffled
+        self.hand = np.bincount(index.ravel(), minlength=G * P * CARDS).reshape(G, P, CARDS).astype(np.int16)
+
+        self.memory = np.full((G, P, MEMORYSPAN), -1, dtype=np.int8)
+        self.stats = {name: np.zeros((G, P), dtype=int) for name in ['roundswin', 'doubts', 'rightdoubts', 'bluffs', 'bluffslost']}
+        self.rounds = np.zeros(G, dtype=int)
+        self.winner = np.full(G, -1)
+        self.active = np.ones(G, dtype=bool)
+
+        self.seat = np.zeros(G, dtype=int) #seat of the player of the turn
+        self.cyclemoves = np.zeros(G, dtype=int) #moves since the last time pass
+        self.card = np.full(G, -1) #current card, -1 when a round starts
+        self.stack = np.zeros((G, CARDS), dtype=np.int16)
+        self.lasthand = np.zeros((G, CARDS), dtype=np.int16)
+        self.lastlie = np.zeros(G, dtype=bool)
+        self.lastseat = np.full(G, -1)
+
+        if self.logemotions:
+            self.log_arousal = np.zeros((G, 32, P), dtype=np.float32)
+            self.log_valence = np.zeros((G, 32, P), dtype=np.float32)
+            self.log_cardsamount = np.zeros((G, 32, P), dtype=np.int16)
+            self.nlog = np.zeros(G, dtype=int)
+            self.ncards = np.zeros(G, dtype=int)
+
+    def playgames(self, maxrounds=1000):
+        """
+        Play all games until each one has a winner or reached maxrounds.
+
+        Returns
+        -------
+        BatchResult
+
+        """
+        self._start()
+        while self.active.any():
+            self.playturn(np.flatnonzero(self.active), maxrounds)
+        return self.result()
+
+    def playturn(self, g, maxrounds=1000):
+        """
+        Perform the move of the player of the turn in each of the games g, check
+        if other players want to doubt and finish the rounds and games that ended.
+        """
+        rng = self.rng
+        P = len(self.players)
+        n = len(g)
+        rows = np.arange(n)
+        s = self.seat[g]
+        hand = self.hand[g, s]
+        self.moves += n
+
+        #Pick a card (if it is the first player to play in the round)
+        card = self.card[g]
+        new = card < 0
+        if new.any():
+            card[new] = self._draw(hand[new])
+        self.card[g] = card
+
+        #Bluff if the player does not have the card or chooses to bluff
+        arousal = self.arousal[g, s]
+        haste = self.haste[g, s]
+        lie = (hand[rows, card] == 0) | self._get((haste + (arousal + 1) / 2) / 2)
+
+        #Choose the amount of cards
+        total = np.where(lie, np.minimum(hand.sum(1), BLUFFCARDS), hand[rows, card])
+        amount = np.round(np.clip(total * (haste + arousal * (1 - self.selfcontrol[g, s])), 1, total)).astype(int)
+        frozen = self.frozen[g, s]
+        if frozen.any():
+            amount[frozen] = rng.integers(1, total[frozen] + 1)
+        amount = np.where(total > 1, amount, 1)
+
+        played = np.zeros((n, CARDS), dtype=np.int16)
+        played[rows[~lie], card[~lie]] = amount[~lie]
+        if lie.any():
+            played[lie] = self._bluffcards(g[lie], s[lie], hand[lie], amount[lie])
+        self.hand[g, s] = hand - played
+
+        #Raise the confidence of the last player if he bluffed and no one noticed
+        bluffok = self.lastlie[g]
+        self._react(g[bluffok], self.lastseat[g[bluffok]], self.events.BluffOK)
+        lie = played.sum(1) > played[rows, card]
+        self.stats['bluffs'][g, s] += lie
+        self.stack[g] += played
+        self.lasthand[g] = played
+        self.lastlie[g] = lie
+        self.lastseat[g] = s
+
+        #Check if other players want to doubt the move
+        doubted, doubter = self._evaluatedoubt(g, s, card, amount)
+        over = doubted.copy()
+        if doubted.any():
+            self._doubt(g[doubted], s[doubted], doubter[doubted], card[doubted], amount[doubted])
+
+        #Check if player has no cards
+        gameover = self.hand[g, s].sum(1) == 0
+        if gameover.any():
+            won = g[gameover]
+            self.rounds[won] += 1
+            self._logcards(won)
+            self.winner[won] = s[gameover]
+            self.active[won] = False
+
+        #Time passes when the round is over or all players played once
+        self.cyclemoves[g] += 1
+        timepass = ~gameover & (over | (self.cyclemoves[g] == P))
+        if timepass.any():
+            self._timepass(g[timepass])
+        roundover = ~gameover & over
+        ended = g[roundover]
+        self.card[ended] = -1
+        self.stack[ended] = 0
+        self.lasthand[ended] = 0
+        self.lastlie[ended] = False
+        self.active[ended[self.rounds[ended] >= maxrounds]] = False
+        self.seat[g] = (s + 1) % P
+
+    def _bluffcards(self, g, s, hand, amount):
+        """
+        Pick the cards of a bluff: first the cards that the other players remember
+        this player has (less frequent first), then random cards of the hand.
+        """
+        visible = self._windowcounts(self.memory[g, s], self.window[g, s])
+        remembered = (visible > 0) & (visible < 0.5 * self.maxcards) & (hand > 0)
+        order = np.argsort(np.where(remembered, hand, 4 * self.maxcards + 1) * CARDS + np.arange(CARDS), 1)
+        available = np.take_along_axis(np.where(remembered, hand, 0), order, 1)
+        before = available.cumsum(1) - available
+        played = np.zeros_like(hand)
+        np.put_along_axis(played, order, np.clip(amount[:, None] - before, 0, available), 1)
+
+        missing = amount - played.sum(1)
+        while True:
+            rows = np.flatnonzero(missing > 0)
+            if len(rows) == 0:
+                break
+            card = self._draw(hand[rows] - played[rows])
+            played[rows, card] += 1
+            missing[rows] -= 1
+        return played
+
+    def _evaluatedoubt(self, g, s, card, manycards):
+        """
+        Every other player evaluates the doubt like Player.evaluatedoubt, the first of
+        them (sorted by Game.getdoubtprob) that doubts is the doubter.
+
+        Returns
+        -------
+        doubted : numpy.ndarray
+            (n) bool, True if someone doubted.
+        doubter : numpy.ndarray
+            (n) seat of the doubter.
+
+        """
+        P = len(self.players)
+        n = len(g)
+        rows = np.arange(n)
+        possiblecards = self.maxcards
+        manycards = manycards[:, None]
+
+        #seen[i, o, x]: cards of the current card that o remembers x has
+        match = (self.memory[g] == card[:, None, None]).astype(np.float32)
+        inside = (np.arange(MEMORYSPAN) < self.window[g][:, :, None]).astype(np.float32)
+        seen = inside @ match.transpose(0, 2, 1)
+        viewdcurrent = seen[rows, :, s]
+        handcards = self.hand[g, :, card]
+        hascards = handcards > 0
+        viewdplayers = seen.sum(2) - seen[:, np.arange(P), np.arange(P)] - viewdcurrent + handcards
+        totalofcards = (possiblecards + 1) - manycards
+
+        lenhand = self.hand[g, s].sum(1)[:, None]
+        arousal = self.arousal[g]
+        currentarousal = self.arousal[g, s][:, None]
+        currentvalence = self.valence[g, s][:, None]
+        isnext = np.arange(P) == ((s + 1) % P)[:, None]
+
+        knows = (lenhand == 0) | (lenhand < manycards) | (viewdplayers >= totalofcards)
+        believes = viewdcurrent >= manycards
+        byarousal = (currentarousal > 0) & self._get(np.clip(np.broadcast_to(currentarousal, (n, P)), 0, 1)) & (currentvalence < 0)
+        hischance = (arousal + 1) / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            doubtpercent = hischance * ((manycards - viewdcurrent) / (possiblecards - viewdplayers))
+        guess = np.where(isnext & ~hascards, hischance, np.clip(np.nan_to_num(doubtpercent), 0, 1))
+        doubt = np.where(knows, True, np.where(believes, False, byarousal | self._get(guess)))
+
+        #sort the players by their probability to doubt, without the current player
+        doubtprob = 0.3 * self.haste[g] + 0.7 * hischance
+        doubtprob[rows, s] = -np.inf
+        order = np.argsort(-doubtprob, 1, kind='stable')
+        doubt[rows, s] = False
+        doubt = np.take_along_axis(doubt, order, 1)
+        return doubt.any(1), order[rows, doubt.argmax(1)]
+
+    def _doubt(self, g, s, doubter, card, amount):
+        """
+        Finish the rounds where doubter doubted the player at s.
+        """
+        self.stats['doubts'][g, doubter] += 1
+        lasthand = self.lasthand[g]
+        stack = self.stack[g]
+
+        truth = ~self.lastlie[g]
+        gt, st, dt = g[truth], s[truth], doubter[truth]
+        self.hand[gt, dt] += stack[truth]
+        self._add2handvisible(gt, dt, lasthand[truth])
+        self._removefromhandvisible(gt, st, card[truth], amount[truth])
+        self.stats['roundswin'][gt, st] += 1
+        self._react(gt, st, self.events.RoundWon)
+        self._react(gt, dt, self.events.RoundLost)
+
+        lie = ~truth
+        gl, sl, dl = g[lie], s[lie], doubter[lie]
+        self.hand[gl, sl] += stack[lie]
+        self._add2handvisible(gl, sl, lasthand[lie])
+        self.stats['bluffslost'][gl, sl] += 1
+        self.stats['rightdoubts'][gl, dl] += 1
+        self.stats['roundswin'][gl, dl] += 1
+        self._react(gl, dl, self.events.RoundWon)
+        self._react(gl, sl, self.events.RoundLost)
+
+    def _timepass(self, g):
+        """
+        All players of the games g react to the time passing and to players close to win.
+        """
+        P = len(self.players)
+        seats = np.broadcast_to(np.arange(P), (len(g), P))
+        rows = np.broadcast_to(g[:, None], (len(g), P))
+        if self.logemotions:
+            self._growlogs(self.nlog[g].max())
+        self._react(rows, seats, self.events.TimePass)
+        if self.logemotions:
+            self.nlog[g] += 1
+        self._logcards(g)
+
+        close = self.hand[g].sum(2) <= 0.2 * len(self.deck.cards) / P
+        someone = close.any(1)
+        self._react(rows[close & someone[:, None]], seats[close & someone[:, None]], self.events.IClose2Win)
+        self._react(rows[~close & someone[:, None]], seats[~close & someone[:, None]], self.events.SomeoneClose2Win)
+        self.cyclemoves[g] = 0
+        self.rounds[g] += 1
+
+    def _byplayer(self, seated):
+        """
+        Reorder a (games x seats) array to (games x players).
+        """
+        byplayer = np.empty_like(seated)
+        np.put_along_axis(byplayer, self.seating, seated, 1)
+        return byplayer
+
+    def result(self):
+        games = np.arange(self.games)
+        winner = np.where(self.winner >= 0, self.seating[games, np.maximum(self.winner, 0)], -1)
+        stats = {name: self._byplayer(stat) for name, stat in self.stats.items()}
+        logs = None
+        if self.logemotions:
+            order = np.argsort(self.seating, 1)
+            logs = {}
+            for name in ['log_arousal', 'log_valence', 'log_cardsamount']:
+                log = getattr(self, name)
+                logs[name] = np.take_along_axis(log, order[:, None, :], 2)
+            logs['lengths'] = self.nlog
+            logs['cardslengths'] = self.ncards
+        return BatchResult([p.name for p in self.players], self.personalities, winner, self.rounds,
+                           stats, self._byplayer(self.arousal), self._byplayer(self.valence), logs)
+
+
+def simulatebatch(games=100, players=None, numberofdecks=2, seed=None, maxrounds=1000, logemotions=False, quantized=False):
+    """
+    Batch version of simulategames: all games are played together by BatchGame.
+
+    Returns
+    -------
+    BatchResult
+
+    """
+    if players is None:
+        players = defaultplayers()
+    game = BatchGame(players, Deck(numberofdecks), games, seed=seed, logemotions=logemotions, quantized=quantized)
+    return game.playgames(maxrounds)
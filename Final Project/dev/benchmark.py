@@ -0,0 +1,269 @@
+"""
+Benchmarks of the simulator hot paths, with fixed seeds and fixed personalities.
+
+Example
+-------
+    python benchmark.py                          run and compare with benchmark_baseline.json
+    python benchmark.py --save                   run and save as the new baseline
+    python benchmark.py --quick --only gamble    run a subset with fewer calls
+
+The benchmarks are:
+    gamble, evaluatedoubt        calls/s of the decisions of a player (6 players, 2 decks)
+    shuffledeck/dN               calls/s of Deck(N).shuffledeck, N from 1 to 8
+    playround/pP-dN              rounds/s and moves/s of Game.playround
+    simulategames/pP-dN          games/s, moves/s and peak memory (KiB) of simulategames
+The sweeps use P from 3 to 12 players with 2 decks and N from 1 to 8 decks with 6 players.
+A move is a call to Player.gamble. The comparison with the baseline only uses the rates
+(higher is better); a rate slower than the baseline by more than the tolerance is a regression.
+The baseline records the machine and the commit it was saved on; it is only compared on the
+same machine (python, numpy, platform and processor), save one with --save first.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+from game import Player, Personality, Emotion, Game, Deck, Hand, RandomSource, prepareplayers, simulategames
+from tracing import NullSink
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+PLAYERS = range(3, 13)
+DECKS = range(1, 9)
+
+
+class MoveCounter(NullSink):
+    """
+    Trace sink that only counts the moves (gamble records).
+    """
+    enabled = True
+
+    def __init__(self):
+        self.moves = 0
+
+    def emit(self, record):
+        if record.kind == 'gamble':
+            self.moves += 1
+
+
+def benchplayers(amount, seed=0):
+    """
+    Players with personalities drawn from a fixed seed, so every run plays the same games.
+    """
+    traits = np.random.default_rng(seed).uniform(0, 1, (amount, 3)).round(2).tolist()
+    return [Player('Player%i' % (i+1), personality = Personality(*traits[i]), emotion = Emotion(0, 0)) for i in range(amount)]
+
+
+def best(function, repeat):
+    #fastest of repeat runs, function returns the elapsed time of the part measured
+    return min(function() for i in range(repeat))
+
+
+def peakmemory(function):
+    #peak of the memory allocated by python while running function, in KiB
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def dealt(players, decks, seed):
+    """
+    Table of players with dealt hands and full visible memories, as in the middle of a game.
+    """
+    rng = RandomSource(seed)
+    table = benchplayers(players)
+    for player in table:
+        player.rng = rng
+    Game(table, Deck(decks), rng)
+    prepareplayers(table, rng=rng)
+    cards = Deck(decks).shuffledeck(rng)
+    for i, player in enumerate(table):
+        player.hand = Hand(cards[i::players])
+        for card in range(10):
+            player.handvisible.push(rng.randrange(13) + 1)
+    return table, rng
+
+
+def benchgamble(calls, repeat, players=6, decks=2, seed=0):
+    def run():
+        table, rng = dealt(players, decks, seed)
+        player = table[0]
+        hands = [Hand(player.hand) for i in range(calls)]
+        currentcards = [rng.randrange(13) + 1 for i in range(calls)]
+        start = time.perf_counter()
+        for hand, card in zip(hands, currentcards):
+            player.hand = hand
+            player.gamble(card, maxcards=decks*4)
+        return time.perf_counter() - start
+    return {'calls/s': calls / best(run, repeat)}
+
+
+def benchevaluatedoubt(calls, repeat, players=6, decks=2, seed=0):
+    def run():
+        table, rng = dealt(players, decks, seed)
+        current, player, others = table[0], table[1], table[2:]
+        arguments = [(rng.randrange(13) + 1, rng.randrange(4) + 1, table[1 + rng.randrange(2)]) for i in range(calls)]
+        lenhand = len(current.hand)
+        start = time.perf_counter()
+        for card, many, nextplayer in arguments:
+            player.evaluatedoubt(card, turn=1, manyCards=many, nextPlayer=nextplayer, possibleCards=decks*4, currentPlayer=current, otherPlayers=others, lenHand=lenhand)
+        return time.perf_counter() - start
+    return {'calls/s': calls / best(run, repeat)}
+
+
+def benchshuffledeck(calls, repeat, decks, seed=0):
+    def run():
+        rng = RandomSource(seed)
+        deck = Deck(decks)
+        start = time.perf_counter()
+        for i in range(calls):
+            deck.shuffledeck(rng)
+        return time.perf_counter() - start
+    return {'calls/s': calls / best(run, repeat)}
+
+
+def benchplayround(games, repeat, players, decks, seed=0, maxrounds=1000):
+    def run(trace=None):
+        rng = RandomSource(seed)
+        table = benchplayers(players)
+        for player in table:
+            player.rng = rng
+        deck = Deck(decks)
+        rounds = 0
+        elapsed = 0
+        for i in range(games):
+            prepareplayers(table, rng=rng)
+            game = Game(table, deck, rng, trace=trace)
+            gameover = False
+            start = time.perf_counter()
+            while game.rounds < maxrounds and not gameover:
+                gameover = game.playround()
+            elapsed += time.perf_counter() - start
+            rounds += game.rounds
+        run.rounds = rounds
+        return elapsed
+    counter = MoveCounter()
+    run(counter)
+    elapsed = best(run, repeat)
+    return {'rounds/s': run.rounds / elapsed, 'moves/s': counter.moves / elapsed}
+
+
+def benchsimulategames(games, repeat, players, decks, seed=0):
+    def run(trace=None, amount=games):
+        start = time.perf_counter()
+        simulategames(amount, seed=seed, players=benchplayers(players), numberofdecks=decks, trace=trace)
+        return time.perf_counter() - start
+    counter = MoveCounter()
+    run(counter)
+    elapsed = best(run, repeat)
+    return {'games/s': games / elapsed,
+            'moves/s': counter.moves / elapsed,
+            'peak KiB': peakmemory(lambda: run(amount=max(1, games // 10)))}
+
+
+def benchmarks(quick=False):
+    """
+    List of (name, function) of the benchmarks.
+    """
+    calls, games, repeat = (2000, 5, 1) if quick else (20000, 30, 3)
+    suite = [('gamble', lambda: benchgamble(calls, repeat)),
+             ('evaluatedoubt', lambda: benchevaluatedoubt(calls, repeat))]
+    suite += [('shuffledeck/d%i' % d, lambda d=d: benchshuffledeck(calls // 10, repeat, d)) for d in DECKS]
+    configurations = [(p, 2) for p in PLAYERS] + [(6, d) for d in DECKS if d != 2]
+    suite += [('playround/p%i-d%i' % (p, d), lambda p=p, d=d: benchplayround(games, repeat, p, d)) for p, d in configurations]
+    suite += [('simulategames/p%i-d%i' % (p, d), lambda p=p, d=d: benchsimulategames(games, repeat, p, d)) for p, d in configurations]
+    return suite
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns
+    -------
+    list
+        (name, metric, value, baseline value) of the regressions.
+
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            if not metric.endswith('/s') or metric not in baseline.get(name, {}):
+                continue
+            if value < baseline[name][metric] * (1 - tolerance):
+                regressions.append((name, metric, value, baseline[name][metric]))
+    return regressions
+
+
+def machine(quick):
+    """
+    Versions, platform and commit of this run, saved with the baseline.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(BASELINE),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(),
+            'quick': quick, 'commit': commit}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the simulator.')
+    parser.add_argument('--only', help='run only the benchmarks whose name starts with this prefix')
+    parser.add_argument('--quick', action='store_true', help='fewer calls and games, for a quick check')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file (default: benchmark_baseline.json)')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown allowed before a regression (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    current = machine(args.quick)
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as file:
+            saved = json.load(file)
+        #--quick runs other workloads, their rates are not comparable with a full baseline
+        if saved['machine'].get('quick', False) != args.quick:
+            print('The baseline was saved %s --quick, not compared' % ('with' if saved['machine'].get('quick', False) else 'without'), flush=True)
+        #the rates of another machine are not comparable either
+        elif any(saved['machine'].get(key) != current[key] for key in ('python', 'numpy', 'platform', 'processor')):
+            print('The baseline was saved on another machine (%s), not compared; save one with --save' % ', '.join(
+                '%s %s' % (key, saved['machine'].get(key)) for key in ('python', 'numpy', 'platform')), flush=True)
+        else:
+            baseline = saved['results']
+            print('Compared with the baseline of commit %s' % saved['machine'].get('commit'), flush=True)
+
+    results = {}
+    for name, function in benchmarks(args.quick):
+        if args.only and not name.startswith(args.only):
+            continue
+        results[name] = function()
+        line = '%-24s' % name
+        for metric, value in results[name].items():
+            line += '  %12.1f %-9s' % (value, metric)
+            if metric in baseline.get(name, {}):
+                line += '(%+5.1f%%)' % (100 * (value / baseline[name][metric] - 1))
+        print(line, flush=True)
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': current, 'results': results}, file, indent=1)
+        print('Baseline saved to %s' % args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, value, reference in regressions:
+        print('Regression: %s %s %.1f (baseline %.1f)' % (name, metric, value, reference))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,25 +4,28 @@ Created on Oct 2019
 
 @authors: Giancarlo Schaffer Torres Junior; Liz Mercedes Falcón Rivadulla; Rodolfo Luis Tonoli
 """
+import os
+import math
 import numpy as np
-from random import shuffle, choice, uniform
+import random
+from bisect import bisect_left
+from collections import deque
 from copy import deepcopy
-import matplotlib.pyplot as plt
-
-class Color:
-    red = '\033[31m'
-    green = '\033[32m'
-    yellow = '\033[33m'
-    blue = '\033[34m'
-    purple = '\033[35m'
-    cyan = '\033[36m'
-    grey = '\033[37m'
-    clear = '\033[m'
+from tracing import Color, Decision, NULLTRACE, ConsoleSink
+from results import ResultWriter, ResultStore, newstore
+#matplotlib and concurrent.futures are imported only by the functions that use them,
+#so importing this module is cheap
+
+NAN = float('nan')
+CARDS = 13 #cards numbered from 1 to 13
+MEMORYSPAN = 10 #visible cards remembered by a player with memory = 1
+
 
 class Random:
-    def get(value):
+    def get(value, rng=random):
         """
         Chance. Value = 0.8 = 80% chance
+        rng is the random generator used (the random module or a RandomSource)
         """
         if value < 0 or value > 1:
             raise ValueError
@@ -30,7 +33,122 @@ class Random:
             return 1
         else:
             value = 1-value
-            return choice(np.clip([int(i/(value*10)) for i in range(10)],0,1))
+            return rng.choice(np.clip([int(i/(value*10)) for i in range(10)],0,1))
+
+
+def quantize(value):
+    """
+    Probability of Random.get(value) returning 1. Random.get draws one of
+    [int(i/((1-value)*10)) for i in range(10)] clipped to 1, so the buckets from
+    ceil((1-value)*10) to 9 are ones. Works with numbers and numpy arrays.
+    """
+    ones = np.clip(10 - np.ceil((1 - value) * 10), 0, 10)
+    return np.where(value == 1, 1.0, ones / 10)
+
+
+class RandomSource:
+    """
+    Seeded source of all the random decisions of a game.
+
+    The uniform numbers come from a numpy Generator and are drawn in blocks of blocksize.
+    bernoulli(p) is True with probability p, if quantized is True p is rounded down to
+    the 10 buckets of Random.get, so the results can be compared with the old ones.
+    It also has the methods of the random module used by the game (random, uniform,
+    randrange, choice, shuffle).
+    """
+
+    def __init__(self, seed=None, quantized=False, blocksize=4096):
+        """
+        Parameters
+        ----------
+        seed : int or numpy.random.SeedSequence
+            Seed of the generator. None uses fresh entropy.
+        quantized : bool
+            Reproduce the 10 buckets of Random.get.
+        blocksize : int
+            Amount of uniform numbers drawn at once.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.generator = np.random.default_rng(seed)
+        self.quantized = quantized
+        self.blocksize = blocksize
+        self.block = []
+        self.index = 0
+        self.blockstate = None #state of the generator before the block was drawn
+
+    def random(self):
+        if self.index == len(self.block):
+            self.blockstate = self.generator.bit_generator.state
+            self.block = self.generator.random(self.blocksize).tolist()
+            self.index = 0
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+    def bernoulli(self, value):
+        """
+        Chance. Value = 0.8 = 80% chance of True
+        """
+        if value < 0 or value > 1:
+            raise ValueError
+        if self.quantized: #same as quantize, without numpy
+            value = 1 if value == 1 else min(max(10 - math.ceil((1 - value) * 10), 0), 10) / 10
+        return self.random() < value
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def randrange(self, n):
+        if n <= 0:
+            raise ValueError('empty range for randrange()')
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+    def shuffle(self, x):
+        #Fisher-Yates
+        for i in range(len(x) - 1, 0, -1):
+            j = self.randrange(i + 1)
+            x[i], x[j] = x[j], x[i]
+
+    def snapshot(self):
+        #the block is replaced, never changed, when it is used up: keep a reference
+        return (self.generator.bit_generator.state, self.block, self.index, self.blockstate)
+
+    def restore(self, state):
+        self.generator.bit_generator.state, self.block, self.index, self.blockstate = state
+
+    def replaystate(self):
+        """
+        Small state to continue the same numbers: (generator state, index) with the state of
+        the generator before the current block, (generator state, None) if there is no block.
+        """
+        if self.block:
+            return (self.blockstate, self.index)
+        return (self.generator.bit_generator.state, None)
+
+    def setreplaystate(self, state, index):
+        self.generator.bit_generator.state = state
+        self.block = []
+        self.index = 0
+        self.blockstate = None
+        if index is not None:
+            self.random() #draw the block again
+            self.index = index
+
+    def reseed(self, seed):
+        """
+        Continue with a new seed, for example to play different rollouts from the same snapshot.
+        """
+        self.generator = np.random.default_rng(seed)
+        self.block = []
+        self.index = 0
+        self.blockstate = None
 
 
 def clamp(value, minvalue, maxvalue):
@@ -53,50 +171,315 @@ class Emotion:
         self.frozen = frozen
 
     def update(self, selfcontrol, event):
+        self.change(event.valence, event.arousal * (1 - selfcontrol))
+
+    def change(self, valence, arousal):
         if not self.frozen:
-            self.valence = clamp(self.valence + event.valence, -1, 1)
-            self.arousal = clamp(self.arousal + event.arousal * (1 - selfcontrol), -1, 1)
+            self.valence = clamp(self.valence + valence, -1, 1)
+            self.arousal = clamp(self.arousal + arousal, -1, 1)
 
     def reset(self):
         self.valence = self.i_valence
         self.arousal = self.i_arousal
 
+    def snapshot(self):
+        return (self.valence, self.arousal)
+
+    def restore(self, state):
+        self.valence, self.arousal = state
+
+class EventSet:
+    """
+    Registry of events. Each event gets an id (its position in the set) and is also an
+    attribute of the set (EVENTS.TimePass). table(selfcontrol) compiles the changes of
+    valence and arousal of every event for a player with that selfcontrol.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.byname = {}
+        self.tables = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def add(self, event):
+        event.id = len(self.events)
+        self.events.append(event)
+        self.byname[event.name] = event
+        setattr(self, event.name, event)
+        self.tables = {}
+
+    def get(self, name):
+        if name not in self.byname:
+            raise KeyError('Event %s not found' % name)
+        return self.byname[name]
+
+    def table(self, selfcontrol):
+        """
+        List of (valence, arousal) change of each event, indexed by the event id.
+        """
+        if selfcontrol not in self.tables:
+            self.tables[selfcontrol] = [(event.valence, event.arousal * (1 - selfcontrol)) for event in self.events]
+        return self.tables[selfcontrol]
+
+
+#Default set of events (defined at the end of the module)
+EVENTS = EventSet()
+
+
 class Event:
-    events = []
 
-    def __init__(self, name, description, valence, arousal):
+    def __init__(self, name, description, valence, arousal, log=False, eventset=None):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the event, also its attribute in the event set.
+        description : str
+            Description of the event.
+        valence, arousal : float
+            Change of the emotions of the player that reacts to the event.
+        log : bool
+            Log the emotions of the player before reacting to the event.
+        eventset : EventSet
+            Set where the event is registered. Default is EVENTS.
+
+        Returns
+        -------
+        None.
+
+        """
         self.name = name
         self.description = description
         self.valence = valence
         self.arousal = arousal
-        self.events.append(self)
+        self.log = log
+        self.eventset = EVENTS if eventset is None else eventset
+        self.eventset.add(self)
 
     @classmethod
     def getEvent(cls, name):
-        for event in cls.events:
-            if name == event.name:
-                return event
-        raise Exception
+        return EVENTS.get(name)
+
+
+class Hand:
+    """
+    Cards of a player (or of the stack) stored as the amount of each card, from 1 to CARDS.
+    Adding, removing, counting and drawing a card do not depend on the size of the hand.
+    """
+
+    def __init__(self, cards=None):
+        self.counts = [0]*CARDS
+        self.total = 0
+        if cards:
+            self.add(cards)
+
+    def __len__(self):
+        return self.total
+
+    def __contains__(self, card):
+        return self.counts[card-1] > 0
+
+    def __iter__(self):
+        #cards sorted by number
+        for card, count in enumerate(self.counts):
+            for i in range(count):
+                yield card+1
+
+    def __repr__(self):
+        return str(list(self))
+
+    def __iadd__(self, cards):
+        self.add(cards)
+        return self
+
+    def count(self, card):
+        return self.counts[card-1]
+
+    def append(self, card):
+        self.counts[card-1] += 1
+        self.total += 1
+
+    def add(self, cards):
+        """
+        Add a list of cards or another Hand.
+        """
+        if isinstance(cards, Hand):
+            for card, count in enumerate(cards.counts):
+                self.counts[card] += count
+            self.total += cards.total
+        else:
+            for card in cards:
+                self.append(card)
+
+    def remove(self, card, amount=1):
+        if self.counts[card-1] < amount:
+            raise ValueError('Hand.remove(x): not enough x in hand')
+        self.counts[card-1] -= amount
+        self.total -= amount
+
+    def draw(self, rng=None):
+        """
+        Pick a random card of the hand (without removing it), each card of the hand has the same chance.
+        """
+        if self.total <= 0:
+            raise IndexError('draw from an empty hand')
+        index = (rng if rng else RANDOM).randrange(self.total)
+        for card, count in enumerate(self.counts):
+            if index < count:
+                return card+1
+            index -= count
+        raise IndexError('draw from an empty hand')
+
+    def pop(self, rng=None):
+        """
+        Remove and return a random card of the hand.
+        """
+        card = self.draw(rng)
+        self.remove(card)
+        return card
+
+    def snapshot(self):
+        return (tuple(self.counts), self.total)
+
+    def restore(self, state):
+        self.counts[:] = state[0]
+        self.total = state[1]
+
+
+class VisibleMemory:
+    """
+    Last cards that a player received in front of the other players (cards that may be
+    visible to them), newest first, bounded to span cards. For each window from 0 to span
+    it keeps the amount of each card among the newest window cards, so a player with
+    memory window w counts the cards he remembers of another player in O(1).
+    """
+
+    def __init__(self, span=MEMORYSPAN):
+        self.span = span
+        self.cards = deque(maxlen=span)
+        self.rounds = deque(maxlen=span) #the round number when the card was added
+        self.windows = [[0]*CARDS for i in range(span+1)]
+        self.totals = None #window counts of all the players of a table, see share
+
+    def __len__(self):
+        return len(self.cards)
+
+    def resize(self, span):
+        """
+        Remember up to span cards, for players with a memory window larger than MEMORYSPAN.
+        The memory only grows, and must be resized before it is shared.
+        """
+        if span <= self.span:
+            return
+        if self.totals is not None:
+            raise ValueError('A VisibleMemory must be resized before it is shared')
+        #the memory has at most self.span cards: the new windows hold all of them
+        self.windows += [list(self.windows[self.span]) for i in range(span - self.span)]
+        self.cards = deque(self.cards, maxlen=span)
+        self.rounds = deque(self.rounds, maxlen=span)
+        self.span = span
+
+    def share(self, totals):
+        """
+        Add the counts of this memory to totals, the window counts of all the players of a
+        table, and keep them updated when cards are pushed or removed.
+        """
+        for window in range(self.span+1):
+            for card in range(CARDS):
+                totals[window][card] += self.windows[window][card]
+        self.totals = totals
+
+    def push(self, card, roundnumber=0):
+        """
+        Add a card as the newest one, the oldest card is forgotten if the memory is full.
+        """
+        totals = self.totals
+        for window in range(1, self.span+1):
+            self.windows[window][card-1] += 1
+            if totals: totals[window][card-1] += 1
+            if len(self.cards) >= window: #the card at the end of the window leaves it
+                self.windows[window][self.cards[window-1]-1] -= 1
+                if totals: totals[window][self.cards[window-1]-1] -= 1
+        self.cards.appendleft(card)
+        self.rounds.appendleft(roundnumber)
+
+    def remove(self, card):
+        """
+        Remove the oldest copy of the card, if there is one.
+        """
+        for index in range(len(self.cards)-1, -1, -1):
+            if self.cards[index] == card:
+                break
+        else:
+            return
+        totals = self.totals
+        for window in range(index+1, self.span+1):
+            self.windows[window][card-1] -= 1
+            if totals: totals[window][card-1] -= 1
+            if len(self.cards) > window: #the next card enters the window
+                self.windows[window][self.cards[window]-1] += 1
+                if totals: totals[window][self.cards[window]-1] += 1
+        del self.cards[index]
+        del self.rounds[index]
+
+    def count(self, card, window=None):
+        """
+        Amount of the card among the newest window cards (all cards if window is None).
+        """
+        if window is None:
+            window = self.span
+        return self.windows[min(window, self.span)][card-1]
+
+    def counts(self, window=None):
+        if window is None:
+            window = self.span
+        return self.windows[min(window, self.span)]
+
+    def window(self, window=None):
+        """
+        List of the newest window cards, newest first.
+        """
+        if window is None:
+            window = self.span
+        return list(self.cards)[:window]
+
+    def snapshot(self):
+        return (tuple(self.cards), tuple(self.rounds), tuple(map(tuple, self.windows)))
+
+    def restore(self, state):
+        #the totals of the table are restored by Game.restore
+        cards, rounds, windows = state
+        self.cards = deque(cards, maxlen=self.span)
+        self.rounds = deque(rounds, maxlen=self.span)
+        self.windows = [list(counts) for counts in windows]
 
 
 class Player:
+    trace = NULLTRACE #sink of the decision records, set by Game
+    table = None #PlayerTable of the player (see playertable)
 
-    def __init__(self, name, personality=None, emotion=None, amountstrategy='random', willtodoubt=0.1, willtobluff=0.5):
+    def __init__(self, name, personality=None, emotion=None, amountstrategy='random', willtodoubt=0.1, willtobluff=0.5, rng=None):
         self.name = name
-        self.hand = [] #list of cards
+        self.hand = Hand() #amount of each card
+        self.rng = rng if rng else RANDOM #RandomSource of the player's decisions
 
         if not emotion:
-            self.emotion = Emotion(0, uniform(0.2, 0.8))
+            self.emotion = Emotion(0, self.rng.uniform(0.2, 0.8))
         else:
             self.emotion = emotion
         if not personality:
             self.personality = Personality(1,1,1)
         else:
             self.personality = personality
+        self.setevents(EVENTS)
 
         #Emotions/sort of
-        self.handvisible = [] #list of cards that may be visible to other players
-        self.hvcardround = [] #the round number when the card was added to the hand visible
+        self.handvisible = VisibleMemory() #last cards that may be visible to other players
         self.roundmemory = 0
         self.amountstrategy = amountstrategy
         self.willtodoubt = willtodoubt
@@ -125,8 +508,8 @@ class Player:
 
     # reset player game state when a new game start
     def start(self, resetemotion=False):
-        self.hand = []
-        self.handvisible = []
+        self.hand = Hand()
+        self.handvisible = VisibleMemory()
 
         #Reset stats
         self.won = 0
@@ -139,9 +522,36 @@ class Player:
         self.log_arousal = []
         self.log_valence = []
         self.log_cardsamount = []
+        self.setevents(self.events)
         if resetemotion:
             self.emotion.reset()
 
+    def snapshot(self):
+        """
+        State of the player in a game: hand, visible memory, emotion, stats and length of the logs.
+        """
+        return (self.hand.snapshot(), self.handvisible.snapshot(), self.emotion.snapshot(),
+                (self.won, self.gamewin, self.roundswin, self.doubts, self.rightdoubts, self.bluffs, self.bluffslost),
+                (len(self.log_arousal), len(self.log_valence), len(self.log_cardsamount)))
+
+    def restore(self, state):
+        hand, handvisible, emotion, stats, logs = state
+        self.hand.restore(hand)
+        self.handvisible.restore(handvisible)
+        self.emotion.restore(emotion)
+        self.won, self.gamewin, self.roundswin, self.doubts, self.rightdoubts, self.bluffs, self.bluffslost = stats
+        #the logs only grow: cut them back
+        del self.log_arousal[logs[0]:]
+        del self.log_valence[logs[1]:]
+        del self.log_cardsamount[logs[2]:]
+
+    def setevents(self, events):
+        """
+        Set the events the player reacts to and compile their changes of emotion for his selfcontrol.
+        """
+        self.events = events
+        self.reactions = events.table(self.personality.selfcontrol)
+
     def react2event(self, event):
         """
         Update emotions accordingly to the event.
@@ -149,26 +559,27 @@ class Player:
         Parameters
         ----------
         event : Event
-            Event object
+            Event object of the player's event set
 
         Returns
         -------
         None.
 
         """
-        if event.name == 'TimePass':
+        if event.log:
             self.log_valence.append(self.emotion.valence)
             self.log_arousal.append(self.emotion.arousal)
-        self.emotion.update(self.personality.selfcontrol, event)
+        valence, arousal = self.reactions[event.id]
+        self.emotion.change(valence, arousal)
 
     def bluffchance(self):
         return ((self.personality.haste + ((self.emotion.arousal+1)/2))/2)
 
     def pickcard(self):
         #Pick a card of the hand
-        return choice(self.hand)
+        return self.hand.draw(self.rng)
 
-    def chooseamount(self, card, printstats=True):
+    def chooseamount(self, card):
 
         total = self.hand.count(card)
         count = 1
@@ -181,11 +592,7 @@ class Player:
                 count = round(clamp(count, 1, total))
             # if the emotions are frozen pick a random amount of card
             else:
-                count = choice(np.arange(total)) + 1
-
-        if printstats:
-            print("True cards count: %s with haste: %s, selfcontrol: %s and arousal %s" % (
-            count, self.personality.haste, self.personality.selfcontrol, self.emotion.arousal))
+                count = self.rng.randrange(total) + 1
 
         return count
 
@@ -199,7 +606,7 @@ class Player:
         # else:
         #     raise Exception
 
-    def chooseamountbluff(self,printstats, maxcards=4 ):
+    def chooseamountbluff(self, maxcards=4):
 
         total = len(self.hand)
         max = min(total, maxcards)
@@ -213,15 +620,50 @@ class Player:
                 count = round(clamp(count, 1, max))
             # if the emotions are frozen pick a random amount of card
             else:
-                count = choice(np.arange(max)) + 1
-
-        if printstats:
-            print("Bluff cards count: %s with haste: %s, selfcontrol: %s and arousal %s" %(count, self.personality.haste, self.personality.selfcontrol, self.emotion.arousal))
+                count = self.rng.randrange(max) + 1
 
         return count
 
 
-    def gamble(self, currentcard, maxcards=4, printstats = True):
+    def memorywindow(self):
+        #Amount of the last visible cards of each player that this player remembers
+        return round(MEMORYSPAN * self.personality.memory)
+
+    def pickbluffcards(self, amount, maxcards):
+        """
+        Remove from the hand the cards of a bluff: first the cards that the player remembers
+        other players saw in his hand (less frequent first), then random cards.
+        """
+        cardstostack = []
+        remembered = self.handvisible.counts(self.memorywindow()) # cards in memory
+
+        # select only the cards that has frequency lower than 50% of the max count of cards
+        cardsvisible = [card for card in range(1, CARDS+1) if 0 < remembered[card-1] < 0.50 * maxcards]
+
+        # cards in hand that the player remember that other player has
+        handvisible = [card for card in cardsvisible if card in self.hand]
+        # sort the list by the element frequency
+        handvisible = sorted(handvisible, key=self.hand.count)
+
+        if amount > len(self.hand):
+            amount = len(self.hand)
+
+        for card in handvisible:
+            played = min(amount, self.hand.count(card))
+            self.hand.remove(card, played)
+            cardstostack += [card]*played
+            amount = amount - played
+            if amount == 0:
+                break
+
+        while amount > 0:
+            bluffcard = self.hand.pop(self.rng)  # pick one randomly
+            cardstostack.append(bluffcard)
+            amount = amount - 1
+
+        return cardstostack
+
+    def gamble(self, currentcard, maxcards=4):
         #Pick a card (if it is the first npc to play)
         #and choose the amount of cards
 
@@ -229,194 +671,74 @@ class Player:
             currentcard = self.pickcard()
 
         if not currentcard in self.hand: #bluff
-            if printstats:
-                print('%s%s is bluffing%s' % (Color.purple, self.name, Color.clear))
-            amount = self.chooseamountbluff(printstats)
-
-            cardstostack = []
-            memorylimit = round(10 * self.personality.memory)
-            cardsvisible = list(reversed(self.handvisible))[:memorylimit] # cards in memory
-
-            # select only the cards that has frequency lower than 50% of the max count of cards
-            cardsvisible = [card for card in cardsvisible if cardsvisible.count(card) < 0.50 * maxcards]
-
-            # cards in hand that the player remember that other player has
-            handvisible = [card for card in self.hand if card in cardsvisible]
-            # sort the list by the element frequency
-            handvisible = sorted(handvisible, key=handvisible.count)
-
-            if amount > len(self.hand):
-                amount = len(self.hand)
-
-            while amount > 0:
-                for card in handvisible:
-                    if card in self.hand:
-                        self.hand.remove(card)
-                        cardstostack.append(card)
-                        amount = amount - 1
-
-                    if amount == 0:
-                        break
-
-                if amount > 0:
-                    bluffcard = self.hand.pop(choice(np.arange(len(self.hand))))  # pick one randomly
-                    cardstostack.append(bluffcard)
-                    amount = amount - 1
-
-            if printstats:
-                print("Lying => cards: %s Memory: %s, Hand visible: %s" % (cardstostack, cardsvisible, handvisible))
-
-        elif Random.get(self.bluffchance()) == 1: #choose to bluff
-            if printstats:
-                print('%s%s is bluffing (AROUSAL(%f) AND HASTE(%f) CONDITION)%s' % (Color.purple, self.name, (self.emotion.arousal+1)/2, self.personality.haste, Color.clear))
-                print('chance %f' % (self.bluffchance()))
-            amount = self.chooseamountbluff(printstats)
-            cardstostack = []
-            memorylimit = round(10 * self.personality.memory)
-            cardsvisible = list(reversed(self.handvisible))[:memorylimit] # cards in memory
-
-            # select only the cards that has frequency lower than 50% of the max count of cards
-            cardsvisible = [card for card in cardsvisible if cardsvisible.count(card) < 0.50 * maxcards]
-
-            # cards in hand that the player remember that other player has
-            handvisible = [card for card in self.hand if card in cardsvisible]
-            # sort the list by the element frequency
-            handvisible = sorted(handvisible, key=handvisible.count)
-
-            if amount > len(self.hand):
-                amount = len(self.hand)
-
-            while amount > 0:
-                for card in handvisible:
-                    if card in self.hand:
-                        self.hand.remove(card)
-                        cardstostack.append(card)
-                        amount = amount - 1
-
-                    if amount == 0:
-                        break
-
-                if amount > 0:
-                    bluffcard = self.hand.pop(choice(np.arange(len(self.hand))))  # pick one randomly
-                    cardstostack.append(bluffcard)
-                    amount = amount - 1
-
-            if printstats:
-                print("Lying => cards: %s Memory: %s, Hand visible: %s" % (cardstostack, cardsvisible, handvisible))
+            branch, probability = 'forced', NAN
+            amount = self.chooseamountbluff()
+            cardstostack = self.pickbluffcards(amount, maxcards)
+
+        elif self.rng.bernoulli(self.bluffchance()): #choose to bluff
+            branch, probability = 'bluff', self.bluffchance()
+            amount = self.chooseamountbluff()
+            cardstostack = self.pickbluffcards(amount, maxcards)
 
         else:
+            branch, probability = 'truth', self.bluffchance()
             #choose amount
-            amount = self.chooseamount(currentcard, printstats)
+            amount = self.chooseamount(currentcard)
             #remove from hand
-            cardstoremove = [i for i,n in enumerate(self.hand) if n==currentcard] #creats a list with indexes of the card chosen
-            cardstoremove = cardstoremove[:amount] #prohibits to remove from the list more cards than decided
-            for i in cardstoremove[::-1]:
-                self.hand.pop(i)
-                cardstostack = [currentcard]*amount
+            self.hand.remove(currentcard, amount)
+            cardstostack = [currentcard]*amount
+        if self.trace.enabled:
+            self.trace.emit(Decision('gamble', self.name, branch, len(cardstostack), probability, currentcard, tuple(cardstostack), self.emotion.arousal, self.emotion.valence))
         return cardstostack,currentcard
 
-    def evaluatedoubt(self, currentcard, turn, manyCards, nextPlayer, possibleCards, currentPlayer, otherPlayers, lenHand=None, printstats = True):
+    def evaluatedoubt(self, currentcard, turn, manyCards, nextPlayer, possibleCards, currentPlayer, otherPlayers, lenHand=None, viewedOthers=None):
         #Check if it will doubt
+        #viewedOthers: visible cards of currentcard in the hands of otherPlayers (in this player's memory window),
+        #when the game already counted them
         hisArousalChance = (self.emotion.arousal + 1) / 2
-        if printstats:
-            print('%sEvaluate doubt%s' % (Color.blue, Color.clear))
-            print('%s has arousal %f (arousal chance=%s)' % (self.name, self.emotion.arousal,hisArousalChance))
-        memorymodificator = round(10 * self.personality.memory)
-        if printstats:
-            print('%s has memory %f and modificator %i' % (self.name, self.personality.memory, memorymodificator))
-            #print(list(reversed(currentPlayer.hand)))
-        currentPlayerCards = list(reversed(currentPlayer.handvisible))[:memorymodificator]
-        viewedOthers = []
-        for other in otherPlayers:
-            viewedOthers += list(reversed(other.handvisible))[:memorymodificator]
-
-        allViewedCards = viewedOthers+self.hand
-        viewdPlayersCards = allViewedCards.count(currentcard)
-        viewdCurrentCards = currentPlayerCards.count(currentcard)
+        memorymodificator = self.memorywindow()
+        viewdPlayersCards = self.hand.count(currentcard)
+        if viewedOthers is None:
+            for other in otherPlayers:
+                viewdPlayersCards += other.handvisible.count(currentcard, memorymodificator)
+        else:
+            viewdPlayersCards += viewedOthers
+        viewdCurrentCards = currentPlayer.handvisible.count(currentcard, memorymodificator)
         totalOfCards = (possibleCards+1)-manyCards
         isNext = nextPlayer == self
-        hasCards = self.hand.count(currentcard) > 0
-        if printstats:
-            print('Others cards %s' % (viewedOthers))
-            print('His cards %s' % (self.hand))
-            print('Is the next player=%s (next=%s) and has cards=%s' % (isNext, nextPlayer.name,hasCards))
-            print('%s(current) visible cards %s' % (currentPlayer.name, currentPlayerCards))
-            print('%s(current) arousal is %s' % (currentPlayer.name, currentPlayer.emotion.arousal))
-            print('%s(current) valence is %s' % (currentPlayer.name, currentPlayer.emotion.valence))
-            print('Cards on people=%s, Cards on %s=%s, Total of cards=%s, Cards played=%s, Which cards played=%s' % (viewdPlayersCards, currentPlayer.name, viewdCurrentCards, possibleCards, manyCards, currentcard))
-
-
+        hasCards = currentcard in self.hand
+        probability = NAN
 
         # todo see if player is next, remake doubt chance
         if lenHand == 0: #if the player don't have cards left, doubt it
-            if printstats:
-                print('if the player dont have cards left, doubt it')
-                print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-            return True
+            branch, doubt = 'nocards', True
         elif lenHand < manyCards: #don't have enough cards into his hand
-            if printstats:
-                print('dont have enough cards into his hand')
-                print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-            return True
+            branch, doubt = 'notenough', True
         elif viewdPlayersCards >= totalOfCards: #know that the player dont have the cards
-            if printstats:
-                print('%s%s knows that %s is liyng%s' % (Color.red, self.name, currentPlayer.name, Color.clear))
-                print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-            return True
+            branch, doubt = 'knowslie', True
         elif viewdCurrentCards >= manyCards: #know that the player have the cards
-            if printstats:
-                print('%s%s knows that %s is telling truth%s' % (Color.green, self.name, currentPlayer.name, Color.clear))
-                print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-            return False
-        elif currentPlayer.emotion.arousal > 0 and Random.get(currentPlayer.emotion.arousal) == 1  and currentPlayer.emotion.valence < 0: #make chance to doubt from player with high and positive arousal
-            if printstats:
-                print('%s%s doubt %s based on arousal(%s)%s' % (Color.blue, self.name, currentPlayer.name, currentPlayer.emotion.arousal, Color.clear))
-                print('%s%s valence is %s%s' % (Color.blue, currentPlayer.name, currentPlayer.emotion.valence,  Color.clear))
-                print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-            return True
+            branch, doubt = 'knowstruth', False
+        elif currentPlayer.emotion.arousal > 0 and self.rng.bernoulli(currentPlayer.emotion.arousal) and currentPlayer.emotion.valence < 0: #make chance to doubt from player with high and positive arousal
+            branch, doubt, probability = 'arousal', True, currentPlayer.emotion.arousal
         elif isNext and not hasCards: #is the next and dont have the cards
-            if printstats:
-                print('%s%s is the next player and dont have the current card%s' % (Color.blue, self.name,Color.clear))
-                print('%s%s has cards=%s, his arousal chance=%s%s' % (Color.blue, self.name, hasCards, hisArousalChance, Color.clear))
-            doubt = Random.get(hisArousalChance)
-            if doubt==0:
-                if printstats:
-                    print('%swill believe%s' % (Color.green, Color.clear))
-                    print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-                return False
-            else:
-                if printstats:
-                    print('%swill doubt%s' % (Color.red, Color.clear))
-                    print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-                return True
-
+            branch, probability = 'next', hisArousalChance
+            doubt = self.rng.bernoulli(hisArousalChance)
         else: #that is the real doubt, now he'll evalate if will doubt or believe
             doubtPercent = ((self.emotion.arousal + 1) / 2) * ((manyCards - viewdCurrentCards) / (possibleCards - viewdPlayersCards))
-            if printstats:
-                print('Doubt chance=%s, formula=%s' % (doubtPercent, ((manyCards - viewdCurrentCards) / (possibleCards - viewdPlayersCards))))
-                print('%s%s dont know%s' % (Color.cyan, self.name, Color.clear))
-                print('chance to doubt %f' % doubtPercent)
-            doubt = Random.get(doubtPercent)
-            if printstats:
-                print('result from random %i' % doubt)
-            if doubt==0:
-                if printstats:
-                    print('%swill believe%s' % (Color.green, Color.clear))
-                    print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-                return False
-            else:
-                if printstats:
-                    print('%swill doubt%s' % (Color.red, Color.clear))
-                    print('%sEnd Evaluate doubt%s' % (Color.blue, Color.clear))
-                return True
+            branch, probability = 'chance', doubtPercent
+            doubt = self.rng.bernoulli(doubtPercent)
 
+        if self.trace.enabled:
+            self.trace.emit(Decision('doubt', self.name, branch, int(doubt), probability, currentcard, (), self.emotion.arousal, self.emotion.valence, currentPlayer.name))
+        return doubt
 
-    # def doubtorgamble(self, currentcard, printstats):
+
+    # def doubtorgamble(self, currentcard):
     #     #Decide wether to doubt or play
     #     if self.evaluatedoubt(currentcard,turn=0):
     #         return [],currentcard #doubt
     #     else:
-    #         return self.gamble(currentcard, printstats) #gamble
+    #         return self.gamble(currentcard) #gamble
 
     def add2hand(self, cards):
         self.hand += cards
@@ -432,15 +754,14 @@ class Player:
         be added to the list.
         """
         if addall:
-            self.handvisible += cards
-            self.hvcardround += [roundnumber]*len(cards)
+            for card in cards:
+                self.handvisible.push(card, roundnumber)
         else:
             for card in cards:
                 amountincards = cards.count(card)
                 amountvisible = self.handvisible.count(card)
-                if amountincards > amountvisible:
-                    self.handvisible += [card]*(amountincards-amountvisible)
-                    self.hvcardround += [roundnumber]*(amountincards-amountvisible)
+                for i in range(amountincards-amountvisible):
+                    self.handvisible.push(card, roundnumber)
 
     def removefromhandvisible(self, cards):
         """
@@ -448,12 +769,7 @@ class Player:
         This will occur when other player doubted but the current player was telling the truth
         """
         for card in cards:
-            try:
-                index = self.handvisible.index(card)
-                self.handvisible.pop(index)
-                self.hvcardround.pop(index)
-            except:
-                pass
+            self.handvisible.remove(card)
 
     def totalcards(self):
         return len(self.hand)
@@ -462,13 +778,13 @@ class Player:
         print(self.hand)
 
     def printvisiblehand(self):
-        print(self.handvisible)
+        print(list(reversed(self.handvisible.window())))
 
 
 
 class Game:
 
-    def __init__(self, players, deck):
+    def __init__(self, players, deck, rng=None, events=None, trace=None):
         """
         Parameters
         ----------
@@ -476,6 +792,13 @@ class Game:
             List of players in the game.
         deck : Deck
             Object Deck with all cards.
+        rng : RandomSource
+            Random generator used to shuffle the deck. Default is the module RANDOM.
+        events : EventSet
+            Events of the game, the players react to them. Default is EVENTS.
+        trace : NullSink
+            Sink of the decision records of the game and its players (see tracing).
+            Default is NULLTRACE, that discards them.
 
         Returns
         -------
@@ -485,36 +808,114 @@ class Game:
         self.rounds = 0
         self.players = players
         self.deck = deck
+        self.rng = rng if rng else RANDOM
+        self.events = EVENTS if events is None else events
+        for player in players:
+            player.setevents(self.events)
+        self.settrace(NULLTRACE if trace is None else trace)
         self.roundspergame = []
 
         self.lastPlayer = None
+        self.dealt = False
+        #seat of each player and the order of play starting at each seat
+        self.seat = {player: i for i, player in enumerate(players)}
+        self.rotations = [players[i:] + players[:i] for i in range(len(players))]
+        self.sortdoubters()
+        #visible cards of all the players, by memory window, up to the largest memory window of the table
+        self.span = max([MEMORYSPAN] + [player.memorywindow() for player in players])
+        self.visible = [[0]*CARDS for i in range(self.span+1)]
+        for player in players:
+            player.handvisible.resize(self.span)
+            player.handvisible.share(self.visible)
+        #players of the same PlayerTable react together to the events of all the players
+        tables = set(player.table for player in players)
+        self.table = tables.pop() if len(tables) == 1 else None
+
+    def settrace(self, trace):
+        self.trace = trace
+        for player in self.players:
+            player.trace = trace
 
+    def randomsources(self):
+        #distinct RandomSources of the game and its players, in a fixed order
+        sources = {}
+        for rng in [self.rng] + [player.rng for player in self.players]:
+            sources.setdefault(id(rng), rng)
+        return list(sources.values())
 
+    def snapshot(self):
+        """
+        State of the game between two rounds: the players (hands, visible memories, emotions,
+        stats), the visible cards of the table, the rounds played, the last player and the
+        state of the random generators. The snapshot is immutable, it can be restored many times.
+        """
+        return (self.rounds, self.lastPlayer, self.dealt, len(self.roundspergame), tuple(map(tuple, self.visible)),
+                tuple(player.snapshot() for player in self.players),
+                tuple(rng.snapshot() for rng in self.randomsources()))
+
+    def restore(self, snapshot):
+        """
+        Go back to a snapshot of this game.
+        """
+        rounds, self.lastPlayer, self.dealt, games, visible, players, sources = snapshot
+        self.rounds = rounds
+        del self.roundspergame[games:]
+        for counts, saved in zip(self.visible, visible):
+            counts[:] = saved
+        for player, state in zip(self.players, players):
+            player.restore(state)
+        for rng, state in zip(self.randomsources(), sources):
+            rng.restore(state)
+        self.sortdoubters()
+
+    def rollout(self, snapshot, seed=None, maxrounds=1000):
+        """
+        Restore a snapshot and play the rest of the game.
+
+        Parameters
+        ----------
+        snapshot : tuple
+            Snapshot of this game.
+        seed : int
+            New seed of the random generators, so each rollout plays a different future.
+            None replays the future of the snapshot.
+        maxrounds : int
+            Maximum number of rounds of the game.
+
+        Returns
+        -------
+        Player
+            Winner of the rollout, None if the game reached maxrounds.
 
+        """
+        self.restore(snapshot)
+        if seed is not None:
+            for i, rng in enumerate(self.randomsources()):
+                rng.reseed(np.random.SeedSequence(seed, spawn_key=(i,)))
+        winners = sum(player.won for player in self.players)
+        self.playgame(maxrounds)
+        return self.lastPlayer if sum(player.won for player in self.players) > winners else None
+
+    def playgame(self, maxrounds=1000, printstats=False):
+        """
+        Parameters
+        ----------
+        maxrounds : int
+            Maximum number of rounds.
+        printstats : bool
+            Print the decisions of the game (traces to a ConsoleSink if the game has no trace).
 
-    def playgame(self, maxrounds=1000, printstats=True):
+        """
+        if printstats and not self.trace.enabled:
+            self.settrace(ConsoleSink())
         gameover = False
         while self.rounds < maxrounds and not gameover:
-            if printstats:
-                print(' ')
-                print('%sRound number %i:%s' %(Color.purple, self.rounds+1,Color.clear))
-
-                gameover = self.playround(printstats)
-
-                print('-------------------------------')
-                self.printhands()
-                print('End of round number %i' %(self.rounds))
-                if gameover:
-                    self.lastPlayer.won += 1
-                    print('%s won.' %self.lastPlayer.name)
-                print('-------------------------------')
-            else:
-                gameover = self.playround(printstats)
-                if gameover:
-                    self.lastPlayer.won += 1
+            gameover = self.playround()
+            if gameover:
+                self.lastPlayer.won += 1
         self.roundspergame.append(self.rounds)
-        print('Total rounds: %i' % self.rounds)
-        print('%s won' % self.lastPlayer.name)
+        if self.trace.enabled:
+            self.trace.emit(Decision('game', self.lastPlayer.name, 'won' if gameover else 'maxrounds', self.rounds))
             # soma = 0
             # for player in self.players:
             #     soma += len(player.hand)
@@ -527,16 +928,6 @@ class Game:
             if printvisibles:
                 player.printvisiblehand()
 
-    def printmovestats(self, player1, cards, currentcard, player2=None, doubtwinner=None):
-        if not player2:
-            print('%s%s played cards %s. Current card: %i%s' %(Color.yellow, player1.name, cards, currentcard, Color.clear))
-        else:
-            print('%s doubted %s' %(player1.name, player2.name))
-            if doubtwinner==player1:
-                print('%s%s bluffed, %s was right%s' %(Color.red, player2.name, player1.name, Color.clear))
-            else:
-                print('%s%s was telling the truth, %s was wrong%s' %(Color.green, player2.name, player1.name, Color.clear))
-
     def getdoubtprob(self, player):
         return 0.3 * player.personality.haste + 0.7 * ((1 + player.emotion.arousal) / 2)
 
@@ -544,26 +935,75 @@ class Game:
         list.sort(key=self.getdoubtprob, reverse=True)
         return list
 
-    def playround(self, printstats=True):
+    def sortdoubters(self):
+        """
+        Sort all the players in the order they evaluate a doubt: higher getdoubtprob first,
+        ties by seat (the order of sortbyhaste2doubt).
+        """
+        self.doubtkey = [(-self.getdoubtprob(player), i) for i, player in enumerate(self.players)]
+        self.doubtkeys = sorted(self.doubtkey)
+        self.doubtorder = [self.players[i] for key, i in self.doubtkeys]
+
+    def react(self, player, event):
+        """
+        The player reacts to the event and takes his new place in the order of doubt.
+        """
+        player.react2event(event)
+        seat = self.seat[player]
+        old = self.doubtkey[seat]
+        new = (-self.getdoubtprob(player), seat)
+        if new != old:
+            position = bisect_left(self.doubtkeys, old)
+            del self.doubtkeys[position]
+            del self.doubtorder[position]
+            position = bisect_left(self.doubtkeys, new)
+            self.doubtkeys.insert(position, new)
+            self.doubtorder.insert(position, player)
+            self.doubtkey[seat] = new
+
+    def reactall(self, players, event):
+        """
+        The players react to the same event, at once if they are in a PlayerTable.
+        The order of doubt must be sorted again after.
+        """
+        if self.table is not None:
+            self.table.react(event, [player.id for player in players])
+        else:
+            for player in players:
+                player.react2event(event)
+
+    def tracechallenge(self, doubter, player, lastHand, currentcard, bluffed):
+        self.trace.emit(Decision('challenge', doubter.name, 'bluff' if bluffed else 'truth', int(bluffed), NAN, currentcard, tuple(lastHand), doubter.emotion.arousal, doubter.emotion.valence, player.name))
+
+    def traceround(self, branch):
+        self.trace.emit(Decision('round', self.lastPlayer.name, branch, self.rounds, NAN, 0, (), self.lastPlayer.emotion.arousal, self.lastPlayer.emotion.valence))
+
+    def deal(self):
+        # Give cards
+        cards = self.deck.shuffledeck(self.rng)
+        while len(cards) > 0:
+            for player in self.players:
+                if len(cards) > 0:
+                    player.hand.append(cards.pop())
+        self.dealt = True
+        if self.trace.enabled:
+            self.trace.dealt(self)
+
+    def playround(self):
+        events = self.events
+        trace = self.trace.enabled
         over = False #flag for round over (someone doubted)
         gameover = False #flag for game over (someone won)
-        if self.rounds == 0:
-            # Give cards
-            cards = self.deck.shuffledeck()
-            while len(cards) > 0:
-                for player in self.players:
-                    if len(cards) > 0:
-                        player.hand.append(cards.pop())
-            if printstats: self.printhands()
+        if not self.dealt:
+            self.deal()
 
         lastHand = []
-        stack = []
+        stack = Hand()
         currentcard = None
 
-        #Creates the list of player starting from the next player (the first round starts with Player 1, than 2, 3,...)
+        #The list of player starting from the next player (the first round starts with Player 1, than 2, 3,...)
         if self.lastPlayer:
-            currentPlayerIndex = self.players.index(self.lastPlayer) + 1
-            orderPlayerList = [self.players[currentPlayerIndex+i] if i+currentPlayerIndex < len(self.players) else self.players[(currentPlayerIndex+i)%len(self.players)] for i in range(len(self.players))]
+            orderPlayerList = self.rotations[(self.seat[self.lastPlayer] + 1) % len(self.players)]
         else: #First round
             orderPlayerList = self.players
 
@@ -573,7 +1013,7 @@ class Game:
             #Performs each player's move
             for orderedIndex,player in enumerate(orderPlayerList):
                 #Decide wether to gamble or to doubt
-                cards, currentcard = player.gamble(currentcard, maxcards=(self.deck.numberofdecks*4), printstats=printstats)
+                cards, currentcard = player.gamble(currentcard, maxcards=(self.deck.numberofdecks*4))
 
                 #If player doubted, check if the last player bluffed
                 if len(cards) == 0: #doubted
@@ -583,10 +1023,10 @@ class Game:
                         player.add2hand(stack)
                         player.add2handvisible(lastHand, self.rounds, addall = False)
                         self.lastPlayer.removefromhandvisible(lastHand)
-                        if printstats: self.printmovestats(player, [], currentcard, self.lastPlayer, self.lastPlayer)
+                        if trace: self.tracechallenge(player, self.lastPlayer, lastHand, currentcard, False)
                         self.lastPlayer.roundswin += 1
-                        self.lastPlayer.react2event(Event.getEvent('RoundWon'))
-                        player.react2event(Event.getEvent('RoundLost'))
+                        self.react(self.lastPlayer, events.RoundWon)
+                        self.react(player, events.RoundLost)
 
 
                     else: #Last player was bluffing
@@ -595,9 +1035,9 @@ class Game:
                         self.lastPlayer.add2hand(stack)
                         self.lastPlayer.add2handvisible(lastHand, self.rounds, addall = False)
                         player.removefromhandvisible(lastHand)
-                        self.lastPlayer.react2event(Event.getEvent('RoundLost'))
-                        player.react2event(Event.getEvent('RoundWon'))
-                        if printstats: self.printmovestats(player, [], currentcard, self.lastPlayer, player)
+                        self.react(self.lastPlayer, events.RoundLost)
+                        self.react(player, events.RoundWon)
+                        if trace: self.tracechallenge(player, self.lastPlayer, lastHand, currentcard, True)
                         player.roundswin += 1
                     over = True
                     self.lastPlayer = player
@@ -607,69 +1047,67 @@ class Game:
                 else: #played
                     #Just raises the confidence of the last player if he bluffed and no one noticed
                     if lastHand != [currentcard]*len(lastHand):
-                        self.lastPlayer.react2event(Event.getEvent('BluffOK'))
-                    if printstats: self.printmovestats(player, cards, currentcard, None)
-                    lastHand = deepcopy(cards)
+                        self.react(self.lastPlayer, events.BluffOK)
+                    lastHand = list(cards)
                     stack += lastHand
                     if lastHand != [currentcard]*len(lastHand):
                         player.bluffs += 1
-                    #Get the list of players that is not the current player
-                    doubting_player = [d_player for d_player in self.players if d_player != player]
                     #Get who is the next player
                     if orderedIndex+1 == len(orderPlayerList):
                         nextPlayer = orderPlayerList[0]
                     else:
                         nextPlayer = orderPlayerList[orderedIndex+1]
-                    # sort the list by the player probability to doubt
-                    self.sortbyhaste2doubt(doubting_player)
-                    #Check if player from the list wants to doubt
-                    for d_player in doubting_player:
-                        #Get list of players that are NOT the current player and NOT the player evaluating the doubt
-                        otherPlayers = [other for other in doubting_player if other != d_player]
-                        doubt = False
-                        doubt = d_player.evaluatedoubt(currentcard,  turn=1, manyCards=len(cards),nextPlayer=nextPlayer, possibleCards=(self.deck.numberofdecks*4) , currentPlayer=player,  otherPlayers=otherPlayers, lenHand=len(player.hand), printstats=printstats) #If the player has no cards left, someone must doubt
+                    #Check if player from the list wants to doubt, the list is sorted by the player probability to doubt
+                    for d_player in self.doubtorder:
+                        if d_player is player:
+                            continue
+                        window = d_player.memorywindow()
+                        #visible cards in the hands of the players that are NOT the current player and NOT the player evaluating the doubt
+                        viewedOthers = self.visible[window][currentcard-1] - player.handvisible.count(currentcard, window) - d_player.handvisible.count(currentcard, window)
+                        doubt = d_player.evaluatedoubt(currentcard,  turn=1, manyCards=len(cards),nextPlayer=nextPlayer, possibleCards=(self.deck.numberofdecks*4) , currentPlayer=player,  otherPlayers=None, lenHand=len(player.hand), viewedOthers=viewedOthers) #If the player has no cards left, someone must doubt
                         if doubt:
                             d_player.doubts += 1
                             over = True
                             if lastHand == [currentcard]*len(lastHand):
-                                if printstats: self.printmovestats(d_player, [], currentcard, player, player)
+                                if trace: self.tracechallenge(d_player, player, lastHand, currentcard, False)
                                 d_player.add2hand(stack)
                                 d_player.add2handvisible(lastHand, self.rounds, addall = False)
                                 player.removefromhandvisible(lastHand)
                                 player.roundswin += 1
-                                player.react2event(Event.getEvent('RoundWon'))
-                                d_player.react2event(Event.getEvent('RoundLost'))
+                                self.react(player, events.RoundWon)
+                                self.react(d_player, events.RoundLost)
                             else:
-                                if printstats: self.printmovestats(d_player, [], currentcard, player, d_player)
+                                if trace: self.tracechallenge(d_player, player, lastHand, currentcard, True)
                                 player.add2hand(stack)
                                 player.add2handvisible(lastHand, self.rounds, addall = False)
                                 player.bluffslost += 1
                                 d_player.rightdoubts += 1
                                 d_player.roundswin += 1
-                                d_player.react2event(Event.getEvent('RoundWon'))
-                                player.react2event(Event.getEvent('RoundLost'))
-                            break #Someone already doubted, leave FOR
+                                self.react(d_player, events.RoundWon)
+                                self.react(player, events.RoundLost)
+                            break #Someone already doubted, leave FOR (the order of doubt changed)
                 self.lastPlayer = player
                 #Check if player has no cards
                 if len(self.lastPlayer.hand)==0:
                     self.rounds += 1
                     for player in orderPlayerList:
                         player.log_cardsamount.append(len(player.hand))
+                    if trace: self.traceround('empty')
                     return True #Gameover
                 #Check if player is close to win (20% of the initial amount of cards received)
 #                else:
 #                    if len(self.lastPlayer.hand) <= 0.2*len(self.deck.cards)/len(self.players):
-#                        self.lastPlayer.react2event(Event.getEvent('IClose2Win'))
+#                        self.lastPlayer.react2event(events.IClose2Win)
 #                        for others in [other for other in self.players if other != self.lastPlayer]:
-#                            others.react2event(Event.getEvent('SomeoneClose2Win'))
+#                            others.react2event(events.SomeoneClose2Win)
 
                 if over: #If someone doubted, the round is over
                     break #Someone already doubted, leave FOR
 
             player_close2win = []
             player_notclose = []
+            self.reactall(orderPlayerList, events.TimePass)
             for player in orderPlayerList:
-                player.react2event(Event.getEvent('TimePass'))
                 player.log_cardsamount.append(len(player.hand))
                 #Check if one or more players are close to win
                 if len(player.hand) <= 0.2*len(self.deck.cards)/len(self.players):
@@ -678,12 +1116,13 @@ class Game:
                     player_notclose.append(player)
             #If one or more players are close to win, react to that event
             if len(player_close2win) > 0:
-                for player in player_close2win:
-                    player.react2event(Event.getEvent('IClose2Win'))
-                for player in player_notclose:
-                    player.react2event(Event.getEvent('SomeoneClose2Win'))
+                self.reactall(player_close2win, events.IClose2Win)
+                self.reactall(player_notclose, events.SomeoneClose2Win)
+            #every player reacted, sort again instead of moving each one
+            self.sortdoubters()
 
             self.rounds += 1
+        if trace: self.traceround('doubt')
         return gameover
 
 class Deck:
@@ -712,16 +1151,21 @@ class Deck:
     def printdeck(self):
         print(self.cards)
 
-    def shuffledeck(self):
+    def shuffledeck(self, rng=None):
         """
+        Parameters
+        ----------
+        rng : RandomSource
+            Random generator. Default is the module RANDOM.
+
         Returns
         -------
         shuffled : list
             Shuffled deck.
 
         """
-        shuffled = deepcopy(self.cards)
-        shuffle(shuffled)
+        shuffled = list(self.cards)
+        (rng if rng else RANDOM).shuffle(shuffled)
         return shuffled
 
 
@@ -750,47 +1194,250 @@ def showresults(players):
 
 
 # prepare players for the next game
-def prepareplayers(players, resetemotions=False):
-    shuffle(players)
+def prepareplayers(players, resetemotions=False, rng=None):
+    (rng if rng else RANDOM).shuffle(players)
     for player in players:
         # reset player info from past game
         player.start(resetemotions)
 
 
-def simulategames(games=100, printstats=False, resetemotions=False, plotrounddata = False):
-    deck = Deck(2)
-    #deck.printdeck()
+def defaultplayers(rng=None):
 #    players = [Player('Player' + str(i+1), personality = Personality(uniform(0, 1), uniform(0.2, 0.8), uniform(0, 1)), emotion = Emotion(0, uniform(0.2, 0.8)) ,amountstrategy = strat, willtodoubt=doubt, willtobluff=bluff) for i,strat, doubt, bluff in zip(range(6),['random','random','cautious','cautious','aggressive','aggressive'], [0,0,0,0,0,0], [0.9,0.7,0.9,0.7,0.9,0.7])]
     players = []
-    players.append(Player('Player1', personality = Personality(0.9,0.9, 0.1), emotion = Emotion(0, 0)))
-    players.append(Player('Player2', personality = Personality(0.9,0.1, 0.9), emotion = Emotion(0, 0)))
-    players.append(Player('Player3', personality = Personality(0.1,0.9, 0.9), emotion = Emotion(0, 0)))
-    players.append(Player('Player4', personality = Personality(0.5,0.5, 0.5), emotion = Emotion(0, 0)))
-    players.append(Player('Player5', personality = Personality(0.9,0.9, 0.9), emotion = Emotion(0, 0)))
-    players.append(Player('Player6', personality = Personality(0.1,0.1, 0.1), emotion = Emotion(0, 0)))
+    players.append(Player('Player1', personality = Personality(0.9,0.9, 0.1), emotion = Emotion(0, 0), rng = rng))
+    players.append(Player('Player2', personality = Personality(0.9,0.1, 0.9), emotion = Emotion(0, 0), rng = rng))
+    players.append(Player('Player3', personality = Personality(0.1,0.9, 0.9), emotion = Emotion(0, 0), rng = rng))
+    players.append(Player('Player4', personality = Personality(0.5,0.5, 0.5), emotion = Emotion(0, 0), rng = rng))
+    players.append(Player('Player5', personality = Personality(0.9,0.9, 0.9), emotion = Emotion(0, 0), rng = rng))
+    players.append(Player('Player6', personality = Personality(0.1,0.1, 0.1), emotion = Emotion(0, 0), rng = rng))
+    return players
+
+
+def playgames(players, deck, games, rng=None, printstats=False, resetemotions=False, plotrounddata=False, first=0, trace=None, store=None):
+    """
+    Play games in sequence with the same players.
+
+    Parameters
+    ----------
+    printstats : bool
+        Print the decisions of the games, the same as trace=ConsoleSink().
+    plotrounddata : str
+        Directory where the cards and the emotions of each game are plotted
+        (game-NNNNNNNNN.png, see report.plotgame), nothing is shown.
+    trace : NullSink
+        Sink of the decision records (see tracing). Default is NULLTRACE.
+    store : ResultWriter
+        Write the outcome and the logs of each game to the store instead of returning them.
+
+    Returns
+    -------
+    winnerstats : list
+        [haste, memory, selfcontrol, arousal, valence] of the winner of each game.
+        Empty if store is given.
+    winner : list
+        Name of the winner of each game. Empty if store is given.
+
+    """
+    if trace is None and printstats:
+        trace = ConsoleSink()
+    if plotrounddata is True:
+        raise ValueError('plotrounddata is the directory where the games are plotted')
+    if plotrounddata:
+        os.makedirs(plotrounddata, exist_ok=True)
     winner = []
     winnerstats = []
-    game = Game(players, deck)
-    for i in range(games):
-        prepareplayers(players, resetemotions)
-        print('Game %i' %i)
-        game = Game(players, deck)
-        game.playgame(printstats=printstats)
-        if plotrounddata: plotPlayersEmotion(players)
+    for i in range(first, first + games):
+        prepareplayers(players, resetemotions, rng)
+        game = Game(players, deck, rng, trace=trace)
+        game.playgame()
+        if plotrounddata: plotPlayersEmotion(players, os.path.join(plotrounddata, 'game-%09i.png' % i))
+        if store is not None:
+            store.append(players, game.rounds)
+            continue
         for player in players:
             if player.won == 1:
                 winner.append(player.name)
                 winnerstats.append([player.personality.haste, player.personality.memory, player.personality.selfcontrol, player.emotion.arousal, player.emotion.valence])
-    # fig, ax = plt.subplots(figsize=(8,8), dpi=150)
+    return winnerstats, winner
 
-    #plt.scatter(np.arange(1,7), [player.won for player in players])
-    # plt.scatter([player.name for player in players], [player.won for player in players])
-    # plt.show()
-    # showresults(players)
+
+def replaypath(directory, first):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, 'block-%09i.replay' % first)
+
+
+def blockplayers(players, rng):
+    """
+    Players of a block: a copy of players that draws from rng, or defaultplayers(rng).
+    """
+    if not players:
+        return defaultplayers(rng)
+    players = deepcopy(players)
+    for player in players:
+        player.rng = rng
+    return players
+
+
+def simulateblock(block):
+    """
+    Play a block of games with new players and a random generator of its own.
+    simulategames sends the blocks to the worker processes.
+
+    Parameters
+    ----------
+    block : tuple
+        (first, games, seed, players, numberofdecks, quantized, printstats, resetemotions,
+        plotrounddata, trace, store, profile, replay): index of the first game of the block,
+        amount of games, numpy.random.SeedSequence of the block and the options of
+        simulategames (profile is True to profile the block).
+
+    Returns
+    -------
+    players, winnerstats, winner of the block and the summary of its Profiler (None if
+    profile is False).
+
+    """
+    first, games, seed, players, numberofdecks, quantized, printstats, resetemotions, plotrounddata, trace, store, profile, replay = block
+    if replay:
+        from replay import ReplaySink
+        trace = ReplaySink(replaypath(replay, first), first)
+    if profile:
+        from profiling import Profiler
+        profiler = Profiler()
+        profiler.enable()
+    rng = RandomSource(seed, quantized)
+    players = blockplayers(players, rng)
+    writer = ResultWriter(store, players, first=first) if store else None
+    winnerstats, winner = playgames(players, Deck(numberofdecks), games, rng, printstats, resetemotions, plotrounddata, first, trace, writer)
+    if writer:
+        writer.close()
+    if replay:
+        trace.close()
+    for player in players:
+        #the sinks stay in the process of the block
+        player.trace = NULLTRACE
+    if profile:
+        profiler.disable()
+        return players, winnerstats, winner, profiler.summary()
+    return players, winnerstats, winner, None
+
+
+def simulategames(games=100, printstats=False, resetemotions=False, plotrounddata = False, workers=1, seed=None, blocksize=50, quantized=False, players=None, numberofdecks=2, trace=None, store=None, profile=None, replay=None):
+    """
+    Parameters
+    ----------
+    games : int
+        Number of games.
+    players : list
+        Players of the games. Default is defaultplayers(). Each block plays with a copy.
+    numberofdecks : int
+        Number of decks.
+    trace : NullSink
+        Sink of the decision records (see tracing). Only with workers=1, the sinks
+        are not shared between processes.
+    store : str
+        Directory where the outcome and the logs of the games are written (see results),
+        the store of a previous simulation in it is replaced.
+        The results are not kept in memory: winnerstats and winner are returned empty,
+        read them with ResultStore(store).
+    workers : int
+        Number of processes. None uses all the cores.
+    seed : int
+        Seed of the games. If workers is 1 and seed is None, the games are played
+        in sequence with the same players (as in one single block).
+    blocksize : int
+        The games are split in blocks of blocksize games, each block has its own players
+        (the emotions are kept only between games of the same block) and its own random
+        generator spawned from the seed. The same seed and blocksize give the same
+        results for any number of workers.
+    quantized : bool
+        Round the probabilities to the 10 buckets of the old Random.get.
+    profile : Profiler
+        Add the calls, times and branches of the games to this profiler (see profiling).
+        Each block is profiled in its process.
+    replay : str
+        Directory where each block writes the replay log of its games (see replay).
+        Not with trace.
+    plotrounddata : str
+        Directory where each game is plotted with report.plotgame.
+
+    Returns
+    -------
+    players : list
+        Players of the last block.
+    winnerstats : list
+        [haste, memory, selfcontrol, arousal, valence] of the winner of each game.
+    winner : list
+        Name of the winner of each game.
+
+    """
+    if trace is not None and replay:
+        raise ValueError('trace and replay can not be used together')
+    if store:
+        #the shards of a previous simulation in the same directory are removed
+        newstore(store)
+    if workers == 1 and seed is None:
+        if replay:
+            from replay import ReplaySink
+            trace = ReplaySink(replaypath(replay, 0))
+        deck = Deck(numberofdecks)
+        #deck.printdeck()
+        if not players:
+            players = defaultplayers()
+        rng = RandomSource(quantized=quantized)
+        for player in players:
+            player.rng = rng
+        writer = ResultWriter(store, players) if store else None
+        if profile is not None:
+            profile.enable()
+        try:
+            winnerstats, winner = playgames(players, deck, games, rng, printstats, resetemotions, plotrounddata, trace=trace, store=writer)
+        finally:
+            if profile is not None:
+                profile.disable()
+        if writer:
+            writer.close()
+        if replay:
+            trace.close()
+        # fig, ax = plt.subplots(figsize=(8,8), dpi=150)
+
+        #plt.scatter(np.arange(1,7), [player.won for player in players])
+        # plt.scatter([player.name for player in players], [player.won for player in players])
+        # plt.show()
+        # showresults(players)
+        return players, winnerstats, winner
+        #showresults(players)
+
+    if trace is not None and workers != 1:
+        raise ValueError('trace is only supported with workers=1')
+    seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(games/blocksize)))
+    blocks = [(i*blocksize, min(blocksize, games - i*blocksize), blockseed, players, numberofdecks, quantized, printstats, resetemotions, plotrounddata, trace, store, profile is not None, replay) for i, blockseed in enumerate(seeds)]
+    if workers == 1:
+        results = list(map(simulateblock, blocks))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(simulateblock, blocks))
+
+    #merge the blocks in order
+    winner = []
+    winnerstats = []
+    for players, blockstats, blockwinner, blockprofile in results:
+        winnerstats += blockstats
+        winner += blockwinner
+        if blockprofile:
+            profile.merge(blockprofile)
     return players, winnerstats, winner
-    #showresults(players)
 
-def plotPlayersEmotion(listofplayers):
+def plotPlayersEmotion(listofplayers, path=None):
+    """
+    Plot the cards and the emotions of the players in the last game. If path is given, the
+    downsampled plot of report.plotgame is saved there with Agg instead of shown.
+    """
+    if path:
+        from report import plotgame
+        return plotgame(listofplayers, path)
+    import matplotlib.pyplot as plt
     columns = 2
     rows = int(np.ceil(len(listofplayers)/columns))
     fig, axs = plt.subplots(rows, columns, figsize=(20,32), dpi=80)
@@ -823,7 +1470,25 @@ def plotPlayersEmotion(listofplayers):
     #plt.tight_layout()
     plt.show()
 
-def plotWinnerStats(stats, players, winners):
+def plotWinnerStats(stats, players=None, winners=None):
+    """
+    Parameters
+    ----------
+    stats : list or ResultStore
+        winnerstats returned by simulategames, or the store of the results.
+    players : list
+        Players of the games, in the order of the Winner bars. Default is the names in
+        the store, or the names of the winners sorted.
+    winners : list
+        Name of the winner of each game. Not used if stats is a ResultStore.
+
+    """
+    import matplotlib.pyplot as plt
+    names = [player.name for player in players] if players else None
+    if isinstance(stats, ResultStore):
+        names = names or stats.names
+        stats, winners = stats.winnerstats(), stats.winners()
+    names = names or sorted(set(winners))
     stats = np.asarray(stats, dtype=float)
     columns = 2
     rows = 3
@@ -849,8 +1514,8 @@ def plotWinnerStats(stats, players, winners):
     axs[2,0].hist(stats[:,4], bins=20)
     axs[2,0].set_title('Valence')
 
-    wins = [winners.count('Player1'),winners.count('Player2'),winners.count('Player3'),winners.count('Player4'),winners.count('Player5'),winners.count('Player6')]
-    axs[2,1].bar(np.arange(1,7), wins)
+    wins = [winners.count(name) for name in names]
+    axs[2,1].bar(np.arange(1,len(names)+1), wins)
     axs[2,1].set_title('Winner')
     for i,ax in enumerate(axs.flat):
         ax.set_ylabel('Number of Wins')
@@ -862,10 +1527,13 @@ def plotWinnerStats(stats, players, winners):
             ax.set_xticks([-1,-0.5,0,0.5,1])
             ax.set_xlabel('Value')
         elif i == 5:
-            ax.set_xticks([1,2,3,4,5,6])
+            ax.set_xticks(np.arange(1,len(names)+1))
             ax.set_xlabel('Players')
     plt.tight_layout()
 
+#Default random source, used when no other is given
+RANDOM = RandomSource()
+
 #Events definition (adding names to create the log)
 Event('RoundWon','Won the round', valence = 0.2, arousal = 0.2)
 #Event('BluffCaught','Was caught bluffing', valence = -0.2, arousal = 0.1)
@@ -876,18 +1544,20 @@ Event('SomeoneClose2Win','Someone is close to win', valence = -0.1, arousal = 0.
 # Event('WonDoubt','Doubted someone and was right', valence = 0.1, arousal = 0.1) # ISSO EH A MESMA COISA QUE CaughtSomeonesBluff NEH?
 # Event('LostDoubt','Doubted someone and was wrong', valence = -0.1, arousal = -0.1)
 Event('BluffOK','Bluffed and no one noticed', valence = 0.05, arousal = 0)
-Event('TimePass','Time passes', valence = 0, arousal = -0.1)
-
-
-#players = simulategames(1, True)
-players,winnerstats, winners = simulategames(1000,False, False, False)
-plotWinnerStats(winnerstats, players, winners)
-# plotPlayersEmotion(players)
-# deck = Deck(2)
-# deck.printdeck()
-# players = [Player('Player' + str(i+1), amountstrategy = j) for i,j in zip(range(6),['random','random','cautious','cautious','aggressive','aggressive'])]
-# shuffle(players)
-# print(players)
-# game = Game(players, deck)
-# game.playgame()
-# showresults(players)
+Event('TimePass','Time passes', valence = 0, arousal = -0.1, log = True)
+
+
+
+if __name__ == '__main__':
+    #players = simulategames(1, True)
+    players,winnerstats, winners = simulategames(1000,False, False, False)
+    plotWinnerStats(winnerstats, players, winners)
+    # plotPlayersEmotion(players)
+    # deck = Deck(2)
+    # deck.printdeck()
+    # players = [Player('Player' + str(i+1), amountstrategy = j) for i,j in zip(range(6),['random','random','cautious','cautious','aggressive','aggressive'])]
+    # shuffle(players)
+    # print(players)
+    # game = Game(players, deck)
+    # game.playgame()
+    # showresults(players)
@@ -0,0 +1,258 @@
+"""
+League of a large pool of agents with Elo ratings.
+
+Each batch of the league draws tables of tablesize agents from the pool (a random
+permutation of the pool split into tables, so an agent plays at most once per batch), plays
+one game at each table and updates the ratings with the results. The batches are played by
+a pool of processes, a few batches ahead, and the ratings are updated as the batches arrive,
+in order: the ratings only depend on the seed, not on the number of workers.
+
+The result of a game is the ranking of its table: the winner first, then the other agents by
+the amount of cards left in their hands (ties share the rank). The Elo update of an agent is
+K/(tablesize-1) times the sum over the other agents of the table of its score against them
+(1 ahead, 0.5 tie, 0 behind) minus its expected score. All the games of a batch use the
+ratings of the start of the batch.
+
+The league only keeps arrays of the size of the pool (traits, ratings, games and wins), so the
+memory does not grow with the number of games, and save/load resume a league.
+
+Example
+-------
+    python league.py --agents 10000 --tablesize 6 --batches 1000 --workers 0 --state league.npz
+"""
+import os
+import argparse
+from collections import deque
+
+import numpy as np
+
+from game import RandomSource, Deck, Game, Player, Personality, Emotion
+
+
+TRAITS = ('haste', 'memory', 'selfcontrol', 'valence', 'arousal')
+
+
+def rankings(players):
+    """
+    Rank of each player of a finished game, 0 is the best.
+    """
+    #winner first, then fewer cards left
+    keys = [(-player.won, player.hand.total) for player in players]
+    return [sorted(keys).index(key) for key in keys]
+
+
+def playtables(task):
+    """
+    Play one game at each table of a batch.
+
+    Parameters
+    ----------
+    task : tuple
+        (batch, tables, traits, seed, numberofdecks, maxrounds): index of the batch,
+        (tables, tablesize) array of agent ids, (tables, tablesize, 5) array of their TRAITS,
+        seed of the league, number of decks and maximum rounds of a game.
+
+    Returns
+    -------
+    numpy.ndarray
+        (tables, tablesize) array of the ranks of the agents.
+
+    """
+    batch, tables, traits, seed, numberofdecks, maxrounds = task
+    deck = Deck(numberofdecks)
+    ranks = np.zeros(tables.shape, dtype=np.int8)
+    for t in range(len(tables)):
+        rng = RandomSource(np.random.SeedSequence(seed, spawn_key=(batch, t)))
+        players = [Player('Agent%i' % id, personality = Personality(*values[:3]), emotion = Emotion(*values[3:]), rng = rng)
+                   for id, values in zip(tables[t].tolist(), traits[t].tolist())]
+        for player in players:
+            player.start()
+        Game(players, deck, rng).playgame(maxrounds)
+        ranks[t] = rankings(players)
+    return ranks
+
+
+class League:
+
+    def __init__(self, traits, tablesize=6, k=16, initial=1500):
+        """
+        Parameters
+        ----------
+        traits : numpy.ndarray
+            (agents, 5) array of the TRAITS of each agent.
+        tablesize : int
+            Agents at each table.
+        k : float
+            Elo K factor of a game.
+        initial : float
+            Initial rating.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.traits = np.asarray(traits, dtype=float)
+        if len(self.traits) < tablesize:
+            raise ValueError('The pool must have at least tablesize agents')
+        self.tablesize = tablesize
+        self.k = k
+        self.rating = np.full(len(self.traits), float(initial))
+        self.games = np.zeros(len(self.traits), dtype=np.int64)
+        self.wins = np.zeros(len(self.traits), dtype=np.int64)
+        self.batches = 0
+
+    def __len__(self):
+        return len(self.traits)
+
+    @classmethod
+    def random(cls, agents, seed=0, **options):
+        """
+        Pool of agents with personalities uniform in [0, 1] and initial emotions uniform in [-1, 1].
+        """
+        rng = np.random.default_rng(seed)
+        traits = np.hstack([rng.uniform(0, 1, (agents, 3)), rng.uniform(-1, 1, (agents, 2))]).round(3)
+        return cls(traits, **options)
+
+    @classmethod
+    def fromplayers(cls, players, **options):
+        return cls([[player.personality.haste, player.personality.memory, player.personality.selfcontrol,
+                     player.emotion.i_valence, player.emotion.i_arousal] for player in players], **options)
+
+    def draw(self, batch, tables, seed):
+        """
+        (tables, tablesize) array of the agents of the tables of a batch.
+        """
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch,)))
+        perpermutation = len(self) // self.tablesize
+        if tables > perpermutation:
+            raise ValueError('At most %i tables per batch with %i agents' % (perpermutation, len(self)))
+        return rng.permutation(len(self))[:tables * self.tablesize].reshape(tables, self.tablesize)
+
+    def update(self, tables, ranks):
+        """
+        Update the ratings, games and wins with the ranks of the agents of a batch.
+        """
+        rating = self.rating[tables]
+        #score and expected score of each agent (axis 1) against each other agent of its table (axis 2)
+        score = (ranks[:, :, None] < ranks[:, None, :]) + 0.5 * (ranks[:, :, None] == ranks[:, None, :])
+        expected = 1 / (1 + 10 ** ((rating[:, None, :] - rating[:, :, None]) / 400))
+        #the diagonal adds 0.5 - 0.5
+        delta = self.k / (self.tablesize - 1) * (score - expected).sum(axis=2)
+        np.add.at(self.rating, tables, delta)
+        np.add.at(self.games, tables, 1)
+        np.add.at(self.wins, tables, ranks == 0)
+        self.batches += 1
+
+    def run(self, batches, tables=None, seed=0, workers=1, numberofdecks=2, maxrounds=1000, ahead=2, verbose=False):
+        """
+        Play batches and update the ratings as they finish.
+
+        Parameters
+        ----------
+        batches : int
+            Number of batches, after the ones already played.
+        tables : int
+            Tables of each batch. Default is all the tables that fit in the pool.
+        seed : int
+            Seed of the league, a resumed league must use the same seed.
+        workers : int
+            Number of processes, None uses all cores.
+        ahead : int
+            Batches in flight per worker. The memory is bounded by workers * ahead batches.
+
+        Returns
+        -------
+        League
+            self.
+
+        """
+        tables = len(self) // self.tablesize if tables is None else tables
+        first = self.batches
+
+        def task(batch):
+            ids = self.draw(batch, tables, seed)
+            return ids, (batch, ids, self.traits[ids], seed, numberofdecks, maxrounds)
+
+        executor = None
+        if workers != 1:
+            from concurrent.futures import ProcessPoolExecutor
+            workers = workers if workers else os.cpu_count()
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            pending = deque()
+            batch = first
+            while batch < first + batches or pending:
+                #keep workers * ahead batches in flight, consumed in order
+                while batch < first + batches and len(pending) < max(1, workers * ahead if executor else 1):
+                    ids, arguments = task(batch)
+                    pending.append((ids, executor.submit(playtables, arguments) if executor else arguments))
+                    batch += 1
+                ids, result = pending.popleft()
+                self.update(ids, result.result() if executor else playtables(result))
+                if verbose and self.batches % 10 == 0:
+                    print('batch %i, %i games, best rating %.0f' % (self.batches, self.games.sum() // self.tablesize, self.rating.max()), flush=True)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+        return self
+
+    def top(self, amount=10):
+        """
+        Ids of the agents with the highest ratings, best first.
+        """
+        amount = min(amount, len(self))
+        best = np.argpartition(-self.rating, amount - 1)[:amount]
+        return best[np.argsort(-self.rating[best], kind='stable')]
+
+    def summary(self, amount=10):
+        lines = ['%i agents, %i batches, %i games' % (len(self), self.batches, self.games.sum() // self.tablesize)]
+        lines.append('%-8s %-8s %-7s %-8s ' % ('Agent', 'Rating', 'Games', 'Win rate') + ' '.join('%-11s' % trait for trait in TRAITS))
+        for id in self.top(amount):
+            lines.append('%-8i %-8.1f %-7i %-8.3f ' % (id, self.rating[id], self.games[id], self.wins[id] / max(self.games[id], 1))
+                         + ' '.join('%-11.3f' % value for value in self.traits[id]))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        np.savez(path, traits=self.traits, rating=self.rating, games=self.games, wins=self.wins,
+                 options=np.array([self.tablesize, self.k, self.batches], dtype=float))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tablesize, k, batches = data['options'].tolist()
+            league = cls(data['traits'], int(tablesize), k)
+            league.rating = data['rating']
+            league.games = data['games']
+            league.wins = data['wins']
+            league.batches = int(batches)
+        return league
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='League of a pool of agents with Elo ratings.')
+    parser.add_argument('--agents', type=int, default=1000, help='agents of a new pool (default: 1000)')
+    parser.add_argument('--tablesize', type=int, default=6, help='agents at each table (default: 6)')
+    parser.add_argument('--tables', type=int, help='tables of each batch (default: all that fit in the pool)')
+    parser.add_argument('--batches', type=int, default=100, help='batches to play (default: 100)')
+    parser.add_argument('--k', type=float, default=16, help='Elo K factor (default: 16)')
+    parser.add_argument('--decks', type=int, default=2, help='number of decks (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the league (default: 0)')
+    parser.add_argument('--workers', type=int, default=0, help='number of processes, 0 uses all cores (default: 0)')
+    parser.add_argument('--state', help='.npz file of the league, resumed if it exists and saved at the end')
+    parser.add_argument('--top', type=int, default=10, help='agents shown in the summary (default: 10)')
+    args = parser.parse_args(argv)
+
+    if args.state and os.path.exists(args.state):
+        league = League.load(args.state)
+    else:
+        league = League.random(args.agents, args.seed, tablesize=args.tablesize, k=args.k)
+    league.run(args.batches, args.tables, args.seed, args.workers if args.workers > 0 else None, args.decks, verbose=True)
+    if args.state:
+        league.save(args.state)
+    print(league.summary(args.top))
+    return league
+
+
+if __name__ == '__main__':
+    main()
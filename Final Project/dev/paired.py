@@ -0,0 +1,197 @@
+"""
+Paired comparison of two configurations of players with common random numbers.
+
+Both configurations play the same deals: for each deal, the shuffled deck, the seats of the
+players and the random stream of each player (by its position in the configuration) are the
+same in the candidate and in the reference. The luck of the deal then cancels in the
+difference of the results. With rotations > 1 each deal is also played with the seats rotated
+(antithetic seat rotations), so every player gets the hand of other seats with the same deck.
+
+The unit of the statistics is the deal: the results of its rotations are averaged. The
+efficiency is the variance of the difference of two independent samples divided by the
+variance of the paired difference: how many times more games an unpaired comparison needs
+for the same confidence.
+
+Example
+-------
+    python paired.py --candidate candidate.json --reference players.json --games 500 --rotations 6
+"""
+import argparse
+from copy import deepcopy
+from statistics import NormalDist
+
+import numpy as np
+
+from game import RandomSource, Deck, Game, defaultplayers
+
+
+def playdeal(task):
+    """
+    Play a block of deals with a configuration.
+
+    Parameters
+    ----------
+    task : tuple
+        (configuration, deals, rotations, seed, numberofdecks, maxrounds): players,
+        indexes of the deals, number of seat rotations, seed of the comparison,
+        number of decks and maximum rounds of a game.
+
+    Returns
+    -------
+    won, roundswin, bluffslost : numpy.ndarray
+        (deals, players) arrays averaged over the rotations, players in the order
+        of the configuration.
+
+    """
+    configuration, deals, rotations, seed, numberofdecks, maxrounds = task
+    size = len(configuration)
+    deck = Deck(numberofdecks)
+    won = np.zeros((len(deals), size))
+    roundswin = np.zeros((len(deals), size))
+    bluffslost = np.zeros((len(deals), size))
+    for d, deal in enumerate(deals):
+        seats = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(deal, 0))).permutation(size)
+        for r in range(rotations):
+            players = deepcopy(configuration)
+            for j, player in enumerate(players):
+                player.rng = RandomSource(np.random.SeedSequence(seed, spawn_key=(deal, r+1, j)))
+                player.start(resetemotion=True)
+            order = np.roll(seats, r * size // rotations)
+            #same shuffle of the deck for every rotation and configuration
+            game = Game([players[j] for j in order], deck, RandomSource(np.random.SeedSequence(seed, spawn_key=(deal,))))
+            game.playgame(maxrounds)
+            for j, player in enumerate(players):
+                won[d, j] += player.won / rotations
+                roundswin[d, j] += player.roundswin / rotations
+                bluffslost[d, j] += player.bluffslost / rotations
+    return won, roundswin, bluffslost
+
+
+class PairedResult:
+
+    def __init__(self, names, candidate, reference, confidence):
+        """
+        Parameters
+        ----------
+        names : list
+            Names of the players of the candidate configuration.
+        candidate, reference : dict
+            (deals, players) arrays of won, roundswin and bluffslost of each configuration.
+        confidence : float
+            Level of the confidence intervals.
+
+        """
+        self.names = names
+        self.candidate = candidate
+        self.reference = reference
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(0.5 + confidence/2)
+
+    @property
+    def deals(self):
+        return len(self.candidate['won'])
+
+    def difference(self, statistic='won'):
+        """
+        Mean paired difference (candidate - reference) of each player and its half width.
+        """
+        difference = self.candidate[statistic] - self.reference[statistic]
+        return difference.mean(axis=0), self.z * difference.std(axis=0, ddof=1) / np.sqrt(self.deals)
+
+    def efficiency(self, statistic='won'):
+        """
+        Variance of the unpaired difference over the variance of the paired difference.
+        """
+        paired = (self.candidate[statistic] - self.reference[statistic]).var(axis=0, ddof=1)
+        unpaired = self.candidate[statistic].var(axis=0, ddof=1) + self.reference[statistic].var(axis=0, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(paired > 0, unpaired / paired, np.inf)
+
+    def pvalue(self, statistic='won'):
+        """
+        Two-sided p-value of each player of the test "no difference".
+        """
+        mean, half = self.difference(statistic)
+        stderr = half / self.z
+        return np.array([2 * (1 - NormalDist().cdf(abs(m) / s)) if s > 0 else float(m == 0) for m, s in zip(mean, stderr)])
+
+    def summary(self):
+        lines = ['%i deals, %.0f%% confidence intervals of the paired differences (candidate - reference)' % (self.deals, 100*self.confidence)]
+        lines.append('%-12s %-26s %-8s %-10s %-18s %-18s' % ('Player', 'Win rate', 'p-value', 'Efficiency', 'Rounds won', 'Bluffs lost'))
+        won, wonhalf = self.difference('won')
+        rounds, roundshalf = self.difference('roundswin')
+        bluffs, bluffshalf = self.difference('bluffslost')
+        pvalue = self.pvalue('won')
+        efficiency = self.efficiency('won')
+        for i, name in enumerate(self.names):
+            lines.append('%-12s %+.3f +- %.3f (%.3f) %8.4f %10.1f %+7.2f +- %-6.2f %+7.2f +- %-6.2f' % (
+                name, won[i], wonhalf[i], self.candidate['won'][:, i].mean(), pvalue[i], efficiency[i],
+                rounds[i], roundshalf[i], bluffs[i], bluffshalf[i]))
+        return '\n'.join(lines)
+
+
+def comparepaired(candidate, reference=None, games=500, rotations=1, seed=0, numberofdecks=2, workers=1,
+                  blocksize=50, confidence=0.95, maxrounds=1000):
+    """
+    Compare two configurations of players with the same deals and random streams.
+
+    Parameters
+    ----------
+    candidate : list
+        Players of the candidate configuration.
+    reference : list
+        Players of the reference configuration, same amount of players. Default is defaultplayers().
+    games : int
+        Number of deals. Each deal is played rotations times by each configuration.
+    rotations : int
+        Seat rotations of each deal, evenly spaced. 1 plays each deal once, len(candidate)
+        puts every player in every seat.
+    seed : int
+        Seed of the comparison.
+    workers : int
+        Number of processes, None uses all cores. The results do not depend on it.
+
+    Returns
+    -------
+    PairedResult
+
+    """
+    reference = defaultplayers() if reference is None else reference
+    if len(candidate) != len(reference):
+        raise ValueError('The configurations must have the same amount of players')
+    if not 1 <= rotations <= len(candidate):
+        raise ValueError('rotations must be between 1 and the amount of players')
+    blocks = [list(range(first, min(first + blocksize, games))) for first in range(0, games, blocksize)]
+    results = []
+    for configuration in (candidate, reference):
+        tasks = [(configuration, deals, rotations, seed, numberofdecks, maxrounds) for deals in blocks]
+        if workers == 1:
+            blockresults = list(map(playdeal, tasks))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                blockresults = list(executor.map(playdeal, tasks))
+        results.append({statistic: np.concatenate([block[i] for block in blockresults])
+                        for i, statistic in enumerate(('won', 'roundswin', 'bluffslost'))})
+    return PairedResult([player.name for player in candidate], results[0], results[1], confidence)
+
+
+def main(argv=None):
+    from simulate import loadplayers
+    parser = argparse.ArgumentParser(description='Paired comparison of two configurations of players.')
+    parser.add_argument('--candidate', required=True, help='JSON file with the candidate players (see simulate.py)')
+    parser.add_argument('--reference', help='JSON file with the reference players (default: the six default players)')
+    parser.add_argument('--games', type=int, default=500, help='number of deals (default: 500)')
+    parser.add_argument('--rotations', type=int, default=1, help='seat rotations of each deal (default: 1)')
+    parser.add_argument('--decks', type=int, default=2, help='number of decks (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the comparison (default: 0)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes, 0 uses all cores (default: 1)')
+    args = parser.parse_args(argv)
+    result = comparepaired(loadplayers(args.candidate), loadplayers(args.reference) if args.reference else None,
+                           args.games, args.rotations, args.seed, args.decks, args.workers if args.workers > 0 else None)
+    print(result.summary())
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Players stored as columns of numpy arrays.
+
+A PlayerTable keeps the personality, the emotion, the stats counters, the hand and the
+counts of the visible memory of many players in contiguous arrays indexed by the id of the
+player. PlayerTable.add returns a
+PlayerView, a Player whose personality, emotion, counters, hand and visible memory read and
+write the table, so it plays in Game like any other Player. When all the players of a Game belong to
+the same table, the events that every player reacts to (TimePass, IClose2Win and
+SomeoneClose2Win) are applied to the whole table at once by PlayerTable.react.
+
+Example
+-------
+    table = PlayerTable()
+    players = [table.add('Player%i' % i, Personality(0.5, 0.5, 0.5), Emotion(0, 0)) for i in range(1000)]
+    table.react(EVENTS.TimePass)
+"""
+import numpy as np
+
+from game import CARDS, MEMORYSPAN, EVENTS, Player, Personality, Emotion, Hand, VisibleMemory
+
+
+COUNTERS = ('won', 'gamewin', 'roundswin', 'doubts', 'rightdoubts', 'bluffs', 'bluffslost')
+
+
+class Column:
+    """
+    Attribute of a view stored in table.<column>[id] or table.<column>[id, index].
+    """
+
+    def __init__(self, column, index=None, cast=float):
+        self.column = column
+        self.index = index
+        self.cast = cast
+
+    def __get__(self, view, owner):
+        if view is None:
+            return self
+        values = getattr(view.table, self.column)
+        return self.cast(values[view.id] if self.index is None else values[view.id, self.index])
+
+    def __set__(self, view, value):
+        values = getattr(view.table, self.column)
+        if self.index is None:
+            values[view.id] = value
+        else:
+            values[view.id, self.index] = value
+
+
+class PersonalityView(Personality):
+    haste = Column('personality', 0)
+    memory = Column('personality', 1)
+    selfcontrol = Column('personality', 2)
+
+    def __init__(self, table, id):
+        self.table = table
+        self.id = id
+
+
+class EmotionView(Emotion):
+    valence = Column('emotion', 0)
+    arousal = Column('emotion', 1)
+    i_valence = Column('emotion', 2)
+    i_arousal = Column('emotion', 3)
+    frozen = Column('frozen', cast=bool)
+
+    def __init__(self, table, id):
+        self.table = table
+        self.id = id
+
+
+class HandView(Hand):
+    total = Column('handtotal', cast=int)
+
+    def __init__(self, table, id):
+        self.table = table
+        self.id = id
+
+    @property
+    def counts(self):
+        #row of the table, not kept: the table may grow and move its arrays
+        return self.table.hands[self.id]
+
+    def snapshot(self):
+        return (self.counts.copy(), self.total)
+
+
+class Recent(list):
+    """
+    List of the newest span items, newest first (the deque of VisibleMemory in less memory).
+    """
+    __slots__ = ('span',)
+
+    def __init__(self, items=(), span=MEMORYSPAN):
+        list.__init__(self, items)
+        self.span = span
+
+    def appendleft(self, item):
+        self.insert(0, item)
+        if len(self) > self.span:
+            self.pop()
+
+
+class VisibleMemoryView(VisibleMemory):
+    """
+    VisibleMemory whose window counts are the row table.visible[id].
+    """
+
+    def __init__(self, table, id):
+        self.table = table
+        self.id = id
+        self.span = MEMORYSPAN
+        self.cards = Recent()
+        self.rounds = Recent()
+        self.totals = None
+
+    @property
+    def windows(self):
+        return self.table.visible[self.id]
+
+    def resize(self, span):
+        if span <= self.span:
+            return
+        if self.totals is not None:
+            raise ValueError('A VisibleMemory must be resized before it is shared')
+        self.table.widen(span)
+        #the memory has at most self.span cards: the new windows hold all of them
+        self.table.visible[self.id, self.span+1:span+1] = self.table.visible[self.id, self.span]
+        self.cards = Recent(self.cards, span)
+        self.rounds = Recent(self.rounds, span)
+        self.span = span
+
+    def count(self, card, window=None):
+        if window is None:
+            window = self.span
+        return int(self.table.visible[self.id, min(window, self.span), card-1])
+
+    def snapshot(self):
+        return (tuple(self.cards), tuple(self.rounds), self.windows.copy())
+
+    def restore(self, state):
+        cards, rounds, windows = state
+        self.cards = Recent(cards, self.span)
+        self.rounds = Recent(rounds, self.span)
+        self.table.visible[self.id] = windows
+
+
+class Part:
+    """
+    Attribute of a view that is an object (hand, visible memory, personality or emotion): reading returns the
+    view of the part, assigning an object copies its values to the table.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __get__(self, view, owner):
+        if view is None:
+            return self
+        return view.parts[self.name]
+
+    def __set__(self, view, value):
+        part = view.parts[self.name]
+        if value is part:
+            return
+        if self.name == 'hand':
+            part.table.hands[part.id] = value.counts
+            part.total = value.total
+        elif self.name == 'handvisible':
+            #the table may remember more cards than the memory assigned
+            part.table.visible[part.id] = 0
+            part.table.visible[part.id, :value.span+1] = value.windows
+            part.span = value.span
+            part.cards = Recent(value.cards, value.span)
+            part.rounds = Recent(value.rounds, value.span)
+            part.totals = None
+        else:
+            for field in self.fields:
+                setattr(part, field, getattr(value, field))
+
+
+class PlayerView(Player):
+    """
+    Player stored in a PlayerTable. Use PlayerTable.add to create it.
+    """
+    hand = Part('hand', ())
+    handvisible = Part('handvisible', ())
+    personality = Part('personality', ('haste', 'memory', 'selfcontrol'))
+    emotion = Part('emotion', ('valence', 'arousal', 'i_valence', 'i_arousal', 'frozen'))
+    won, gamewin, roundswin, doubts, rightdoubts, bluffs, bluffslost = (Column('counters', i, int) for i in range(len(COUNTERS)))
+
+    def __init__(self, table, id, name, personality=None, emotion=None, **options):
+        self.table = table
+        self.id = id
+        self.parts = {'hand': HandView(table, id), 'handvisible': VisibleMemoryView(table, id),
+                      'personality': PersonalityView(table, id), 'emotion': EmotionView(table, id)}
+        Player.__init__(self, name, personality, emotion, **options)
+
+    def setevents(self, events):
+        Player.setevents(self, events)
+        #the table reacts with the same compiled changes as react2event
+        self.table.setreactions(self.id, self.reactions)
+
+
+class PlayerTable:
+
+    def __init__(self, capacity=16):
+        """
+        Parameters
+        ----------
+        capacity : int
+            Initial number of rows, the table grows when it is full.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.size = 0
+        self.players = []
+        self.personality = np.zeros((capacity, 3)) #haste, memory, selfcontrol
+        self.emotion = np.zeros((capacity, 4)) #valence, arousal, initial valence, initial arousal
+        self.frozen = np.zeros(capacity, dtype=bool)
+        self.counters = np.zeros((capacity, len(COUNTERS)), dtype=np.int32)
+        self.hands = np.zeros((capacity, CARDS), dtype=np.int16)
+        self.handtotal = np.zeros(capacity, dtype=np.int32)
+        self.visible = np.zeros((capacity, MEMORYSPAN+1, CARDS), dtype=np.int8) #window counts of VisibleMemory, widened for larger memories
+        self.reactions = np.zeros((capacity, len(EVENTS), 2)) #compiled (valence, arousal) change of each event, Player.reactions
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, id):
+        return self.players[id]
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def grow(self):
+        capacity = 2 * max(len(self.frozen), 1)
+        for column in ('personality', 'emotion', 'frozen', 'counters', 'hands', 'handtotal', 'visible', 'reactions'):
+            values = getattr(self, column)
+            grown = np.zeros((capacity,) + values.shape[1:], dtype=values.dtype)
+            grown[:len(values)] = values
+            setattr(self, column, grown)
+
+    def add(self, name, personality=None, emotion=None, **options):
+        """
+        Add a player to the table, the arguments are the ones of Player.
+
+        Returns
+        -------
+        PlayerView
+
+        """
+        if self.size == len(self.frozen):
+            self.grow()
+        player = PlayerView(self, self.size, name, personality, emotion, **options)
+        self.players.append(player)
+        self.size += 1
+        return player
+
+    def widen(self, span):
+        """
+        Keep the window counts of the visible memories up to span cards.
+        """
+        if span + 1 <= self.visible.shape[1]:
+            return
+        grown = np.zeros((len(self.visible), span+1, CARDS), dtype=self.visible.dtype)
+        grown[:, :self.visible.shape[1]] = self.visible
+        self.visible = grown
+
+    def setreactions(self, id, reactions):
+        """
+        Copy the compiled reactions of a player (Player.reactions, indexed by the event id) to its row.
+        """
+        if len(reactions) > self.reactions.shape[1]:
+            #an event set with more events than the ones seen
+            grown = np.zeros((len(self.reactions), len(reactions), 2))
+            grown[:, :self.reactions.shape[1]] = self.reactions
+            self.reactions = grown
+        self.reactions[id] = 0
+        if len(reactions):
+            self.reactions[id, :len(reactions)] = reactions
+
+    def column(self, name):
+        """
+        Column of a stats counter ('won', 'roundswin', ...) of the players of the table.
+        """
+        return self.counters[:self.size, COUNTERS.index(name)]
+
+    def react(self, event, ids=None):
+        """
+        Players react to the event at once, as Player.react2event does for each one, with the
+        changes compiled for each player (Player.reactions).
+
+        Parameters
+        ----------
+        event : Event
+            Event of the event set of the players.
+        ids : list
+            Ids of the players. Default is all the players of the table.
+
+        """
+        ids = np.arange(self.size) if ids is None else np.asarray(ids, dtype=np.intp)
+        valence = self.emotion[ids, 0]
+        arousal = self.emotion[ids, 1]
+        if event.log:
+            for id, v, a in zip(ids.tolist(), valence.tolist(), arousal.tolist()):
+                self.players[id].log_valence.append(v)
+                self.players[id].log_arousal.append(a)
+        active = ~self.frozen[ids]
+        change = self.reactions[ids, event.id]
+        self.emotion[ids, 0] = np.where(active, np.clip(valence + change[:, 0], -1, 1), valence)
+        self.emotion[ids, 1] = np.where(active, np.clip(arousal + change[:, 1], -1, 1), arousal)
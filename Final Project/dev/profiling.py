@@ -0,0 +1,147 @@
+"""
+Counters and timers of the hot paths of the simulator.
+
+While a Profiler is enabled, the methods of HOTSPOTS are replaced by wrappers that count
+their calls and add up their time, and every Game created gets the profiler as its trace
+sink, so it also counts the branch of each decision (see tracing.BRANCHES): which branch of
+evaluatedoubt fired, how many gambles were bluffs. The records are passed on to the sink the
+game was given. When the profiler is disabled the original methods are put back, so a
+simulation without profiler runs the same code as before.
+
+The times are inclusive: the time of playround includes the time of gamble and evaluatedoubt.
+
+Example
+-------
+    with Profiler() as profiler:
+        simulategames(100)
+    print(profiler.report())
+
+    profiler = Profiler()
+    simulategames(1000, seed=1, workers=4, profile=profiler)    each block is profiled in its process
+"""
+from time import perf_counter
+from collections import Counter
+
+import game
+from tracing import NullSink, NULLTRACE
+
+
+# (class, method) of the functions timed
+HOTSPOTS = (('Player', 'gamble'),
+            ('Player', 'evaluatedoubt'),
+            ('Player', 'react2event'),
+            ('Game', 'playround'),
+            ('Game', 'deal'),
+            ('Game', 'react'),
+            ('Game', 'reactall'),
+            ('Game', 'sortdoubters'),
+            ('Deck', 'shuffledeck'),
+            ('VisibleMemory', 'push'))
+
+ACTIVE = None #profiler enabled, only one at a time
+
+
+class Profiler(NullSink):
+    enabled = True
+
+    def __init__(self):
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.branches = Counter()
+        self.originals = None
+        self.sink = NULLTRACE
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exception):
+        self.disable()
+
+    def timed(self, name, function):
+        calls = self.calls
+        seconds = self.seconds
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += perf_counter() - start
+                calls[name] += 1
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def enable(self):
+        """
+        Replace the methods of HOTSPOTS by timed wrappers and trace the branches of the games created.
+        """
+        global ACTIVE
+        if ACTIVE is self:
+            return
+        if ACTIVE is not None:
+            raise RuntimeError('Another Profiler is enabled')
+        ACTIVE = self
+        self.originals = []
+        for classname, method in HOTSPOTS:
+            cls = getattr(game, classname)
+            function = cls.__dict__[method]
+            self.originals.append((cls, method, function))
+            setattr(cls, method, self.timed('%s.%s' % (classname, method), function))
+        settrace = game.Game.settrace
+        self.originals.append((game.Game, 'settrace', settrace))
+        profiler = self
+
+        def profiledtrace(gameself, trace):
+            #count the records, then pass them to the sink of the game
+            profiler.sink = trace
+            settrace(gameself, profiler)
+        game.Game.settrace = profiledtrace
+
+    def disable(self):
+        global ACTIVE
+        if ACTIVE is not self:
+            return
+        for cls, method, function in reversed(self.originals):
+            setattr(cls, method, function)
+        self.originals = None
+        ACTIVE = None
+
+    def emit(self, record):
+        self.branches[record.kind, record.branch] += 1
+        if self.sink.enabled:
+            self.sink.emit(record)
+
+    def dealt(self, game):
+        if self.sink.enabled:
+            self.sink.dealt(game)
+
+    def summary(self):
+        """
+        Dict with the calls and seconds of each hot spot and the count of each branch by kind, JSON ready.
+        """
+        branches = {}
+        for (kind, branch), count in sorted(self.branches.items()):
+            branches.setdefault(kind, {})[branch] = count
+        return {'calls': dict(sorted(self.calls.items())),
+                'seconds': dict(sorted(self.seconds.items())),
+                'branches': branches}
+
+    def merge(self, summary):
+        """
+        Add the summary of another profiler, for example the one of a block played in another process.
+        """
+        self.calls.update(summary['calls'])
+        self.seconds.update(summary['seconds'])
+        for kind, branches in summary['branches'].items():
+            for branch, count in branches.items():
+                self.branches[kind, branch] += count
+
+    def report(self):
+        lines = ['%-26s %10s %10s %10s' % ('Function', 'Calls', 'Seconds', 'us/call')]
+        for name, seconds in self.seconds.most_common():
+            lines.append('%-26s %10i %10.3f %10.2f' % (name, self.calls[name], seconds, 1e6 * seconds / max(self.calls[name], 1)))
+        for kind, branches in self.summary()['branches'].items():
+            total = sum(branches.values())
+            lines.append('%s: ' % kind + ', '.join('%s %i (%.1f%%)' % (branch, count, 100 * count / total) for branch, count in branches.items()))
+        return '\n'.join(lines)
@@ -0,0 +1,442 @@
+"""
+Compact replay logs of the games.
+
+A ReplaySink is a trace sink (see tracing) that writes, for each game, the state of the game
+after the cards are dealt and a stream of varint-encoded moves:
+    header      number of decks, the player at each seat, its valence and arousal (doubles)
+                and the state of the random generators: the PCG64 state before the current
+                block and the position in the block
+    deal        amount of each card in the hand of each seat, one byte per card number
+    stream      the moves, each token a varint (LEB128) of seat*4 + kind:
+                    0 gamble    then a varint of card + 14*(2*amount + truth) and, if the
+                                cards are not all the current card, the cards packed two per byte
+                    1 doubt     a player decided to doubt
+                    2 round     end of the round, seat of the last player
+                    3 game      end of the game, then a varint of 2*rounds + won
+The evaluations that did not doubt, the branches and the results of the challenges are not
+written: the replay computes them again. A move costs about 2 to 3 bytes.
+
+The file is a sequence of frames, varint(type) varint(length) payload: type 0 are the
+players seen for the first time (name, personality, strategy and initial emotion, as JSON,
+numbered in the order they are written), type 1 is a game (varint of the index of the game,
+then header, deal and stream). ReplayLog reads a file or a
+directory of files (one per block of simulategames) and replays any game alone: the game is
+rebuilt from its header and deal and played again round by round, and every move is checked
+against the stream.
+
+Example
+-------
+    simulategames(10000, seed=1, workers=4, replay='replays')
+    log = ReplayLog('replays')
+    for round, records in log[4321].steps():
+        print(round, records)
+"""
+import os
+import json
+import struct
+from glob import glob
+from collections import namedtuple
+
+from game import RandomSource, Deck, Game, Hand, Player, Personality, Emotion, CARDS
+from tracing import NullSink, Decision, MemorySink
+
+
+PLAYERS, GAME = 0, 1
+GAMBLE, DOUBT, ROUND, END = range(4)
+
+Move = namedtuple('Move', ('kind', 'player', 'card', 'cards', 'rounds', 'won'))
+Move.__new__.__defaults__ = (0, (), 0, False)
+
+
+class ReplayError(Exception):
+    pass
+
+
+def writevarint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def readvarint(data, position):
+    """
+    Returns
+    -------
+    value, position after the varint
+
+    """
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def packcards(buffer, cards):
+    #card numbers 1 to 13 in 4 bits, two per byte
+    for i in range(0, len(cards), 2):
+        buffer.append(cards[i] | (cards[i+1] << 4 if i+1 < len(cards) else 0))
+
+
+def unpackcards(data, position, amount):
+    cards = []
+    for i in range(0, amount, 2):
+        cards.append(data[position] & 0x0f)
+        if i+1 < amount:
+            cards.append(data[position] >> 4)
+        position += 1
+    return tuple(cards), position
+
+
+class ReplaySink(NullSink):
+    """
+    Write the replay of each game to a file, or keep the frames in memory if path is None.
+    """
+    enabled = True
+
+    def __init__(self, path=None, first=0):
+        """
+        Parameters
+        ----------
+        path : str
+            File of the replays.
+        first : int
+            Index of the first game written.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.file = open(path, 'wb') if path else None
+        self.frames = bytearray()
+        self.next = first
+        self.known = {} #number of each player written, by its fixed attributes
+        self.seats = None
+        self.header = b''
+        self.deal = b''
+        self.stream = bytearray()
+        self.moves = 0 #gambles written
+
+    def frame(self, kind, payload):
+        writevarint(self.frames, kind)
+        writevarint(self.frames, len(payload))
+        self.frames += payload
+        if self.file and len(self.frames) > 1 << 16:
+            self.flush()
+
+    def dealt(self, game):
+        players = [(player.name, player.personality.haste, player.personality.memory, player.personality.selfcontrol, player.amountstrategy,
+                    player.willtodoubt, player.willtobluff, player.emotion.i_valence, player.emotion.i_arousal, player.emotion.frozen) for player in game.players]
+        new = [player for player in dict.fromkeys(players) if player not in self.known]
+        if new:
+            self.frame(PLAYERS, json.dumps(new).encode())
+            for player in new:
+                self.known[player] = len(self.known)
+        sources = game.randomsources()
+        header = bytearray()
+        writevarint(header, game.deck.numberofdecks)
+        writevarint(header, len(players))
+        for player, fixed in zip(game.players, players):
+            writevarint(header, self.known[fixed])
+            header += struct.pack('<dd', player.emotion.valence, player.emotion.arousal)
+            writevarint(header, sources.index(player.rng))
+        writevarint(header, sources.index(game.rng))
+        writevarint(header, len(sources))
+        for rng in sources:
+            state, index = rng.replaystate()
+            if state['bit_generator'] != 'PCG64':
+                raise ValueError('Only PCG64 generators can be replayed')
+            header += state['state']['state'].to_bytes(16, 'little') + state['state']['inc'].to_bytes(16, 'little')
+            header.append(state['has_uint32'])
+            writevarint(header, state['uinteger'])
+            writevarint(header, 0 if index is None else index + 1)
+            header.append(rng.quantized)
+            writevarint(header, rng.blocksize)
+        self.header = header
+        self.deal = bytes(count for player in game.players for count in player.hand.counts)
+        self.seats = {player.name: i for i, player in enumerate(game.players)}
+        self.stream = bytearray()
+
+    def emit(self, record):
+        kind = record.kind
+        if kind == 'gamble':
+            cards = record.cards
+            truth = all(card == record.card for card in cards)
+            writevarint(self.stream, self.seats[record.player] * 4 + GAMBLE)
+            writevarint(self.stream, record.card + 14 * (2 * len(cards) + truth))
+            if not truth:
+                packcards(self.stream, cards)
+            self.moves += 1
+        elif kind == 'doubt':
+            if record.outcome:
+                writevarint(self.stream, self.seats[record.player] * 4 + DOUBT)
+        elif kind == 'round':
+            writevarint(self.stream, self.seats[record.player] * 4 + ROUND)
+        elif kind == 'game':
+            writevarint(self.stream, self.seats[record.player] * 4 + END)
+            writevarint(self.stream, 2 * record.outcome + (record.branch == 'won'))
+            self.endgame()
+
+    def endgame(self):
+        payload = bytearray()
+        writevarint(payload, self.next)
+        payload += self.header
+        payload += self.deal
+        payload += self.stream
+        self.frame(GAME, payload)
+        self.next += 1
+        self.seats = None
+
+    def flush(self):
+        if self.file and self.frames:
+            self.file.write(self.frames)
+            self.frames = bytearray()
+            self.file.flush()
+
+    def close(self):
+        if self.file and not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GameReplay:
+
+    def __init__(self, index, header, deal, stream):
+        """
+        Replay of one game, see ReplayLog.
+
+        Parameters
+        ----------
+        index : int
+            Index of the game in the simulation.
+        header : dict
+            Players at the seats, emotions, random generators and decks, see readheader.
+        deal : bytes
+            Amount of each card of each seat.
+        stream : bytes
+            Encoded moves.
+
+        """
+        self.index = index
+        self.header = header
+        self.deal = deal
+        self.stream = stream
+        self.seats = [player[0] for player in header['players']]
+
+    def __len__(self):
+        #bytes of the game
+        return len(self.deal) + len(self.stream)
+
+    def hands(self):
+        """
+        Dealt hand of each seat.
+        """
+        return [Hand([card + 1 for card in range(CARDS) for i in range(self.deal[seat*CARDS + card])]) for seat in range(len(self.seats))]
+
+    def moves(self):
+        """
+        Decode the stream, without playing the game.
+        """
+        data = self.stream
+        position = 0
+        while position < len(data):
+            token, position = readvarint(data, position)
+            seat, kind = divmod(token, 4)
+            player = self.seats[seat]
+            if kind == GAMBLE:
+                value, position = readvarint(data, position)
+                card, rest = value % 14, value // 14
+                amount, truth = divmod(rest, 2)
+                if truth:
+                    cards = (card,) * amount
+                else:
+                    cards, position = unpackcards(data, position, amount)
+                yield Move('gamble', player, card, cards)
+            elif kind == DOUBT:
+                yield Move('doubt', player)
+            elif kind == ROUND:
+                yield Move('round', player)
+            else:
+                value, position = readvarint(data, position)
+                yield Move('game', player, rounds=value // 2, won=bool(value % 2))
+
+    def rebuild(self, trace=None):
+        """
+        Game with the players, hands and random generators of the record, ready to play the first round.
+        """
+        sources = []
+        for state, index, quantized, blocksize in self.header['rng']:
+            rng = RandomSource(quantized=quantized, blocksize=blocksize)
+            rng.setreplaystate(state, index)
+            sources.append(rng)
+        players = []
+        for fixed, (valence, arousal), source in zip(self.header['players'], self.header['emotions'], self.header['sources']):
+            name, haste, memory, selfcontrol, amountstrategy, willtodoubt, willtobluff, i_valence, i_arousal, frozen = fixed
+            player = Player(name, Personality(haste, memory, selfcontrol), Emotion(i_valence, i_arousal, frozen),
+                            amountstrategy, willtodoubt, willtobluff, rng=sources[source])
+            player.emotion.valence = valence
+            player.emotion.arousal = arousal
+            players.append(player)
+        game = Game(players, Deck(self.header['decks']), sources[self.header['gamesource']], trace=trace)
+        for player, hand in zip(players, self.hands()):
+            player.hand = hand
+        game.dealt = True
+        return game
+
+    def steps(self):
+        """
+        Play the game again, round by round, checking each move against the stream.
+
+        Yields
+        ------
+        round : int
+            Number of the round.
+        records : list
+            Decision records of the round (see tracing).
+
+        Raises
+        ------
+        ReplayError
+            If the game played differs from the record.
+
+        """
+        memory = MemorySink()
+        checker = ReplayChecker(self.stream, memory)
+        game = self.rebuild(checker)
+        checker.dealt(game)
+        end = list(self.moves())[-1]
+        gameover = False
+        while game.rounds < end.rounds and not gameover:
+            memory.clear()
+            gameover = game.playround()
+            if gameover:
+                game.lastPlayer.won += 1
+            if game.rounds == end.rounds or gameover:
+                checker.emit(Decision('game', game.lastPlayer.name, 'won' if gameover else 'maxrounds', game.rounds))
+            yield game.rounds, memory.records()
+        if len(checker.stream) != len(self.stream):
+            raise ReplayError('Game %i ended before the end of the record' % self.index)
+        self.game = game
+
+    def replay(self):
+        """
+        Play the game again and return it, checked against the record.
+        """
+        for step in self.steps():
+            pass
+        return self.game
+
+
+class ReplayChecker(ReplaySink):
+    """
+    Encode the moves of a replayed game and compare them with the record as they are made.
+    """
+
+    def __init__(self, expected, sink):
+        ReplaySink.__init__(self)
+        self.expected = expected
+        self.sink = sink
+
+    def emit(self, record):
+        start = len(self.stream)
+        ReplaySink.emit(self, record)
+        if self.stream[start:] != self.expected[start:len(self.stream)]:
+            raise ReplayError('The replay differs from the record at byte %i: %s' % (start, record))
+        self.sink.emit(record)
+
+    def endgame(self):
+        pass
+
+
+def readheader(payload, position, players):
+    """
+    Decode the header of a game written by ReplaySink.dealt.
+
+    Returns
+    -------
+    header : dict
+        decks, players (fixed attributes of the player at each seat), emotions (valence and
+        arousal of each seat), sources (random generator of each seat), gamesource and rng
+        (state, index in the block, quantized and blocksize of each generator).
+    position : int
+        Position after the header.
+
+    """
+    header = {'players': [], 'emotions': [], 'sources': [], 'rng': []}
+    header['decks'], position = readvarint(payload, position)
+    seats, position = readvarint(payload, position)
+    for seat in range(seats):
+        player, position = readvarint(payload, position)
+        header['players'].append(players[player])
+        header['emotions'].append(struct.unpack_from('<dd', payload, position))
+        source, position = readvarint(payload, position + 16)
+        header['sources'].append(source)
+    header['gamesource'], position = readvarint(payload, position)
+    sources, position = readvarint(payload, position)
+    for source in range(sources):
+        state = {'bit_generator': 'PCG64',
+                 'state': {'state': int.from_bytes(payload[position:position+16], 'little'),
+                           'inc': int.from_bytes(payload[position+16:position+32], 'little')},
+                 'has_uint32': payload[position+32]}
+        state['uinteger'], position = readvarint(payload, position + 33)
+        index, position = readvarint(payload, position)
+        quantized = bool(payload[position])
+        blocksize, position = readvarint(payload, position + 1)
+        header['rng'].append((state, index - 1 if index else None, quantized, blocksize))
+    return header, position
+
+
+class ReplayLog:
+
+    def __init__(self, path):
+        """
+        Index of the games of a replay file or of a directory of .replay files.
+        Only the position of each game is kept, a game is read when it is used.
+        """
+        self.paths = sorted(glob(os.path.join(path, '*.replay'))) if os.path.isdir(path) else [path]
+        self.players = [] #players written in each file
+        self.positions = {}
+        for file, path in enumerate(self.paths):
+            with open(path, 'rb') as data:
+                data = data.read()
+            position = 0
+            self.players.append([])
+            while position < len(data):
+                kind, position = readvarint(data, position)
+                length, position = readvarint(data, position)
+                if kind == PLAYERS:
+                    self.players[file] += [tuple(player) for player in json.loads(data[position:position+length])]
+                else:
+                    index, start = readvarint(data, position)
+                    self.positions[index] = (file, position, length)
+                position += length
+        self.indexes = sorted(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        for index in self.indexes:
+            yield self[index]
+
+    def __getitem__(self, index):
+        file, position, length = self.positions[index]
+        with open(self.paths[file], 'rb') as data:
+            data.seek(position)
+            payload = data.read(length)
+        index, position = readvarint(payload, 0)
+        header, position = readheader(payload, position, self.players[file])
+        deal = payload[position:position + len(header['players']) * CARDS]
+        stream = payload[position + len(deal):]
+        return GameReplay(index, header, deal, stream)
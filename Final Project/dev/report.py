@@ -0,0 +1,296 @@
+"""
+Aggregated plots of many games, rendered to files without a display.
+
+The games are not plotted one by one: their logs are accumulated in fixed bins, one chunk
+of games at a time, so the memory and the time to render do not depend on the number of games.
+    EmotionDensity      density of the valence and the arousal of the players over the
+                        normalized time of the game (0 is the first round, 1 the last one)
+    WinnerHistogram     histograms of the winnerstats and the wins of each player
+The figures are drawn on matplotlib Figures with the Agg canvas, pyplot is not used, so
+nothing is shown and nothing blocks. Long traces are reduced by downsample before they are
+drawn as lines.
+
+Example
+-------
+    python simulate.py --games 100000 --seed 1 --workers 0 --store results
+    python report.py results --output report
+"""
+import os
+import argparse
+
+import numpy as np
+
+from results import ResultStore
+
+
+STATS = ('Haste', 'Memory', 'Selfcontrol', 'Arousal', 'Valence')
+
+
+def figure(width, height, dpi=100):
+    #Figure drawn by the Agg canvas, independent of the pyplot backend
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def downsample(values, points=1000):
+    """
+    Reduce a trace to at most 2*points points keeping the minimum and the maximum of each
+    bucket, so the peaks are still drawn.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        Positions in the original trace and values.
+
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) <= 2 * points:
+        return np.arange(len(values)), values
+    edges = np.linspace(0, len(values), points + 1).astype(np.int64)
+    x = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = values[start:end]
+        low, high = start + np.argmin(bucket), start + np.argmax(bucket)
+        x += sorted((low, high))
+    x = np.array(x)
+    return x, values[x]
+
+
+class EmotionDensity:
+
+    def __init__(self, timebins=50, valuebins=21):
+        """
+        Parameters
+        ----------
+        timebins : int
+            Bins of the normalized time of the game.
+        valuebins : int
+            Bins of the emotions, centered on valuebins values evenly spaced from -1 to 1
+            (the default puts the multiples of 0.1 at the centers: the emotions change by
+            steps of 0.1 and would leave empty stripes otherwise).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.timebins = timebins
+        self.valuebins = valuebins
+        self.valence = np.zeros((timebins, valuebins), dtype=np.int64)
+        self.arousal = np.zeros((timebins, valuebins), dtype=np.int64)
+        self.games = 0
+
+    def bins(self, values, lengths):
+        #flat bin of each value: the logs of lengths are concatenated
+        lengths = np.asarray(lengths, dtype=np.int64).ravel()
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        position = np.arange(len(starts)) - starts
+        time = position / np.repeat(np.maximum(lengths - 1, 1), lengths)
+        timebin = np.minimum((time * self.timebins).astype(np.int64), self.timebins - 1)
+        valuebin = np.clip(np.rint((np.asarray(values, dtype=float) + 1) / 2 * (self.valuebins - 1)).astype(np.int64), 0, self.valuebins - 1)
+        return timebin * self.valuebins + valuebin
+
+    def add(self, valence, arousal, lengths):
+        """
+        Add concatenated logs.
+
+        Parameters
+        ----------
+        valence, arousal : numpy.ndarray
+            Logs of the players concatenated.
+        lengths : numpy.ndarray
+            Length of each log (the emotionlength column of a store).
+
+        """
+        size = self.timebins * self.valuebins
+        self.valence += np.bincount(self.bins(valence, lengths), minlength=size).reshape(self.valence.shape)
+        self.arousal += np.bincount(self.bins(arousal, lengths), minlength=size).reshape(self.arousal.shape)
+
+    def addplayers(self, players):
+        """
+        Add the logs of the players of a game that just ended.
+        """
+        self.add(np.concatenate([player.log_valence for player in players]),
+                 np.concatenate([player.log_arousal for player in players]),
+                 [len(player.log_valence) for player in players])
+        self.games += 1
+
+    def addchunk(self, chunk):
+        """
+        Add a chunk of ResultStore.iterchunks('valence', 'arousal', 'emotionlength').
+        """
+        self.add(chunk['valence'], chunk['arousal'], chunk['emotionlength'])
+        self.games += len(chunk['emotionlength'])
+
+    def plot(self, path=None, dpi=100):
+        """
+        Heatmaps of the density of valence and arousal over the normalized time of the game.
+        Each time bin is normalized to sum 1. Returns the Figure, saved to path if given.
+        """
+        fig = figure(10, 4, dpi)
+        axs = fig.subplots(1, 2)
+        for ax, counts, title in zip(axs, (self.valence, self.arousal), ('Valence', 'Arousal')):
+            total = counts.sum(axis=1, keepdims=True)
+            density = np.divide(counts, total, out=np.zeros(counts.shape), where=total > 0)
+            half = 1 / (self.valuebins - 1)
+            image = ax.imshow(density.T, origin='lower', aspect='auto', extent=(0, 1, -1 - half, 1 + half), cmap='viridis')
+            ax.set_title('%s (%i games)' % (title, self.games))
+            ax.set_xlabel('Normalized time of the game')
+            ax.set_ylabel(title)
+            fig.colorbar(image, ax=ax, label='Fraction of the players')
+        fig.tight_layout()
+        if path:
+            fig.savefig(path)
+        return fig
+
+
+class WinnerHistogram:
+
+    def __init__(self, names, bins=20):
+        """
+        Parameters
+        ----------
+        names : list
+            Names of the players.
+        bins : int
+            Bins of each stat, personalities from 0 to 1 and emotions from -1 to 1.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.edges = [np.linspace(0, 1, bins + 1)]*3 + [np.linspace(-1, 1, bins + 1)]*2
+        self.counts = np.zeros((len(STATS), bins), dtype=np.int64)
+        self.wins = np.zeros(len(self.names), dtype=np.int64)
+
+    def add(self, winnerstats, winners):
+        """
+        Parameters
+        ----------
+        winnerstats : list
+            [haste, memory, selfcontrol, arousal, valence] of the winner of each game.
+        winners : list
+            Name of the winner of each game, as simulategames returns.
+
+        """
+        self.addindexes(np.asarray(winnerstats, dtype=float).reshape(-1, len(STATS)), [self.index[name] for name in winners])
+
+    def addindexes(self, winnerstats, winners):
+        #winners: index in names of the winner of each game, -1 if none (as in a store)
+        winners = np.asarray(winners, dtype=np.int64)
+        winnerstats = np.asarray(winnerstats, dtype=float)[winners >= 0]
+        for i, edges in enumerate(self.edges):
+            self.counts[i] += np.histogram(winnerstats[:, i], edges)[0]
+        self.wins += np.bincount(winners[winners >= 0], minlength=len(self.names))
+
+    def addchunk(self, chunk):
+        """
+        Add a chunk of ResultStore.iterchunks('winner', 'winnerstats').
+        """
+        self.addindexes(chunk['winnerstats'], chunk['winner'])
+
+    def plot(self, path=None, dpi=100):
+        fig = figure(9, 7, dpi)
+        axs = fig.subplots(3, 2).flat
+        for ax, counts, edges, title in zip(axs, self.counts, self.edges, STATS):
+            ax.stairs(counts, edges, fill=True)
+            ax.set_title(title)
+            ax.set_xlabel('Value')
+            ax.set_ylabel('Number of Wins')
+        ax = axs[5]
+        ax.bar(np.arange(len(self.names)), self.wins)
+        ax.set_xticks(np.arange(len(self.names)))
+        ax.set_xticklabels(self.names, rotation=45 if len(self.names) > 6 else 0, fontsize=8)
+        ax.set_title('Winner (%i games)' % self.wins.sum())
+        ax.set_ylabel('Number of Wins')
+        fig.tight_layout()
+        if path:
+            fig.savefig(path)
+        return fig
+
+
+def plotgame(players, path=None, points=500, dpi=80):
+    """
+    Cards, valence and arousal of the players in one game (Player or PlayerLog of
+    ResultStore.game), as plotPlayersEmotion but downsampled and rendered with Agg.
+    """
+    columns = 2
+    rows = int(np.ceil(len(players) / columns))
+    fig = figure(12, 3 * rows, dpi)
+    axs = np.atleast_1d(fig.subplots(rows, columns, squeeze=False)).flat
+    for ax, player in zip(axs, players):
+        ax.plot(*downsample(player.log_cardsamount, points), color='darkblue', alpha=0.5)
+        ax.set_ylabel('Amount of Cards', color='darkblue')
+        ax.set_xlabel('Rounds')
+        ax.set_title(player.name)
+        ax2 = ax.twinx()
+        ax2.plot(*downsample(player.log_valence, points), color='green', alpha=0.5, label='Valence')
+        ax2.plot(*downsample(player.log_arousal, points), color='orange', alpha=0.5, label='Arousal')
+        ax2.set_ylim([-1, 1])
+        ax2.set_ylabel('Valence/Arousal')
+        ax2.legend(loc='lower left')
+    fig.tight_layout()
+    if path:
+        fig.savefig(path)
+    return fig
+
+
+def aggregate(store, timebins=50, valuebins=21, bins=20):
+    """
+    Accumulate the games of a ResultStore, one shard at a time.
+
+    Returns
+    -------
+    EmotionDensity, WinnerHistogram
+
+    """
+    store = store if isinstance(store, ResultStore) else ResultStore(store)
+    density = EmotionDensity(timebins, valuebins)
+    winners = WinnerHistogram(store.names, bins)
+    for chunk in store.iterchunks('winner', 'winnerstats', 'valence', 'arousal', 'emotionlength'):
+        density.addchunk(chunk)
+        winners.addchunk(chunk)
+    return density, winners
+
+
+def report(store, directory, dpi=100):
+    """
+    Write density.png, winners.png and lastgame.png of a ResultStore to directory.
+
+    Returns
+    -------
+    list
+        Paths of the files written.
+
+    """
+    store = store if isinstance(store, ResultStore) else ResultStore(store)
+    os.makedirs(directory, exist_ok=True)
+    density, winners = aggregate(store)
+    paths = [os.path.join(directory, name) for name in ('density.png', 'winners.png', 'lastgame.png')]
+    density.plot(paths[0], dpi)
+    winners.plot(paths[1], dpi)
+    if len(store):
+        plotgame(store.game(-1), paths[2], dpi=dpi)
+    else:
+        paths.pop()
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Aggregated plots of the games of a result store.')
+    parser.add_argument('store', help='directory written by simulate.py --store')
+    parser.add_argument('--output', default='report', help='directory of the images (default: report)')
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args(argv)
+    for path in report(args.store, args.output, args.dpi):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+On-disk columnar store of the results of the games.
+
+The results are written in shards of chunksize games. Each shard is a directory with one
+.npy file per column, so the columns can be read back memory-mapped, one shard at a time:
+
+    directory/
+        meta.json               names and personalities of the players
+        shard-000000000/        first game of the shard
+            game.npy            int32 (games,)      index of the game in the simulation
+            winner.npy          int16 (games,)      index of the winner in names, -1 if none
+            rounds.npy          int16 (games,)      rounds played
+            winnerstats.npy     float32 (games, 5)  haste, memory, selfcontrol, arousal, valence of the winner
+            emotionlength.npy   int32 (games, players)
+            arousal.npy         float32 (sum of emotionlength,)
+            valence.npy         float32 (sum of emotionlength,)
+            cardslength.npy     int32 (games, players)
+            cards.npy           int16 (sum of cardslength,)
+
+The per-round logs (arousal, valence and cards) are the log_arousal, log_valence and
+log_cardsamount of the players, concatenated by game and then by player, in the order of names.
+"""
+import os
+import json
+import shutil
+from glob import glob
+from collections import namedtuple
+
+import numpy as np
+
+
+GAMECOLUMNS = ('game', 'winner', 'rounds', 'winnerstats', 'emotionlength', 'cardslength')
+TRACECOLUMNS = ('arousal', 'valence', 'cards')
+
+Traits = namedtuple('Traits', ('haste', 'memory', 'selfcontrol'))
+PlayerLog = namedtuple('PlayerLog', ('name', 'personality', 'log_arousal', 'log_valence', 'log_cardsamount'))
+
+
+def newstore(directory):
+    """
+    Prepare the directory of a new store: create it, or remove the shards and meta.json
+    written there before (ResultStore reads every shard of the directory, old shards would
+    be mixed with the new games). Other files are kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for shard in glob(os.path.join(directory, 'shard-*')):
+        shutil.rmtree(shard)
+    meta = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta):
+        os.remove(meta)
+
+
+class ResultWriter:
+
+    def __init__(self, directory, players, chunksize=1000, first=0):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory of the store, created if it does not exist. Use newstore first to
+            start a new store in a directory used before.
+        players : list
+            Players of the games. Their names and personalities are saved in meta.json.
+        chunksize : int
+            Number of games of each shard.
+        first : int
+            Index of the first game written by this writer. Writers of different blocks of
+            games can share the same directory.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.directory = directory
+        self.names = [player.name for player in players]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.chunksize = chunksize
+        self.next = first
+        os.makedirs(directory, exist_ok=True)
+        meta = {'names': self.names,
+                'personalities': [[player.personality.haste, player.personality.memory, player.personality.selfcontrol] for player in players]}
+        #write and rename, several writers may share the directory
+        path = os.path.join(directory, 'meta.json')
+        temporary = '%s.%i' % (path, os.getpid())
+        with open(temporary, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary, path)
+        self.clear()
+
+    def clear(self):
+        self.first = self.next
+        self.games = {column: [] for column in GAMECOLUMNS}
+        self.traces = {column: [] for column in TRACECOLUMNS}
+
+    def append(self, players, rounds):
+        """
+        Add the outcome and the logs of a game that just ended.
+
+        Parameters
+        ----------
+        players : list
+            Players of the game, in any order.
+        rounds : int
+            Rounds played.
+
+        """
+        players = sorted(players, key=lambda player: self.index[player.name])
+        winner = -1
+        winnerstats = [np.nan]*5
+        for i, player in enumerate(players):
+            if player.won == 1:
+                winner = i
+                winnerstats = [player.personality.haste, player.personality.memory, player.personality.selfcontrol, player.emotion.arousal, player.emotion.valence]
+        self.games['game'].append(self.next)
+        self.games['winner'].append(winner)
+        self.games['rounds'].append(rounds)
+        self.games['winnerstats'].append(winnerstats)
+        self.games['emotionlength'].append([len(player.log_arousal) for player in players])
+        self.games['cardslength'].append([len(player.log_cardsamount) for player in players])
+        for player in players:
+            self.traces['arousal'].append(np.asarray(player.log_arousal, dtype=np.float32))
+            self.traces['valence'].append(np.asarray(player.log_valence, dtype=np.float32))
+            self.traces['cards'].append(np.asarray(player.log_cardsamount, dtype=np.int16))
+        self.next += 1
+        if self.next - self.first >= self.chunksize:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the games added since the last flush as a new shard.
+        """
+        if self.next == self.first:
+            return
+        shard = os.path.join(self.directory, 'shard-%09i' % self.first)
+        os.makedirs(shard, exist_ok=True)
+        columns = {'game': np.asarray(self.games['game'], dtype=np.int32),
+                   'winner': np.asarray(self.games['winner'], dtype=np.int16),
+                   'rounds': np.asarray(self.games['rounds'], dtype=np.int16),
+                   'winnerstats': np.asarray(self.games['winnerstats'], dtype=np.float32).reshape(-1, 5),
+                   'emotionlength': np.asarray(self.games['emotionlength'], dtype=np.int32),
+                   'cardslength': np.asarray(self.games['cardslength'], dtype=np.int32)}
+        for column in TRACECOLUMNS:
+            columns[column] = np.concatenate(self.traces[column])
+        for column, values in columns.items():
+            np.save(os.path.join(shard, column + '.npy'), values)
+        self.clear()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ResultStore:
+
+    def __init__(self, directory, mmap=True):
+        """
+        Read the results written by ResultWriter. The columns are loaded only when used.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the store.
+        mmap : bool
+            Memory-map the columns instead of reading them.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.directory = directory
+        self.mmap = 'r' if mmap else None
+        with open(os.path.join(directory, 'meta.json')) as file:
+            meta = json.load(file)
+        self.names = meta['names']
+        self.personalities = [Traits(*personality) for personality in meta['personalities']]
+        self.shards = sorted(glob(os.path.join(directory, 'shard-*')))
+        self._sizes = None
+
+    def load(self, shard, column):
+        return np.load(os.path.join(self.shards[shard], column + '.npy'), mmap_mode=self.mmap)
+
+    def sizes(self):
+        #number of games of each shard
+        if self._sizes is None:
+            self._sizes = np.array([len(self.load(shard, 'game')) for shard in range(len(self.shards))], dtype=np.int64)
+        return self._sizes
+
+    def __len__(self):
+        return int(self.sizes().sum())
+
+    def iterchunks(self, *columns):
+        """
+        Yield a dict with the columns of each shard, in the order of the games.
+        """
+        for shard in range(len(self.shards)):
+            yield {column: self.load(shard, column) for column in columns}
+
+    def column(self, name):
+        """
+        Concatenate a column of all shards.
+        """
+        return np.concatenate([chunk[name] for chunk in self.iterchunks(name)]) if self.shards else np.empty(0)
+
+    def winnerstats(self):
+        """
+        [haste, memory, selfcontrol, arousal, valence] of the winner of each game that had one,
+        as simulategames returns.
+        """
+        chunks = [chunk['winnerstats'][chunk['winner'] >= 0] for chunk in self.iterchunks('winner', 'winnerstats')]
+        return np.concatenate(chunks) if chunks else np.empty((0, 5), dtype=np.float32)
+
+    def winners(self):
+        """
+        Name of the winner of each game that had one, as simulategames returns.
+        """
+        return [self.names[i] for chunk in self.iterchunks('winner') for i in chunk['winner'] if i >= 0]
+
+    def wins(self):
+        """
+        Number of games won by each player, in the order of names.
+        """
+        wins = np.zeros(len(self.names), dtype=np.int64)
+        for chunk in self.iterchunks('winner'):
+            winner = chunk['winner']
+            wins += np.bincount(winner[winner >= 0], minlength=len(self.names))
+        return wins
+
+    def game(self, index):
+        """
+        Logs of the players in a game, with the attributes used by plotPlayersEmotion.
+
+        Parameters
+        ----------
+        index : int
+            Position of the game in the store.
+
+        Returns
+        -------
+        list
+            PlayerLog of each player, in the order of names.
+
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('game %i out of range' % index)
+        ends = np.cumsum(self.sizes())
+        shard = int(np.searchsorted(ends, index, side='right'))
+        row = index - (ends[shard] - self.sizes()[shard])
+        players = []
+        logs = {}
+        for column, lengths in (('arousal', 'emotionlength'), ('valence', 'emotionlength'), ('cards', 'cardslength')):
+            lengths = self.load(shard, lengths)
+            start = int(lengths[:row].sum())
+            bounds = start + np.concatenate(([0], np.cumsum(lengths[row])))
+            values = self.load(shard, column)
+            logs[column] = [values[bounds[i]:bounds[i+1]] for i in range(len(self.names))]
+        for i, name in enumerate(self.names):
+            players.append(PlayerLog(name, self.personalities[i], logs['arousal'][i], logs['valence'][i], logs['cards'][i]))
+        return players
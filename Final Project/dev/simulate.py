@@ -0,0 +1,158 @@
+"""
+Command line interface of the simulator.
+
+Example
+-------
+    python simulate.py --games 1000 --decks 2 --players players.json --seed 42 --workers 4 --output results.json
+
+The players file is a JSON list with one object per player, for example:
+
+    [{"name": "Player1", "haste": 0.9, "memory": 0.9, "selfcontrol": 0.1, "valence": 0, "arousal": 0}]
+
+Optional keys: frozen, amountstrategy, willtodoubt and willtobluff.
+"""
+import argparse
+import json
+from collections import Counter
+
+from game import Player, Personality, Emotion, simulategames
+from tracing import JSONLSink
+from results import ResultStore
+from profiling import Profiler
+
+
+def loadplayers(path):
+    """
+    Read the players of a simulation from a JSON file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file.
+
+    Returns
+    -------
+    list
+        List of Player.
+
+    """
+    with open(path) as file:
+        data = json.load(file)
+    players = []
+    for i, entry in enumerate(data):
+        try:
+            players.append(Player(entry.get('name', 'Player' + str(i+1)),
+                                  personality = Personality(entry['haste'], entry['memory'], entry['selfcontrol']),
+                                  emotion = Emotion(entry.get('valence', 0), entry.get('arousal', 0), entry.get('frozen', False)),
+                                  amountstrategy = entry.get('amountstrategy', 'random'),
+                                  willtodoubt = entry.get('willtodoubt', 0.1),
+                                  willtobluff = entry.get('willtobluff', 0.5)))
+        except KeyError as key:
+            raise ValueError('Player %i of %s has no %s' % (i, path, key))
+    if len(players) < 2:
+        raise ValueError('%s must have at least two players' % path)
+    return players
+
+
+def parsearguments(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate games of Doubt (cheat) between affective players.')
+    parser.add_argument('--games', type=int, default=100, help='number of games (default: 100)')
+    parser.add_argument('--decks', type=int, default=2, help='number of decks (default: 2)')
+    parser.add_argument('--players', help='JSON file with the players (default: the six default players)')
+    parser.add_argument('--seed', type=int, help='seed of the simulation; the results only depend on the seed and the block size')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes, 0 uses all cores (default: 1)')
+    parser.add_argument('--blocksize', type=int, default=50, help='games per block of work (default: 50)')
+    parser.add_argument('--quantized', action='store_true', help='use the quantized probabilities of the original Random.get')
+    parser.add_argument('--resetemotions', action='store_true', help='reset the emotions of the players before each game')
+    parser.add_argument('--engine', choices=['scalar', 'batch'], default='scalar', help='scalar (game.py) or batch (batchgame.py) engine; the batch engine resets the emotions before each game, as --resetemotions')
+    parser.add_argument('--trace', help='write the decisions of the players to this JSONL file (scalar engine with one worker)')
+    parser.add_argument('--store', help='stream the outcomes and the per-round logs to this directory (scalar engine)')
+    parser.add_argument('--width', type=float, help='adaptive: play until every win rate is known within +-WIDTH, --games is the maximum')
+    parser.add_argument('--alpha', type=float, help='adaptive: play until the best player is significant at level ALPHA (Bonferroni over the checks), --games is the maximum')
+    parser.add_argument('--replay', help='write a replay log of every game to this directory (scalar engine, see replay.py)')
+    parser.add_argument('--report', help='with --store, write the aggregated plots of the games to this directory (see report.py)')
+    parser.add_argument('--profile', action='store_true', help='count the calls, times and decision branches of the hot paths (scalar engine)')
+    parser.add_argument('--output', help='write the results to this JSON file instead of printing them')
+    args = parser.parse_args(argv)
+    if args.engine == 'batch' and args.width is None and args.alpha is None:
+        #options of the scalar engine the batch engine does not have
+        unsupported = [option for option, used in (('--workers', args.workers != 1), ('--store', args.store),
+                                                   ('--trace', args.trace), ('--replay', args.replay),
+                                                   ('--report', args.report), ('--profile', args.profile)) if used]
+        if unsupported:
+            parser.error('%s cannot be used with --engine batch' % ', '.join(unsupported))
+    return args
+
+
+def main(argv=None):
+    args = parsearguments(argv)
+    players = loadplayers(args.players) if args.players else None
+    if args.width is not None or args.alpha is not None:
+        from adaptive import simulateadaptive
+        result = simulateadaptive(players, args.decks, width=args.width, alpha=args.alpha, maxgames=args.games,
+                                  blocksize=args.blocksize, seed=args.seed, workers=args.workers if args.workers > 0 else None,
+                                  resetemotions=args.resetemotions, quantized=args.quantized)
+        low, high = result.interval()
+        results = {'games': result.games,
+                   'decks': args.decks,
+                   'seed': args.seed,
+                   'stopped': result.stopped,
+                   'wins': dict(zip(result.names, result.wins.tolist())),
+                   'winrate': dict(zip(result.names, zip(result.winrate().tolist(), low.tolist(), high.tolist()))),
+                   'roundswin': dict(zip(result.names, result.roundswin.mean.tolist())),
+                   'bluffslost': dict(zip(result.names, result.bluffslost.mean.tolist()))}
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file)
+        else:
+            print(result.summary())
+        return results
+    if args.engine == 'batch':
+        from batchgame import simulatebatch
+        result = simulatebatch(args.games, players, args.decks, seed=args.seed, quantized=args.quantized)
+        names = list(result.names)
+        winner = result.winners()
+        winnerstats = result.winnerstats()
+    else:
+        trace = JSONLSink(args.trace) if args.trace else None
+        profile = Profiler() if args.profile else None
+        try:
+            players, winnerstats, winner = simulategames(args.games, resetemotions=args.resetemotions,
+                                                         workers=args.workers if args.workers > 0 else None,
+                                                         seed=args.seed, blocksize=args.blocksize,
+                                                         quantized=args.quantized, players=players,
+                                                         numberofdecks=args.decks, trace=trace,
+                                                         store=args.store, profile=profile, replay=args.replay)
+        finally:
+            if trace:
+                trace.close()
+        if args.store:
+            store = ResultStore(args.store)
+            winner, winnerstats = store.winners(), store.winnerstats().tolist()
+            if args.report:
+                from report import report
+                report(store, args.report)
+        names = [player.name for player in players]
+    wins = Counter(winner)
+    results = {'games': args.games,
+               'decks': args.decks,
+               'seed': args.seed,
+               'engine': args.engine,
+               'wins': {name: wins[name] for name in names},
+               'winner': list(winner),
+               'winnerstats': winnerstats}
+    if args.engine == 'scalar' and profile:
+        results['profile'] = profile.summary()
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file)
+    else:
+        for name in names:
+            print('%s won %i of %i games' % (name, wins[name], args.games))
+        if args.engine == 'scalar' and profile:
+            print(profile.report())
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Sweep of personalities: which (haste, memory, selfcontrol) wins?
+
+Each cell of the sweep is a table where a focal player, with the personality and the initial
+emotion of the cell, plays against tablesize-1 opponents with a fixed personality. The cells
+run in parallel, and each finished cell is appended to a checkpoint file, so an interrupted
+sweep started again with the same checkpoint only runs the cells that are missing.
+
+Example
+-------
+    python sweep.py --haste 0.1 0.5 0.9 --memory 0.1 0.5 0.9 --selfcontrol 0.1 0.5 0.9 --tablesize 4 6 --games 1000 --workers 0 --checkpoint sweep.jsonl --output sweep.csv
+    python sweep.py --random 200 --games 500 --checkpoint random.jsonl --output random.csv
+"""
+import os
+import csv
+import json
+import time
+import zlib
+import argparse
+import itertools
+
+import numpy as np
+
+from game import Player, Personality, Emotion, simulategames
+
+
+PARAMETERS = ('haste', 'memory', 'selfcontrol', 'valence', 'arousal', 'tablesize')
+COLUMNS = PARAMETERS + ('games', 'wins', 'winrate', 'stderr', 'fieldrate', 'seconds')
+OPPONENT = {'haste': 0.5, 'memory': 0.5, 'selfcontrol': 0.5, 'valence': 0, 'arousal': 0}
+
+
+def checktablesize(tablesize):
+    #the focal player needs at least one opponent, fieldrate divides by tablesize-1
+    if min(tablesize) < 2:
+        raise ValueError('tablesize must be at least 2, not %i' % min(tablesize))
+
+
+def grid(haste=(0.1, 0.5, 0.9), memory=(0.1, 0.5, 0.9), selfcontrol=(0.1, 0.5, 0.9), valence=(0,), arousal=(0,), tablesize=(6,)):
+    """
+    Full factorial design.
+
+    Returns
+    -------
+    list
+        One dict of PARAMETERS for each cell.
+
+    """
+    checktablesize(tablesize)
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(haste, memory, selfcontrol, valence, arousal, tablesize)]
+
+
+def randomdesign(cells, seed=0, tablesize=(6,)):
+    """
+    Personalities uniform in [0, 1], initial emotions uniform in [-1, 1] and a table size
+    drawn from tablesize. Values are rounded to 3 decimals.
+    """
+    checktablesize(tablesize)
+    rng = np.random.default_rng(seed)
+    design = []
+    for i in range(cells):
+        personality = rng.uniform(0, 1, 3).round(3).tolist()
+        emotion = rng.uniform(-1, 1, 2).round(3).tolist()
+        design.append(dict(zip(PARAMETERS, personality + emotion + [int(rng.choice(tablesize))])))
+    return design
+
+
+def cellkey(cell, games, seed, numberofdecks, opponent=None, resetemotions=True, quantized=False):
+    #identifies a cell in the checkpoint with every option that changes its results, cells run with other options are not reused
+    opponent = OPPONENT if opponent is None else opponent
+    return json.dumps([[cell[parameter] for parameter in PARAMETERS], games, seed, numberofdecks,
+                       [opponent[trait] for trait in sorted(OPPONENT)], bool(resetemotions), bool(quantized)])
+
+
+def cellseed(cell, games, seed, numberofdecks):
+    #the seed of a cell depends on its parameters, not on its position in the sweep nor on the opponent
+    return [seed, zlib.crc32(json.dumps([[cell[parameter] for parameter in PARAMETERS], games, seed, numberofdecks]).encode())]
+
+
+def cellplayers(cell, opponent=None):
+    opponent = OPPONENT if opponent is None else opponent
+    players = [Player('Focal', personality = Personality(cell['haste'], cell['memory'], cell['selfcontrol']),
+                      emotion = Emotion(cell['valence'], cell['arousal']))]
+    for i in range(cell['tablesize'] - 1):
+        players.append(Player('Opponent%i' % (i+1), personality = Personality(opponent['haste'], opponent['memory'], opponent['selfcontrol']),
+                              emotion = Emotion(opponent['valence'], opponent['arousal'])))
+    return players
+
+
+def runcell(task):
+    """
+    Play the games of a cell.
+
+    Parameters
+    ----------
+    task : tuple
+        (cell, games, seed, numberofdecks, opponent, resetemotions, quantized).
+
+    Returns
+    -------
+    dict
+        Row of the results table.
+
+    """
+    cell, games, seed, numberofdecks, opponent, resetemotions, quantized = task
+    start = time.perf_counter()
+    players, winnerstats, winner = simulategames(games, resetemotions=resetemotions, seed=cellseed(cell, games, seed, numberofdecks), blocksize=games,
+                                                 quantized=quantized, players=cellplayers(cell, opponent), numberofdecks=numberofdecks)
+    wins = winner.count('Focal')
+    winrate = wins / games
+    row = dict(cell)
+    row.update({'games': games,
+                'wins': wins,
+                'winrate': winrate,
+                'stderr': (winrate * (1 - winrate) / games) ** 0.5,
+                #mean win rate of each opponent
+                'fieldrate': (len(winner) - wins) / games / (cell['tablesize'] - 1),
+                'seconds': time.perf_counter() - start})
+    return row
+
+
+def readcheckpoint(path):
+    """
+    Rows of the finished cells, by key. A line cut by an interruption is ignored.
+    """
+    rows = {}
+    if path and os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                rows[entry['key']] = entry['row']
+    return rows
+
+
+def sweep(cells, games=1000, checkpoint=None, workers=None, seed=0, numberofdecks=2, opponent=None, resetemotions=True, quantized=False, verbose=False):
+    """
+    Run the cells that are not in the checkpoint yet.
+
+    Parameters
+    ----------
+    cells : list
+        Cells of grid or randomdesign.
+    games : int
+        Games of each cell.
+    checkpoint : str
+        JSONL file where the finished cells are appended. Default is None: no checkpoint.
+    workers : int
+        Number of processes. None uses all cores.
+    seed : int
+        Seed of the sweep.
+    numberofdecks : int
+        Number of decks.
+    opponent : dict
+        haste, memory, selfcontrol, valence and arousal of the opponents. Default is OPPONENT.
+    resetemotions : bool
+        Reset the emotions to the initial values of the cell before each game.
+    quantized : bool
+        Round the probabilities to the 10 buckets of the old Random.get.
+
+    Returns
+    -------
+    list
+        Rows of the results table, in the order of cells.
+
+    """
+    done = readcheckpoint(checkpoint)
+    keys = [cellkey(cell, games, seed, numberofdecks, opponent, resetemotions, quantized) for cell in cells]
+    tasks = {key: (cell, games, seed, numberofdecks, opponent, resetemotions, quantized) for key, cell in zip(keys, cells) if key not in done}
+    if verbose:
+        print('%i cells, %i in the checkpoint' % (len(cells), len(cells) - len(tasks)))
+
+    def finish(key, row):
+        done[key] = row
+        if checkpoint:
+            with open(checkpoint, 'a') as file:
+                file.write(json.dumps({'key': key, 'row': row}) + '\n')
+        if verbose:
+            print('%i/%i %s winrate %.3f' % (len(done), len(cells), ' '.join('%s=%s' % (p, row[p]) for p in PARAMETERS), row['winrate']), flush=True)
+
+    if workers == 1:
+        for key, task in tasks.items():
+            finish(key, runcell(task))
+    elif tasks:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(runcell, task): key for key, task in tasks.items()}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+    return [done[key] for key in keys]
+
+
+def savetable(rows, path):
+    """
+    Write the results table as CSV, one row per cell.
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep of the personality of a focal player against fixed opponents.')
+    parser.add_argument('--haste', type=float, nargs='+', default=[0.1, 0.5, 0.9])
+    parser.add_argument('--memory', type=float, nargs='+', default=[0.1, 0.5, 0.9])
+    parser.add_argument('--selfcontrol', type=float, nargs='+', default=[0.1, 0.5, 0.9])
+    parser.add_argument('--valence', type=float, nargs='+', default=[0])
+    parser.add_argument('--arousal', type=float, nargs='+', default=[0])
+    parser.add_argument('--tablesize', type=int, nargs='+', default=[6])
+    parser.add_argument('--random', type=int, help='random design with this number of cells instead of the grid')
+    parser.add_argument('--games', type=int, default=1000, help='games of each cell (default: 1000)')
+    parser.add_argument('--decks', type=int, default=2, help='number of decks (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sweep (default: 0)')
+    parser.add_argument('--workers', type=int, default=0, help='number of processes, 0 uses all cores (default: 0)')
+    parser.add_argument('--quantized', action='store_true', help='use the quantized probabilities of the original Random.get')
+    parser.add_argument('--checkpoint', help='JSONL file of the finished cells, the sweep resumes from it')
+    parser.add_argument('--output', default='sweep.csv', help='CSV file of the results (default: sweep.csv)')
+    args = parser.parse_args(argv)
+    if min(args.tablesize) < 2:
+        parser.error('--tablesize must be at least 2')
+
+    if args.random:
+        cells = randomdesign(args.random, args.seed, args.tablesize)
+    else:
+        cells = grid(args.haste, args.memory, args.selfcontrol, args.valence, args.arousal, args.tablesize)
+    rows = sweep(cells, args.games, args.checkpoint, args.workers if args.workers > 0 else None, args.seed, args.decks, quantized=args.quantized, verbose=True)
+    savetable(rows, args.output)
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Decision trace of the games.
+
+The players and the game emit Decision records to a sink. The sink decides what to do
+with them: NullSink discards them (and the game skips building them), MemorySink keeps
+them in columns, JSONLSink writes one JSON object per line and ConsoleSink prints them
+with colors, as the old printstats option did.
+
+Example
+-------
+    sink = MemorySink()
+    simulategames(100, trace=sink)
+    columns = sink.arrays()
+"""
+import sys
+import json
+from collections import namedtuple
+
+import numpy as np
+
+
+class Color:
+    red = '\033[31m'
+    green = '\033[32m'
+    yellow = '\033[33m'
+    blue = '\033[34m'
+    purple = '\033[35m'
+    cyan = '\033[36m'
+    grey = '\033[37m'
+    clear = '\033[m'
+
+
+# Fields of a decision record:
+# kind : str
+#     'gamble' (cards played), 'doubt' (evaluation of a doubt), 'challenge' (result of a
+#     doubt), 'round' (end of a round) or 'game' (end of a game).
+# player : str
+#     Name of the player that took the decision.
+# branch : str
+#     Branch of the decision taken, see BRANCHES.
+# outcome : int
+#     Amount of cards played (gamble), 1 if doubted (doubt), 1 if the doubter was right
+#     (challenge) or the number of rounds played (round and game).
+# probability : float
+#     Probability used in the draw of the branch, nan if the branch is deterministic.
+# card : int
+#     Current card of the round, 0 if there is none.
+# cards : tuple
+#     Cards played (gamble) or the cards of the last hand (challenge).
+# arousal, valence : float
+#     Emotion of the player when the decision was taken.
+# other : str
+#     Name of the other player involved: the player evaluated in doubt and challenge.
+FIELDS = ('kind', 'player', 'branch', 'outcome', 'probability', 'card', 'cards', 'arousal', 'valence', 'other')
+Decision = namedtuple('Decision', FIELDS)
+Decision.__new__.__defaults__ = (0, float('nan'), 0, (), 0.0, 0.0, '')
+
+BRANCHES = {'gamble': ('forced', 'bluff', 'truth'),
+            'doubt': ('nocards', 'notenough', 'knowslie', 'knowstruth', 'arousal', 'next', 'chance'),
+            'challenge': ('bluff', 'truth'),
+            'round': ('doubt', 'empty'),
+            'game': ('won', 'maxrounds')}
+
+
+class NullSink:
+    """
+    Discard every record. The game checks enabled before building a record, so tracing
+    to a NullSink costs one attribute lookup per decision.
+    """
+    enabled = False
+
+    def emit(self, record):
+        pass
+
+    def dealt(self, game):
+        #called by the game after the cards are dealt, see replay
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NULLTRACE = NullSink()
+
+
+class MemorySink(NullSink):
+    """
+    Keep the records in memory, one list per field.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.columns = {field: [] for field in FIELDS}
+        self._appends = [self.columns[field].append for field in FIELDS]
+
+    def __len__(self):
+        return len(self.columns['kind'])
+
+    def emit(self, record):
+        for append, value in zip(self._appends, record):
+            append(value)
+
+    def records(self):
+        return [Decision(*values) for values in zip(*(self.columns[field] for field in FIELDS))]
+
+    def arrays(self):
+        """
+        Returns
+        -------
+        dict
+            Numpy array of each field. cards is kept as an object array of tuples.
+
+        """
+        arrays = {}
+        for field in FIELDS:
+            if field == 'cards':
+                arrays[field] = np.empty(len(self), dtype=object)
+                arrays[field][:] = self.columns[field]
+            else:
+                arrays[field] = np.asarray(self.columns[field])
+        return arrays
+
+    def clear(self):
+        for column in self.columns.values():
+            column.clear()
+
+
+class JSONLSink(NullSink):
+    """
+    Write each record as a JSON object in a line of a file. The lines are written in
+    chunks of buffersize records.
+    """
+    enabled = True
+
+    def __init__(self, path, buffersize=4096):
+        self.file = open(path, 'w')
+        self.buffersize = buffersize
+        self.buffer = []
+        self._encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def emit(self, record):
+        self.buffer.append(self._encode(record._asdict()))
+        if len(self.buffer) >= self.buffersize:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer))
+            self.file.write('\n')
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def readjsonl(path):
+    """
+    Read the records written by a JSONLSink.
+    """
+    with open(path) as file:
+        for line in file:
+            data = json.loads(line)
+            data['cards'] = tuple(data['cards'])
+            yield Decision(**data)
+
+
+class ConsoleSink(NullSink):
+    """
+    Print the records, with colors. The lines are written in chunks of buffersize
+    records and at the end of each game.
+    """
+    enabled = True
+
+    def __init__(self, stream=None, color=True, buffersize=256):
+        self.stream = stream if stream else sys.stdout
+        self.color = color
+        self.buffersize = buffersize
+        self.buffer = []
+
+    def emit(self, record):
+        self.buffer.append(self.format(record))
+        if len(self.buffer) >= self.buffersize or record.kind == 'game':
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write('\n'.join(self.buffer))
+            self.stream.write('\n')
+            self.buffer.clear()
+        self.stream.flush()
+
+    def paint(self, color, text):
+        return '%s%s%s' % (color, text, Color.clear) if self.color else text
+
+    def format(self, record):
+        kind, player, branch, outcome = record.kind, record.player, record.branch, record.outcome
+        if kind == 'gamble':
+            text = '%s played cards %s. Current card: %i' % (player, list(record.cards), record.card)
+            if branch == 'forced':
+                text = self.paint(Color.purple, '%s is bluffing. ' % player) + self.paint(Color.yellow, text)
+            elif branch == 'bluff':
+                text = self.paint(Color.purple, '%s is bluffing (chance %f). ' % (player, record.probability)) + self.paint(Color.yellow, text)
+            else:
+                text = self.paint(Color.yellow, text)
+            return text + ' (arousal %f, valence %f)' % (record.arousal, record.valence)
+        elif kind == 'doubt':
+            color = Color.red if outcome else Color.green
+            text = '%s evaluated %s: %s' % (player, record.other, branch)
+            if record.probability == record.probability:
+                text += ' (chance %f)' % record.probability
+            return self.paint(Color.blue, text) + ' ' + self.paint(color, 'will doubt' if outcome else 'will believe')
+        elif kind == 'challenge':
+            text = '%s doubted %s. ' % (player, record.other)
+            if branch == 'bluff':
+                return text + self.paint(Color.red, '%s bluffed, %s was right' % (record.other, player))
+            return text + self.paint(Color.green, '%s was telling the truth, %s was wrong' % (record.other, player))
+        elif kind == 'round':
+            return self.paint(Color.purple, 'End of round number %i' % outcome)
+        elif kind == 'game':
+            return 'Total rounds: %i\n%s %s' % (outcome, player, 'won' if branch == 'won' else 'leads')
+        return str(record)
@@ -0,0 +1,142 @@
+"""
+Streaming reader of the AffectiveText corpus of SemEval 2007 Task #14.
+
+The sentences are read from the xml file by an incremental XML parser, fed one line at a
+time, together with the lines of the .emotions.gold and .valence.gold files, and yielded one
+record at a time or in batches of a fixed size. Only the current line, instance and batch are
+kept in memory, so a corpus of any size is read with constant memory.
+
+The xml files of the corpus are not well-formed: some headlines have a bare '&'. The lines
+are fed to the parser with the '&' that do not start an entity escaped as '&amp;'.
+
+Example
+-------
+    for batch in batches(affectivetext('./Base/AffectiveText.test', 'affectivetext_test'), 4096):
+        totals, found = scorer.score(batch.texts)
+        #sentences without a word of the lexicon have no computed emotions
+        distance = np.linalg.norm(normalizerows(batch.emotions[found]) - normalizerows(totals[found][:, list(SEMEVAL)]), axis=1)
+"""
+import re
+from pathlib import Path
+from collections import namedtuple
+from xml.etree.ElementTree import XMLPullParser
+
+import numpy as np
+
+
+# Emotions of the .emotions.gold files, from 0 to 100
+GOLDEMOTIONS = ('anger', 'disgust', 'fear', 'joy', 'sadness', 'surprise')
+# '&' not followed by an entity or a character reference
+BAREAMPERSAND = re.compile(rb'&(?!(?:[A-Za-z][\w.-]*|#[0-9]+|#x[0-9A-Fa-f]+);)')
+
+Batch = namedtuple('Batch', 'ids texts emotions valence')
+Batch.__doc__ = """
+Records of a batch: ids and texts are lists, emotions a (records, 6) int array and valence a
+(records,) int array (None when the corpus has no gold file).
+"""
+
+
+def instances(path):
+    """
+    (id, text) of each instance of an AffectiveText xml file, in the order of the file.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    with open(str(path), 'rb') as file:
+        for line in file:
+            parser.feed(BAREAMPERSAND.sub(b'&amp;', line))
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                elif element.tag == 'instance':
+                    yield element.get('id'), (element.text or '').strip()
+                    #the instances read are dropped, the tree does not grow
+                    root.remove(element)
+    parser.close()
+
+
+def goldvalues(path):
+    """
+    (id, values) of each line of a .emotions.gold or .valence.gold file, values is a tuple of ints.
+    """
+    with open(str(path), encoding='ascii') as file:
+        for line in file:
+            fields = line.split()
+            if fields:
+                yield fields[0], tuple(int(value) for value in fields[1:])
+
+
+def records(xmlpath, emotionspath=None, valencepath=None):
+    """
+    Records of a corpus, read lazily.
+
+    Parameters
+    ----------
+    xmlpath : str
+        xml file of the sentences.
+    emotionspath, valencepath : str
+        .emotions.gold and .valence.gold files, in the order of the xml file, or None.
+
+    Yields
+    ------
+    id : str
+    text : str
+    emotions : tuple
+        Scores of GOLDEMOTIONS, None without emotionspath.
+    valence : int
+        Valence from -100 to 100, None without valencepath.
+
+    """
+    emotionlines = goldvalues(emotionspath) if emotionspath else None
+    valencelines = goldvalues(valencepath) if valencepath else None
+    for id, text in instances(xmlpath):
+        emotions = valence = None
+        for lines, name in ((emotionlines, 'emotions'), (valencelines, 'valence')):
+            if lines is None:
+                continue
+            goldid, values = next(lines, (None, None))
+            if goldid != id:
+                raise ValueError('Instance %s of %s has the %s of instance %s' % (id, xmlpath, name, goldid))
+            if name == 'emotions':
+                emotions = values
+            else:
+                valence = values[0]
+        yield id, text, emotions, valence
+
+
+def affectivetext(directory, name):
+    """
+    Records of directory/name.xml with the gold files next to it, if they exist.
+
+    Example: affectivetext('./Base/AffectiveText.trial', 'affectivetext_trial')
+    """
+    directory = Path(directory)
+    emotionspath = directory / (name + '.emotions.gold')
+    valencepath = directory / (name + '.valence.gold')
+    return records(directory / (name + '.xml'),
+                   emotionspath if emotionspath.exists() else None,
+                   valencepath if valencepath.exists() else None)
+
+
+def batches(records, size=1024):
+    """
+    Group records in Batches of size records, the last one may be smaller.
+    """
+    ids, texts, emotions, valence = [], [], [], []
+
+    def batch():
+        return Batch(ids, texts,
+                     np.array(emotions, dtype=np.int16).reshape(-1, len(GOLDEMOTIONS)) if emotions[0] is not None else None,
+                     np.array(valence, dtype=np.int16) if valence[0] is not None else None)
+
+    for id, text, emotion, value in records:
+        ids.append(id)
+        texts.append(text)
+        emotions.append(emotion)
+        valence.append(value)
+        if len(ids) == size:
+            yield batch()
+            ids, texts, emotions, valence = [], [], [], []
+    if ids:
+        yield batch()
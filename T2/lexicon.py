@@ -0,0 +1,271 @@
+"""
+Word indexes of the lexicons.
+
+The lexicon file has one line per word and emotion (word, emotion, 0 or 1), ten lines per
+word. EmotionLexicon reads it once into a dict from each word to its row and a dense
+(vocabulary, 10) uint8 array of the emotions of every word, in the order of EMOTIONS, so a
+word is found by a single dictionary lookup.
+
+Example
+-------
+    nrclexicon = EmotionLexicon.load('./Base/NRCEmotionLexiconWordlevelv092.txt')
+    nrclexicon.get('cancer')                    array([1, 0, 1, 1, 0, 1, 0, 1, 0, 0], dtype=uint8)
+    nrclexicon.get('cancer')[list(SEMEVAL)]     anger disgust fear joy sadness surprise
+
+WordIndex maps the surface form, the lemma and the stem of the words of a lexicon to their
+position, so a word of a sentence is matched against the lemmas or the stems of the lexicon
+by a dictionary lookup instead of lemmatizing every entry for every word. Lemmatizing the
+14 thousand words of the NRC Emotion Lexicon takes seconds, so WordIndex.cached saves the
+maps to a file and loads them in the next sessions while the lexicon files, the words and
+their order, the lemmatize and stem options and the version of nltk are the same.
+
+    words, emotions = loadwordnetaffect('./Base/WordNetAffectEmotionLists/')
+    wn_index = WordIndex.cached('wordnetaffect', words, wordnetaffectpaths('./Base/WordNetAffectEmotionLists/'))
+    wn_index.find(pst.stem('angry'), ('stem',))     position of the first word with that stem
+"""
+import os
+import pickle
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+
+# Emotions of the NRC Emotion Lexicon, columns of EmotionLexicon.values
+EMOTIONS = ('anger', 'anticipation', 'disgust', 'fear', 'joy', 'negative', 'positive', 'sadness', 'surprise', 'trust')
+# Columns of the emotions of SemEval 2007 Task #14: anger, disgust, fear, joy, sadness, surprise
+SEMEVAL = (0, 2, 3, 4, 7, 8)
+# Emotions of the WordNet Affect lists of SemEval 2007
+WORDNETAFFECT = ('anger', 'disgust', 'fear', 'joy', 'sadness', 'surprise')
+# Forms of the words in a WordIndex
+FORMS = ('surface', 'lemma', 'stem')
+# Version of the WordIndex cache files, changed when the code that builds the maps changes
+CACHEVERSION = 2
+
+
+class EmotionLexicon:
+
+    def __init__(self, words, values):
+        """
+        Parameters
+        ----------
+        words : list
+            Words of the lexicon.
+        values : numpy.ndarray
+            (len(words), len(EMOTIONS)) array of the emotions of each word.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.words = list(words)
+        self.values = np.asarray(values, dtype=np.uint8)
+        if self.values.shape != (len(self.words), len(EMOTIONS)):
+            raise ValueError('values must be a (%i, %i) array' % (len(self.words), len(EMOTIONS)))
+        self.index = {word: i for i, word in enumerate(self.words)}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read the NRC Emotion Lexicon Word level file (word<TAB>emotion<TAB>0 or 1).
+        """
+        column = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+        index = {}
+        rows = []
+        with open(str(path), encoding='utf-8') as file:
+            for line in file:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 3:
+                    continue
+                word, emotion, value = fields
+                i = index.get(word)
+                if i is None:
+                    i = index[word] = len(rows)
+                    rows.append([0]*len(EMOTIONS))
+                rows[i][column[emotion]] = int(value)
+        return cls(list(index), rows)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __getitem__(self, word):
+        return self.values[self.index[word]]
+
+    def get(self, word, default=None):
+        """
+        Emotions of a word (row of values, do not modify it), default if it is not in the lexicon.
+        """
+        i = self.index.get(word)
+        return default if i is None else self.values[i]
+
+    def find(self, word):
+        """
+        Row of the word, -1 if it is not in the lexicon.
+        """
+        return self.index.get(word, -1)
+
+    def ids(self, words):
+        """
+        Row of each word, -1 for the words that are not in the lexicon.
+        """
+        return np.array([self.index.get(word, -1) for word in words], dtype=np.int64)
+
+
+def wordnetaffectpaths(directory):
+    return [Path(directory) / (emotion + '.txt') for emotion in WORDNETAFFECT]
+
+
+def loadwordnetaffect(directory):
+    """
+    Words of the WordNet Affect lists (synset id followed by its words), with the '_' of
+    compound words removed as in the notebook.
+
+    Returns
+    -------
+    words : list
+        Words of the lists, in the order of WORDNETAFFECT.
+    emotions : numpy.ndarray
+        Index in WORDNETAFFECT of the list of each word.
+
+    """
+    words = []
+    emotions = []
+    for i, path in enumerate(wordnetaffectpaths(directory)):
+        with open(str(path), encoding='utf-8') as file:
+            for line in file:
+                for word in line.replace('\n', '').replace('_', '').split(' ')[1:]:
+                    words.append(word)
+                    emotions.append(i)
+    return words, np.array(emotions, dtype=np.uint8)
+
+
+def loadaffectintensity(path):
+    """
+    Lines of the NRC Affect Intensity Lexicon (word<TAB>score<TAB>emotion).
+
+    Returns
+    -------
+    words : list
+        Word of each line.
+    scores : numpy.ndarray
+        Intensity of each line, from 0 to 1.
+    emotions : list
+        Emotion of each line.
+
+    """
+    words, scores, emotions = [], [], []
+    with open(str(path), encoding='utf-8') as file:
+        for line in file:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 3:
+                continue
+            words.append(fields[0])
+            scores.append(float(fields[1]))
+            emotions.append(fields[2])
+    return words, np.array(scores, dtype=np.float32), emotions
+
+
+def checksum(paths):
+    """
+    SHA-1 of the contents of the files.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(str(path), 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def wordsdigest(words):
+    """
+    SHA-1 of a list of words, in order.
+    """
+    digest = hashlib.sha1()
+    for word in words:
+        digest.update(word.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def optionnames(options):
+    #name of each option of WordIndex, functions by their module and qualified name
+    names = []
+    for option, value in sorted(options.items()):
+        function = getattr(value, '__func__', value)
+        name = getattr(function, '__qualname__', repr(value))
+        module = getattr(function, '__module__', None)
+        names.append((option, '%s.%s' % (module, name) if module else name))
+    return tuple(names)
+
+
+class WordIndex:
+
+    def __init__(self, words, lemmatize=None, stem=None):
+        """
+        Parameters
+        ----------
+        words : list
+            Words of a lexicon, a word may repeat.
+        lemmatize : function
+            Lemma of a word. Default is the WordNetLemmatizer of nltk (as a noun).
+        stem : function
+            Stem of a word. Default is the PorterStemmer of nltk.
+
+        Returns
+        -------
+        None.
+
+        """
+        if lemmatize is None or stem is None:
+            import nltk
+            lemmatize = lemmatize or nltk.stem.WordNetLemmatizer().lemmatize
+            stem = stem or nltk.stem.PorterStemmer().stem
+        #each form maps to the first position of a word with that form
+        self.surface = {}
+        self.lemma = {}
+        self.stem = {}
+        for i, word in enumerate(words):
+            self.surface.setdefault(word, i)
+            self.lemma.setdefault(lemmatize(word), i)
+            self.stem.setdefault(stem(word), i)
+
+    def find(self, word, forms=FORMS):
+        """
+        Position of the first word of the lexicon matching the word in one of the forms,
+        tried in order, None if not found.
+        """
+        for form in forms:
+            i = getattr(self, form).get(word)
+            if i is not None:
+                return i
+        return None
+
+    @classmethod
+    def cached(cls, name, words, paths, directory='./cache', **options):
+        """
+        WordIndex of the words of a lexicon, loaded from directory/name.pickle if it was
+        built from the same lexicon files (paths), the same words in the same order and the
+        same options with the same nltk version, else built and saved.
+        """
+        import nltk
+        words = list(words)
+        key = (CACHEVERSION, checksum(paths), wordsdigest(words), optionnames(options), nltk.__version__)
+        path = Path(directory) / (name + '.pickle')
+        if path.exists():
+            with open(str(path), 'rb') as file:
+                cachedkey, index = pickle.load(file)
+            if cachedkey == key:
+                return index
+        index = cls(words, **options)
+        os.makedirs(str(directory), exist_ok=True)
+        #written aside and renamed, a session interrupted does not leave a broken cache
+        temporary = path.with_suffix('.tmp')
+        with open(str(temporary), 'wb') as file:
+            pickle.dump((key, index), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(str(temporary), str(path))
+        return index
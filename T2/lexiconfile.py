@@ -0,0 +1,249 @@
+"""
+Lexicons compiled to a binary file read through a memory map.
+
+A compiled lexicon is one file with, after a header, the names of its columns, the sorted
+words encoded in UTF-8 one after the other, the offsets of the words ((words+1) uint32) and
+the (words, columns) matrix of their values. MappedLexicon maps the file and reads the
+sections as numpy arrays and memoryviews without copying them, so opening a lexicon does not depend on its
+size and the processes that open the same file share its pages. A word is found by a binary
+search of the string table.
+
+    header      magic b'LEX1', format version, words, columns, dtype of the values ('|u1',
+                '<f4'), SHA-1 of the text files compiled, length of the names
+    names       names of the columns separated by tabs
+    strings     words sorted by their UTF-8 bytes
+    offsets     word i is strings[offsets[i]:offsets[i+1]]
+    values      matrix of the values, row i is word i
+Each section starts at a multiple of 8 bytes.
+
+Example
+-------
+    nrclexicon = MappedLexicon.compiled('nrcemotion', ['./Base/NRCEmotionLexiconWordlevelv092.txt'], nrcemotiontable)
+    nrclexicon.get('cancer')            array([1, 0, 1, 1, 0, 1, 0, 1, 0, 0], dtype=uint8)
+"""
+import os
+import sys
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from lexicon import EMOTIONS, WORDNETAFFECT, EmotionLexicon, loadwordnetaffect, loadaffectintensity, checksum
+
+
+MAGIC = b'LEX1'
+VERSION = 1
+HEADER = struct.Struct('<4sIII4s20sI')
+
+
+def aligned(size):
+    return (size + 7) // 8 * 8
+
+
+def nrcemotiontable(path):
+    """
+    Words, values and columns of the NRC Emotion Lexicon: 0 or 1 for each of EMOTIONS.
+    """
+    lexicon = EmotionLexicon.load(path)
+    return lexicon.words, lexicon.values, EMOTIONS
+
+
+def affectintensitytable(path):
+    """
+    Words, values and columns of the NRC Affect Intensity Lexicon: the intensity of each
+    emotion of the lexicon, 0 if the word is not annotated with it.
+    """
+    words, scores, emotions = loadaffectintensity(path)
+    columns = tuple(sorted(set(emotions)))
+    index = {}
+    for word in words:
+        index.setdefault(word, len(index))
+    values = np.zeros((len(index), len(columns)), dtype=np.float32)
+    rows = [index[word] for word in words]
+    values[rows, [columns.index(emotion) for emotion in emotions]] = scores
+    return list(index), values, columns
+
+
+def wordnetaffecttable(*paths):
+    """
+    Words, values and columns of the WordNet Affect lists (the paths of wordnetaffectpaths):
+    1 for each list of WORDNETAFFECT the word is in.
+    """
+    words, emotions = loadwordnetaffect(Path(paths[0]).parent)
+    index = {}
+    for word in words:
+        index.setdefault(word, len(index))
+    values = np.zeros((len(index), len(WORDNETAFFECT)), dtype=np.uint8)
+    values[[index[word] for word in words], emotions] = 1
+    return list(index), values, WORDNETAFFECT
+
+
+def compilelexicon(path, words, values, columns, digest=''):
+    """
+    Write a lexicon to path in the format of MappedLexicon.
+
+    Parameters
+    ----------
+    path : str
+        File written.
+    words : list
+        Words of the lexicon, without repetitions.
+    values : numpy.ndarray
+        (len(words), len(columns)) array, uint8 or float32.
+    columns : list
+        Name of each column.
+    digest : str
+        SHA-1 (hexadecimal) of the files the lexicon was read from.
+
+    """
+    values = np.asarray(values)
+    if values.dtype not in (np.uint8, np.float32):
+        values = values.astype(np.float32)
+    encoded = [word.encode('utf-8') for word in words]
+    if len(set(encoded)) != len(encoded):
+        raise ValueError('The words of a lexicon must not repeat')
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum([len(encoded[i]) for i in order])
+    names = '\t'.join(columns).encode('utf-8')
+    header = HEADER.pack(MAGIC, VERSION, len(encoded), len(columns), values.dtype.str.encode(),
+                         bytes.fromhex(digest) if digest else bytes(20), len(names))
+    path = Path(path)
+    #written aside and renamed, an interrupted compilation does not leave a broken file
+    temporary = path.with_suffix('.tmp')
+    with open(str(temporary), 'wb') as file:
+        for section in (header + names, b''.join(encoded[i] for i in order), offsets.tobytes(),
+                        np.ascontiguousarray(values[order]).tobytes()):
+            file.write(section)
+            file.write(bytes(aligned(len(section)) - len(section)))
+    os.replace(str(temporary), str(path))
+
+
+class MappedLexicon:
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            File written by compilelexicon.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.path = str(path)
+        with open(self.path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, words, columns, dtype, digest, nameslength = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a compiled lexicon of version %i' % (self.path, VERSION))
+        self.digest = digest.hex()
+        start = HEADER.size
+        self.columns = tuple(self.buffer[start:start + nameslength].decode('utf-8').split('\t'))
+        start = aligned(start + nameslength)
+        #the sizes of the offsets and the values are known, the strings are what is left between the names and them
+        dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        valuesstart = len(self.buffer) - aligned(words * columns * dtype.itemsize)
+        offsetsstart = valuesstart - aligned(4 * (words + 1))
+        view = memoryview(self.buffer)
+        self.strings = view[start:offsetsstart]
+        self.offsets = np.frombuffer(self.buffer, '<u4', words + 1, offsetsstart)
+        self.values = np.frombuffer(self.buffer, dtype, words * columns, valuesstart).reshape(words, columns)
+        #offsets read by find as Python ints, a memoryview of the file reads them faster than numpy
+        self.starts = view[offsetsstart:offsetsstart + 4 * (words + 1)].cast('I') if sys.byteorder == 'little' else self.offsets.tolist()
+
+    @classmethod
+    def compiled(cls, name, paths, table, directory='./cache'):
+        """
+        Open directory/name.lex, compiling it first with table(*paths) if it does not exist or
+        was compiled from other contents of the files.
+
+        Parameters
+        ----------
+        name : str
+            Name of the compiled file.
+        paths : list
+            Text files of the lexicon.
+        table : function
+            nrcemotiontable, affectintensitytable, wordnetaffecttable or another function
+            returning (words, values, columns) of the files.
+
+        """
+        path = Path(directory) / (name + '.lex')
+        digest = checksum(paths)
+        if path.exists():
+            #the header is read without mapping the file, which could not be replaced on Windows while mapped
+            with open(str(path), 'rb') as file:
+                header = file.read(HEADER.size)
+            if len(header) == HEADER.size:
+                magic, version, _, _, _, compiled, _ = HEADER.unpack(header)
+                if magic == MAGIC and version == VERSION and compiled.hex() == digest:
+                    return cls(path)
+        os.makedirs(str(directory), exist_ok=True)
+        compilelexicon(path, *table(*paths), digest=digest)
+        return cls(path)
+
+    def __getstate__(self):
+        #a process that receives the lexicon maps the file again
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __getitem__(self, word):
+        i = self.find(word)
+        if i < 0:
+            raise KeyError(word)
+        return self.values[i]
+
+    def word(self, i):
+        return bytes(self.strings[self.starts[i]:self.starts[i+1]]).decode('utf-8')
+
+    @property
+    def words(self):
+        """
+        All the words, in the order of the rows (decodes the whole string table).
+        """
+        strings = bytes(self.strings)
+        offsets = self.offsets.tolist()
+        return [strings[offsets[i]:offsets[i+1]].decode('utf-8') for i in range(len(self))]
+
+    def find(self, word):
+        """
+        Row of the word, -1 if it is not in the lexicon.
+        """
+        key = word.encode('utf-8')
+        strings = self.strings
+        starts = self.starts
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(strings[starts[middle]:starts[middle+1]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and bytes(strings[starts[low]:starts[low+1]]) == key:
+            return low
+        return -1
+
+    def get(self, word, default=None):
+        """
+        Values of a word (read-only row of values), default if it is not in the lexicon.
+        """
+        i = self.find(word)
+        return default if i < 0 else self.values[i]
+
+    def ids(self, words):
+        """
+        Row of each word, -1 for the words that are not in the lexicon.
+        """
+        return np.array([self.find(word) for word in words], dtype=np.int64)
@@ -0,0 +1,243 @@
+"""
+Emotions of many sentences at once.
+
+SentenceScorer processes the sentences in chunks. Each chunk goes to a worker process, which
+tokenizes the sentences, tags them with nltk.pos_tag, removes the stop words and the words
+that are not nouns, verbs, adjectives or adverbs, and looks up each word in the lexicon as
+analyseSentence does: the word, then the word in the lemmas of the lexicon, then its lemma,
+then its lemma in the lemmas of the lexicon. The worker returns the row of the lexicon of
+each word found and the number of words found in each sentence, which are the indices and
+the row pointers of a (sentences, vocabulary) sparse matrix in CSR format. Its product with
+the (vocabulary, emotions) matrix of the lexicon is the sum of the emotions of the words of
+each sentence.
+
+Example
+-------
+    scorer = SentenceScorer(nrclexicon, nrc_index.lemma, stop_words, workers=None)
+    totals, found = scorer.score(sentences)
+    annotated = normalizerows(emotions)
+    computed = computedlist(totals, found)      layout of the list computed of the notebook
+"""
+import os
+from itertools import islice
+from collections import deque
+
+import numpy as np
+
+from lexicon import SEMEVAL
+
+
+WORKER = {} #lexicon, lemmas, stop words and row of the words seen of a worker process
+
+
+def setup(lexicon, lemmas, stopwords):
+    """
+    Initialize a worker process, or the main process when there are no workers.
+    """
+    import nltk
+    WORKER.clear()
+    WORKER.update(lexicon=lexicon, lemmas=lemmas or {}, stopwords=set(stopwords or ()),
+                  lemmatizer=nltk.stem.WordNetLemmatizer(), rows={})
+
+
+def wordnettag(tag):
+    """
+    Converts nltk pos_tags to wordnet pos_tags (postagNltk2Wordnet of the notebook).
+    """
+    import nltk
+    if tag.startswith('J'):
+        return nltk.corpus.wordnet.ADJ
+    elif tag.startswith('V'):
+        return nltk.corpus.wordnet.VERB
+    elif tag.startswith('N'):
+        return nltk.corpus.wordnet.NOUN
+    elif tag.startswith('R'):
+        return nltk.corpus.wordnet.ADV
+    return None
+
+
+def tokenize(sentence):
+    """
+    Words of a sentence kept by analyseSentence(..., lemmatize_sentense=True) and their lemmas.
+    """
+    import nltk
+    postag = nltk.pos_tag([word.lower() for word in nltk.tokenize.word_tokenize(sentence)])
+    stopwords = WORKER['stopwords']
+    lemmatize = WORKER['lemmatizer'].lemmatize
+    words, lemmas = [], []
+    for word, tag in postag:
+        tag = wordnettag(tag)
+        if tag and word not in stopwords:
+            words.append(word)
+            lemmas.append(lemmatize(word, tag))
+    return words, lemmas
+
+
+def row(word):
+    """
+    Row of the lexicon of a word or of one of its lemmas, -1 if not found.
+    """
+    lexicon = WORKER['lexicon']
+    lemmas = WORKER['lemmas']
+    i = lexicon.find(word)
+    if i < 0:
+        i = lemmas.get(word, -1)
+    return i
+
+
+def scorechunk(sentences):
+    """
+    Rows of the lexicon of the words found in each sentence of a chunk.
+
+    Returns
+    -------
+    counts : numpy.ndarray
+        Number of words found in each sentence.
+    rows : numpy.ndarray
+        Rows of the words found, sentence after sentence.
+
+    """
+    rows = WORKER['rows']
+    counts = []
+    found = []
+    for sentence in sentences:
+        words, lemmas = tokenize(sentence)
+        count = 0
+        for word, lemma in zip(words, lemmas):
+            #the word, then its lemma, as analyseSentence
+            for candidate in (word, lemma):
+                i = rows.get(candidate)
+                if i is None:
+                    i = rows[candidate] = row(candidate)
+                if i >= 0:
+                    found.append(i)
+                    count += 1
+                    break
+        counts.append(count)
+    return np.array(counts, dtype=np.int64), np.array(found, dtype=np.int64)
+
+
+def csrdot(indptr, indices, matrix):
+    """
+    Product of a (rows, len(matrix)) sparse matrix of ones in CSR format and a dense matrix.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        The columns of row r are indices[indptr[r]:indptr[r+1]].
+    indices : numpy.ndarray
+        Columns of the ones, a column may repeat.
+    matrix : numpy.ndarray
+        (columns, n) dense matrix.
+
+    Returns
+    -------
+    numpy.ndarray
+        (rows, n) array, row r is the sum of the rows indices[indptr[r]:indptr[r+1]] of matrix.
+
+    """
+    #the sum of each row is the difference of the cumulative sum at its limits
+    cumulative = np.zeros((len(indices) + 1, matrix.shape[1]))
+    np.cumsum(matrix[indices], axis=0, out=cumulative[1:])
+    return cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+
+
+class SentenceScorer:
+
+    def __init__(self, lexicon, lemmas=None, stopwords=None, workers=1, chunksize=256, ahead=2):
+        """
+        Parameters
+        ----------
+        lexicon : MappedLexicon or EmotionLexicon
+            Lexicon of the words, its values are the emotions of the words.
+        lemmas : dict
+            Lemma of the words of the lexicon to their row (WordIndex.lemma).
+        stopwords : set
+            Words ignored.
+        workers : int
+            Number of processes, None uses all cores and 1 scores in this process.
+        chunksize : int
+            Sentences sent to a process at a time.
+        ahead : int
+            Chunks in flight per worker.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.lexicon = lexicon
+        self.lemmas = lemmas or {}
+        self.stopwords = set(stopwords or ())
+        self.workers = workers if workers else os.cpu_count()
+        self.chunksize = chunksize
+        self.ahead = ahead
+
+    def iterchunks(self, sentences):
+        """
+        Score an iterable of sentences a chunk at a time, in order.
+
+        Yields
+        ------
+        counts, rows : numpy.ndarray
+            As scorechunk, for each chunk of chunksize sentences.
+
+        """
+        sentences = iter(sentences)
+        chunks = iter(lambda: list(islice(sentences, self.chunksize)), [])
+        arguments = (self.lexicon, self.lemmas, self.stopwords)
+        if self.workers == 1:
+            setup(*arguments)
+            for chunk in chunks:
+                yield scorechunk(chunk)
+            return
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=setup, initargs=arguments) as executor:
+            #keep workers * ahead chunks in flight, consumed in order
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(scorechunk, chunk))
+                if len(pending) >= self.workers * self.ahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def score(self, sentences):
+        """
+        Sum of the emotions of the words found in each sentence.
+
+        Returns
+        -------
+        totals : numpy.ndarray
+            (sentences, columns of the lexicon) array.
+        found : numpy.ndarray
+            True for the sentences with at least one word in the lexicon.
+
+        """
+        counts, rows = [], []
+        for chunkcounts, chunkrows in self.iterchunks(sentences):
+            counts.append(chunkcounts)
+            rows.append(chunkrows)
+        counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return csrdot(indptr, rows, np.asarray(self.lexicon.values)), counts > 0
+
+
+def normalizerows(values):
+    """
+    Each row divided by its maximum, rows whose maximum is 0 are not changed (normalize4me with norm_factor=-1).
+    """
+    values = np.asarray(values, dtype=float)
+    maximum = values.max(axis=1, keepdims=True) if len(values) else np.ones((0, 1))
+    return values / np.where(maximum == 0, 1, maximum)
+
+
+def computedlist(totals, found, columns=SEMEVAL):
+    """
+    List computed of the notebook: the normalized emotions of the SemEval columns of each
+    sentence with at least one word found, an empty list for the others.
+    """
+    normalized = normalizerows(np.asarray(totals)[:, list(columns)])
+    return [normalized[i] if found[i] else [] for i in range(len(normalized))]